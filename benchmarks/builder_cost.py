@@ -0,0 +1,62 @@
+"""Timing benchmark for DFTWorkChain.get_builder_from_protocol.
+
+Compare the cost of constructing a builder for an SCF-only calculation with
+the cost of a full relax + bands + PDOS + phonon calculation.
+
+    python benchmarks/builder_cost.py --structure 4408 --repeat 20
+"""
+import argparse
+import time
+
+from aiida import load_profile, orm
+
+CONFIGURATIONS = {
+    'scf-only': dict(want_relax=False, want_bands=False, want_dos=False,
+                     want_phonon=False),
+    'full': dict(want_relax=True, want_bands=True, want_dos=True,
+                 want_phonon=True),
+}
+
+
+def time_builder(codes, structure, options, repeat, **wants):
+    from immad.dft.dft import DFTWorkChain
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        DFTWorkChain.get_builder_from_protocol(
+            *codes, structure, options=options, **wants)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--structure', type=int, required=True,
+                        help='pk of the StructureData')
+    parser.add_argument('--computer', default='phpc')
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    load_profile()
+    codes = [orm.load_code(f'{name}@{args.computer}')
+             for name in ('pw', 'dos', 'projwfc', 'ph', 'q2r', 'matdyn')]
+    structure = orm.load_node(pk=args.structure)
+    options = {
+            'resources': {
+                'num_machines': 1,
+                'tot_num_mpiprocs': 16,
+                },
+            'max_wallclock_seconds': 18000,
+            'withmpi': True,
+            }
+
+    # warm up the plugin and protocol caches
+    time_builder(codes, structure, options, 1, **CONFIGURATIONS['full'])
+
+    for name, wants in CONFIGURATIONS.items():
+        timings = time_builder(codes, structure, options, args.repeat,
+                               **wants)
+        mean = 1000 * sum(timings) / len(timings)
+        print(f'{name:>10}: {mean:8.1f} ms/builder '
+              f'(min {1000 * min(timings):.1f} ms, {args.repeat} runs)')
@@ -0,0 +1,73 @@
+"""Import-time benchmark with budgets for the immad modules.
+
+Every module is imported in a fresh interpreter with `python -X importtime`,
+the best cumulative time of `--repeat` runs is compared with its budget, and
+the heavy dependencies that the import must not load are checked. The exit
+status is 1 if any budget is exceeded or a forbidden module is loaded.
+
+    python benchmarks/import_time.py --repeat 5 --scale 2
+"""
+import argparse
+import subprocess
+import sys
+
+# module: (budget in seconds, modules that must not be loaded)
+BUDGETS = {
+    'immad.abstract': (0.05, ('pymatgen', 'ase', 'aiida')),
+    'immad.dft': (0.05, ('aiida', 'pymatgen', 'ase')),
+    'immad.abstract.predictor': (0.5, ('pymatgen', 'ase', 'aiida')),
+    'immad.abstract.pipeline': (0.5, ('pymatgen', 'ase', 'aiida')),
+    'immad.dft.electronic_structure': (2.5, ('pymatgen',
+                                             'aiida_quantumespresso')),
+    # ProtocolMixin (aiida_quantumespresso) itself loads pymatgen
+    'immad.dft.dft': (4., ('aiida_quantumespresso.workflows.pw.base',)),
+}
+# prints the loaded top-level packages and modules after the import
+CHECK = ('import sys, {module}; '
+         'print("\\n".join(sorted(sys.modules)))')
+
+
+def measure(module):
+    """Return the cumulative import time of module in seconds."""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        capture_output=True, text=True, check=True)
+    for line in reversed(result.stderr.splitlines()):
+        fields = line.split('|')
+        if len(fields) == 3 and fields[2].strip() == module:
+            return int(fields[1]) / 1e6
+    raise RuntimeError(f'No import time reported for {module}.')
+
+
+def loaded_modules(module):
+    """Return the names of the modules loaded by importing module."""
+    result = subprocess.run(
+        [sys.executable, '-c', CHECK.format(module=module)],
+        capture_output=True, text=True, check=True)
+    return set(result.stdout.split())
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--scale', type=float, default=1.,
+                        help='multiply every budget, e.g. on slow machines')
+    parser.add_argument('modules', nargs='*', default=list(BUDGETS))
+    args = parser.parse_args()
+
+    failed = False
+    for module in args.modules:
+        budget, forbidden = BUDGETS.get(module, (float('inf'), ()))
+        budget *= args.scale
+        elapsed = min(measure(module) for _ in range(args.repeat))
+        loaded = loaded_modules(module)
+        leaked = [name for name in forbidden if name in loaded]
+        status = 'ok'
+        if elapsed > budget or leaked:
+            status = 'FAIL'
+            failed = True
+        print(f'{module:>32}: {elapsed:7.3f} s (budget {budget:7.3f} s) '
+              f'{status}')
+        if leaked:
+            print(f'{"":>34}loads {", ".join(leaked)}')
+    sys.exit(1 if failed else 0)
@@ -1,5 +1,31 @@
-from .materials import Materials
-from .validator import Validator
-from .predictor import Predictor
+import importlib
 
-__all__ = ['Materials', 'Validator', 'Predictor']
+# the classes are imported from their module on first access, so that only
+# the touched subsystem (and e.g. pymatgen or ASE) is loaded
+_MODULES = {
+    'Materials': '.materials',
+    'Validator': '.validator',
+    'Predictor': '.predictor',
+    'SiteWeightPredictor': '.predictor',
+    'ConfigurationStore': '.store',
+    'ParallelPredictor': '.parallel',
+    'CachedPredictor': '.cache',
+    'TopKSelector': '.selection',
+    'Pipeline': '.pipeline',
+    'SurrogatePredictor': '.surrogate',
+    'SyntheticValidator': '.synthetic',
+}
+
+__all__ = list(_MODULES)
+
+
+def __getattr__(name):
+    if name not in _MODULES:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    value = getattr(importlib.import_module(_MODULES[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
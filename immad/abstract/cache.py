@@ -0,0 +1,377 @@
+import hashlib
+import pickle
+import sqlite3
+import time
+from collections import OrderedDict
+import numpy as np
+from .predictor import Predictor
+
+# maximum number of parameters of one SQLite statement
+SQLITE_CHUNK = 500
+
+
+class LRUCache(object):
+    """
+    In-memory least-recently-used cache with hit/miss counters
+    """
+    def __init__(self, maxsize=100000):
+        """
+        Args:
+            maxsize (int): maximum number of entries
+        """
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.data)
+
+    def __contains__(self, key):
+        return key in self.data
+
+    def get(self, key, default=None):
+        """
+        Return the value of key (and mark it as recently used)
+        """
+        if key not in self.data:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self.data.move_to_end(key)
+        return self.data[key]
+
+    def put(self, key, value):
+        """
+        Store a value, evicting the least recently used entries
+        """
+        self.data[key] = value
+        self.data.move_to_end(key)
+        while len(self.data) > self.maxsize:
+            self.data.popitem(last=False)
+
+    def clear(self):
+        self.data.clear()
+
+
+class DiskCache(object):
+    """
+    Persistent key-value cache in a SQLite file with size-based eviction
+
+    Values are pickled, the least recently accessed entries are removed when
+    the total size of the values exceeds max_bytes. The file can be shared
+    by several processes: the total size is kept by triggers in the file
+    itself and the eviction runs in the write transaction. SQLite locking
+    is unreliable on network file systems (NFS), put the file on a local
+    disk.
+    """
+    def __init__(self, filename, max_bytes=2 ** 30, timeout=30.):
+        """
+        Args:
+            filename (str or Path): the SQLite file, created if needed
+            max_bytes (int): maximum total size of the pickled values
+            timeout (float): seconds to wait for a lock held by another
+                             process before sqlite3.OperationalError is
+                             raised
+        """
+        self.filename = str(filename)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.connection = sqlite3.connect(self.filename, timeout=timeout)
+        with self.connection:
+            self.connection.execute('BEGIN IMMEDIATE')
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS cache ('
+                'key BLOB PRIMARY KEY, value BLOB, size INTEGER, atime REAL)')
+            self.connection.execute(
+                'CREATE INDEX IF NOT EXISTS cache_atime ON cache (atime)')
+            # total size of the values, shared by all the connections
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS cache_size (total INTEGER)')
+            self.connection.execute(
+                'INSERT INTO cache_size SELECT COALESCE(SUM(size), 0) '
+                'FROM cache WHERE NOT EXISTS (SELECT 1 FROM cache_size)')
+            for event, change in (('INSERT', '+ NEW.size'),
+                                  ('DELETE', '- OLD.size'),
+                                  ('UPDATE OF size',
+                                   '- OLD.size + NEW.size')):
+                name = event.split()[0].lower()
+                self.connection.execute(
+                    f'CREATE TRIGGER IF NOT EXISTS cache_{name} AFTER '
+                    f'{event} ON cache BEGIN UPDATE cache_size SET total = '
+                    f'total {change}; END')
+
+    @property
+    def total_bytes(self):
+        """
+        Total size of the cached values, including the entries written by
+        other processes
+        """
+        return self.connection.execute(
+            'SELECT total FROM cache_size').fetchone()[0]
+
+    def __len__(self):
+        return self.connection.execute(
+            'SELECT COUNT(*) FROM cache').fetchone()[0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def get(self, key, default=None):
+        """
+        Return the value of key, default if it is not cached
+        """
+        return self.get_many([key]).get(key, default)
+
+    def get_many(self, keys):
+        """
+        Return the cached values of many keys
+
+        Returns:
+            dict: the values of the keys found in the cache
+        """
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        for start in range(0, len(keys), SQLITE_CHUNK):
+            chunk = keys[start:start + SQLITE_CHUNK]
+            marks = ', '.join('?' * len(chunk))
+            rows = self.connection.execute(
+                f'SELECT key, value FROM cache WHERE key IN ({marks})', chunk)
+            for key, value in rows:
+                found[key] = pickle.loads(value)
+        if found:
+            now = time.time()
+            hits = list(found)
+            with self.connection:
+                for start in range(0, len(hits), SQLITE_CHUNK):
+                    chunk = hits[start:start + SQLITE_CHUNK]
+                    marks = ', '.join('?' * len(chunk))
+                    self.connection.execute(
+                        f'UPDATE cache SET atime = ? WHERE key IN ({marks})',
+                        [now] + chunk)
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def put(self, key, value):
+        """
+        Store a value
+        """
+        self.put_many({key: value})
+
+    def put_many(self, items):
+        """
+        Store many values at once and evict if max_bytes is exceeded
+
+        Args:
+            items (dict): the values by key
+        """
+        now = time.time()
+        rows = []
+        for key, value in items.items():
+            value = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+            rows.append((key, value, len(value), now))
+        with self.connection:
+            # the write lock is taken first, so that no other process
+            # changes the total size before the eviction
+            self.connection.execute('BEGIN IMMEDIATE')
+            self.connection.executemany(
+                'INSERT INTO cache VALUES (?, ?, ?, ?) ON CONFLICT (key) '
+                'DO UPDATE SET value = excluded.value, '
+                'size = excluded.size, atime = excluded.atime', rows)
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+
+    def evict(self):
+        """
+        Remove the least recently accessed entries until the cache uses at
+        most 90 % of max_bytes
+        """
+        with self.connection:
+            self.connection.execute('BEGIN IMMEDIATE')
+            self._evict()
+
+    def _evict(self):
+        excess = self.total_bytes - 0.9 * self.max_bytes
+        removed = []
+        for key, size in self.connection.execute(
+                'SELECT key, size FROM cache ORDER BY atime'):
+            if excess <= 0:
+                break
+            removed.append((key,))
+            excess -= size
+        self.connection.executemany('DELETE FROM cache WHERE key = ?',
+                                    removed)
+
+    def clear(self):
+        with self.connection:
+            self.connection.execute('DELETE FROM cache')
+
+
+class CachedPredictor(Predictor):
+    """
+    Wrapper memoizing the scores of any Predictor
+
+    A score is looked up in an in-memory LRU tier, then in an optional
+    on-disk tier, and only computed by the wrapped predictor on a miss.
+    The keys start with a digest of the predictor version string (change
+    it when the model changes) and of the parent structure. Species-code
+    configurations are then keyed by the atomic numbers on every site, so
+    the keys do not depend on the order of the candidates list; other
+    samples (e.g. structures) by a hash of their canonical form.
+    """
+    def __init__(self, predictor, version='', structure=None, species=None,
+                 filename=None, memory_size=100000, max_bytes=2 ** 30):
+        """
+        Args:
+            predictor (Predictor): the predictor to memoize
+            version (str): version of the predictor, part of the keys
+            structure (Structure): parent structure of species-code
+                                   configurations
+            species (list): substituting elements of the species codes
+            filename (str or Path): SQLite file of the on-disk tier, no
+                                    on-disk tier if None
+            memory_size (int): maximum number of entries in memory
+            max_bytes (int): maximum size of the on-disk tier
+        """
+        super().__init__()
+        self.predictor = predictor
+        self.version = version
+        self.memory = LRUCache(memory_size)
+        self.disk = None
+        if filename is not None:
+            self.disk = DiskCache(filename, max_bytes=max_bytes)
+        self.atomic_numbers = None
+        parent = b''
+        if structure is not None:
+            if species is None:
+                raise ValueError('species is required with structure.')
+            from pymatgen.core import Element
+            # code 0 is the element of the parent on every site
+            self.parent_numbers = np.array(structure.atomic_numbers,
+                                           dtype=np.uint8)
+            self.atomic_numbers = np.array(
+                [0] + [Element(element).Z for element in species],
+                dtype=np.uint8)
+            parent = get_structure_key(structure)
+        self.prefix = hashlib.blake2b(version.encode() + b'\0' + parent,
+                                      digest_size=16).digest()
+
+    def get_statistics(self):
+        """
+        Return the hit/miss counters of both tiers
+        """
+        statistics = {
+            'memory_hits': self.memory.hits,
+            'memory_misses': self.memory.misses,
+        }
+        if self.disk is not None:
+            statistics['disk_hits'] = self.disk.hits
+            statistics['disk_misses'] = self.disk.misses
+        return statistics
+
+    def get_keys(self, proposed_samples):
+        """
+        Return the cache keys of a batch of samples
+        """
+        if hasattr(proposed_samples, 'configurations'):
+            # ConfigurationStore
+            proposed_samples = proposed_samples.configurations
+        if isinstance(proposed_samples, np.ndarray):
+            configurations = np.atleast_2d(proposed_samples)
+            if self.atomic_numbers is not None:
+                configurations = np.where(
+                    configurations == 0, self.parent_numbers,
+                    self.atomic_numbers[configurations])
+            prefix = np.frombuffer(self.prefix, dtype=np.uint8)
+            keys = np.concatenate([
+                np.broadcast_to(prefix, (len(configurations), len(prefix))),
+                configurations.astype(np.uint8)], axis=1)
+            # one bytes object per row
+            return keys.view(np.dtype((np.void, keys.shape[1]))).ravel() \
+                .tolist()
+        return [self.prefix + hashlib.blake2b(_get_sample_key(sample),
+                                              digest_size=16).digest()
+                for sample in proposed_samples]
+
+    def evaluate(self, proposed_sample):
+        if isinstance(proposed_sample, np.ndarray):
+            return self.evaluate_batch(proposed_sample[None])[0]
+        return self.evaluate_batch([proposed_sample])[0]
+
+    def verify(self, structure_score):
+        return self.predictor.verify(structure_score)
+
+    def evaluate_batch(self, proposed_samples):
+        if hasattr(proposed_samples, 'configurations'):
+            proposed_samples = proposed_samples.configurations
+        if not isinstance(proposed_samples, np.ndarray):
+            proposed_samples = list(proposed_samples)
+        keys = self.get_keys(proposed_samples)
+        scores = np.empty(len(keys))
+
+        missing = []
+        for index, key in enumerate(keys):
+            score = self.memory.get(key)
+            if score is None:
+                missing.append(index)
+            else:
+                scores[index] = score
+
+        if missing and self.disk is not None:
+            found = self.disk.get_many(keys[index] for index in missing)
+            for index in missing:
+                if keys[index] in found:
+                    scores[index] = found[keys[index]]
+                    self.memory.put(keys[index], found[keys[index]])
+            missing = [index for index in missing if keys[index] not in found]
+
+        if missing:
+            if isinstance(proposed_samples, np.ndarray):
+                samples = proposed_samples[missing]
+            else:
+                samples = [proposed_samples[index] for index in missing]
+            computed = self.predictor.evaluate_batch(samples)
+            scores[missing] = computed
+            items = {keys[index]: float(score)
+                     for index, score in zip(missing, computed)}
+            for key, score in items.items():
+                self.memory.put(key, score)
+            if self.disk is not None:
+                self.disk.put_many(items)
+        return scores
+
+    def verify_batch(self, structure_scores):
+        return self.predictor.verify_batch(structure_scores)
+
+
+def get_structure_key(structure, decimals=4):
+    """
+    Return a canonical key of a pymatgen Structure, independent of the
+    order of the sites
+    """
+    lattice = np.round(structure.lattice.matrix, decimals)
+    sites = sorted(
+        (site.species_string,
+         tuple(np.round(site.frac_coords % 1.0, decimals) % 1.0))
+        for site in structure
+    )
+    return repr((lattice.tolist(), sites)).encode()
+
+
+def _get_sample_key(sample):
+    """
+    Return the key of a sample that is not a species-code configuration
+    """
+    if hasattr(sample, 'lattice'):
+        return get_structure_key(sample)
+    if isinstance(sample, np.ndarray):
+        return sample.tobytes()
+    return repr(sample).encode()
@@ -1,8 +1,12 @@
-from pymatgen.core import Structure
-from pymatgen.io.ase import AseAtomsAdaptor
-from ase import Atoms
+import itertools
+import numpy as np
 from pathlib import Path
 
+# maximum number of elements of the (batch, operations, sites) array used
+# to remove symmetry-equivalent configurations
+MAX_BATCH_ELEMENTS = 2 ** 24
+
+
 class Materials(object):
     """
     A class characterizing materials under investigation
@@ -28,12 +32,19 @@ class Materials(object):
                                for the materials
             candidates (list): all potential elements for substitution
         """
+        # pymatgen and ASE are slow to import, they are only loaded when
+        # a Materials is created
+        from pymatgen.core import Structure
+        from ase import Atoms
+
         self.selected_atoms = []
+        self._permutations = {}
         if isinstance(material, Structure):
             # pymatgen Structure
             self.structure = material
         elif isinstance(material, Atoms):
             # ase Atoms
+            from pymatgen.io.ase import AseAtomsAdaptor
             self.structure = AseAtomsAdaptor.get_structure(material)
         elif isinstance(material, Path):
             self.structure = Structure.from_file(str(material))
@@ -74,4 +85,196 @@ class Materials(object):
         return self.candidates
 
     def set_selected_atoms(self, selected_atoms):
-        self.selected_atoms = selected_atoms
\ No newline at end of file
+        self.selected_atoms = selected_atoms
+
+    def get_symmetry_permutations(self, symprec=0.01):
+        """
+        Return the site permutations of the space-group operations
+
+        Args:
+            symprec (float): tolerance (in Angstrom) of the symmetry analysis
+
+        Returns:
+            np.ndarray: integer array of shape (n_operations, n_sites),
+                        row g maps every site i to its image under
+                        operation g
+        """
+        if symprec in self._permutations:
+            return self._permutations[symprec]
+        from pymatgen.symmetry.analyzer import SpacegroupAnalyzer
+        analyzer = SpacegroupAnalyzer(self.structure, symprec=symprec)
+        operations = analyzer.get_symmetry_operations(cartesian=False)
+        frac_coords = self.structure.frac_coords
+        lattice = self.structure.lattice.matrix
+        species = np.array([site.species_string for site in self.structure])
+
+        permutations = []
+        for operation in operations:
+            images = frac_coords @ operation.rotation_matrix.T \
+                + operation.translation_vector
+            diff = images[:, None, :] - frac_coords[None, :, :]
+            diff -= np.round(diff)
+            distances = np.linalg.norm(diff @ lattice, axis=2)
+            permutation = distances.argmin(axis=1)
+            sites = np.arange(len(permutation))
+            if np.any(distances[sites, permutation] > 10 * symprec) or \
+                    np.any(species[permutation] != species):
+                raise ValueError('Symmetry operation does not map the '
+                                 'structure onto itself.')
+            permutations.append(permutation)
+
+        permutations = np.unique(np.array(permutations, dtype=np.intp),
+                                 axis=0)
+        self._permutations[symprec] = permutations
+        return permutations
+
+    def get_site_orbits(self, symprec=0.01):
+        """
+        Return the orbits of symmetry-equivalent sites
+
+        Args:
+            symprec (float): tolerance (in Angstrom) of the symmetry analysis
+
+        Returns:
+            list: one sorted array of site indices per orbit, ordered by the
+                  first site of the orbit
+        """
+        permutations = self.get_symmetry_permutations(symprec)
+        orbits = {}
+        for site in range(permutations.shape[1]):
+            orbit = np.unique(permutations[:, site])
+            orbits.setdefault(orbit[0], orbit)
+        return [orbits[first] for first in sorted(orbits)]
+
+    def iter_configurations(self, orbits=None, candidates=None,
+                            n_substitutions=1, symprec=0.01):
+        """
+        Lazily enumerate the symmetry-distinct substitution configurations
+
+        A configuration is an array of species codes, one per site of
+        self.structure: 0 keeps the original element and k substitutes the
+        site by candidates[k - 1]. Configurations are generated in batches
+        and only the lexicographically smallest configuration of every
+        symmetry orbit is yielded, therefore no configuration has to be
+        remembered and the memory does not grow with the number of
+        configurations.
+
+        Args:
+            orbits (list): indices (in get_site_orbits) of the site orbits
+                           that can be substituted, all orbits if None
+            candidates (list): substituting elements, self.candidates if
+                               None
+            n_substitutions (int): number of substituted sites
+            symprec (float): tolerance (in Angstrom) of the symmetry analysis
+
+        Yields:
+            np.ndarray: uint8 species codes of shape (n_sites,)
+        """
+        if candidates is None:
+            candidates = self.candidates
+        if len(candidates) > np.iinfo(np.uint8).max:
+            raise ValueError('Too many candidates for uint8 species codes.')
+        permutations = self.get_symmetry_permutations(symprec)
+        site_orbits = self.get_site_orbits(symprec)
+        if orbits is None:
+            orbits = range(len(site_orbits))
+        sites = np.sort(np.concatenate([site_orbits[i] for i in orbits]))
+
+        n_sites = permutations.shape[1]
+        batch_size = max(1, MAX_BATCH_ELEMENTS // permutations.size)
+        codes = range(1, len(candidates) + 1)
+        substitutions = (
+            (combination, species)
+            for combination in itertools.combinations(sites, n_substitutions)
+            for species in itertools.product(codes, repeat=n_substitutions)
+        )
+        while True:
+            batch = list(itertools.islice(substitutions, batch_size))
+            if not batch:
+                return
+            combinations = np.array([combination for combination, _ in batch],
+                                    dtype=np.intp)
+            species = np.array([species for _, species in batch],
+                               dtype=np.uint8)
+            configurations = np.zeros((len(batch), n_sites), dtype=np.uint8)
+            rows = np.arange(len(batch))[:, None]
+            configurations[rows, combinations] = species
+            canonical = _is_canonical(configurations, permutations)
+            for configuration in configurations[canonical]:
+                yield configuration
+
+    def iter_substitutions(self, orbits=None, candidates=None,
+                           n_substitutions=1, symprec=0.01):
+        """
+        Lazily enumerate the symmetry-distinct substituted structures
+
+        Same arguments as iter_configurations, the pymatgen Structure is
+        only built when it is consumed.
+
+        Yields:
+            Structure: the substituted structure
+        """
+        if candidates is None:
+            candidates = self.candidates
+        for configuration in self.iter_configurations(
+                orbits, candidates, n_substitutions, symprec):
+            yield self.build_structure(configuration, candidates)
+
+    def build_structure(self, configuration, candidates=None):
+        """
+        Build the substituted structure of a configuration
+
+        Args:
+            configuration (np.ndarray): species codes, see
+                                        iter_configurations
+            candidates (list): substituting elements, self.candidates if
+                               None
+
+        Returns:
+            Structure: the substituted structure
+        """
+        if candidates is None:
+            candidates = self.candidates
+        return substitute(self.structure, configuration, candidates)
+
+
+def substitute(structure, configuration, candidates):
+    """
+    Build a substituted copy of a structure
+
+    Args:
+        structure (Structure): the parent structure
+        configuration (np.ndarray): species codes, 0 keeps the element of
+                                    the parent and k substitutes the site by
+                                    candidates[k - 1]
+        candidates (list): substituting elements
+
+    Returns:
+        Structure: the substituted structure
+    """
+    structure = structure.copy()
+    for site in np.flatnonzero(configuration):
+        structure.replace(int(site), candidates[configuration[site] - 1])
+    return structure
+
+
+def _is_canonical(configurations, permutations):
+    """
+    Check which configurations are the smallest of their symmetry orbit
+
+    Args:
+        configurations (np.ndarray): species codes, shape (n, n_sites)
+        permutations (np.ndarray): site permutations, shape
+                                   (n_operations, n_sites)
+
+    Returns:
+        np.ndarray: boolean mask of shape (n,), True if no symmetry image of
+                    the configuration is lexicographically smaller
+    """
+    images = configurations[:, permutations]
+    differs = images != configurations[:, None, :]
+    first = differs.argmax(axis=2)
+    image_codes = np.take_along_axis(images, first[..., None], axis=2)[..., 0]
+    codes = np.take_along_axis(configurations, first, axis=1)
+    smaller = differs.any(axis=2) & (image_codes < codes)
+    return ~smaller.any(axis=1)
@@ -0,0 +1,138 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from .materials import substitute
+from .predictor import Predictor, _iter_batches
+
+# state of a worker process, set once by _initialize_worker
+_worker = {}
+
+
+def _initialize_worker(predictor, structure, species):
+    """
+    Receive the predictor and the parent structure once per worker
+    """
+    _worker['predictor'] = predictor
+    _worker['structure'] = structure
+    _worker['species'] = species
+
+
+def _evaluate_chunk(chunk):
+    """
+    Score a chunk of samples in a worker process
+    """
+    predictor = _worker['predictor']
+    structure = _worker['structure']
+    if structure is not None:
+        # build the substituted structures from the species codes
+        chunk = [substitute(structure, configuration, _worker['species'])
+                 for configuration in chunk]
+    return predictor.evaluate_batch(chunk)
+
+
+class ParallelPredictor(Predictor):
+    """
+    Wrapper scoring the batches of any Predictor on a process pool
+
+    The samples are split into chunks evaluated by
+    predictor.evaluate_batch in the worker processes. The predictor and the
+    parent structure are sent once to every worker (pool initializer), only
+    the chunks of samples are sent with every task. The scores stream back
+    in the order of the samples.
+    """
+    def __init__(self, predictor, structure=None, species=None,
+                 n_workers=None, chunk_size=1024, prefetch=2):
+        """
+        Args:
+            predictor (Predictor): the predictor to parallelize, it must be
+                                   picklable
+            structure (Structure): parent structure; if given, the samples
+                                   are species-code configurations and the
+                                   workers build the substituted Structures
+                                   evaluated by the predictor
+            species (list): substituting elements of the species codes
+            n_workers (int): number of worker processes, os.cpu_count() if
+                             None
+            chunk_size (int): number of samples per task
+            prefetch (int): number of tasks in flight per worker
+        """
+        super().__init__()
+        if structure is not None and species is None:
+            raise ValueError('species is required with structure.')
+        self.predictor = predictor
+        self.structure = structure
+        self.species = species
+        self.n_workers = n_workers or os.cpu_count()
+        self.chunk_size = chunk_size
+        self.prefetch = prefetch
+        self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def get_executor(self):
+        """
+        Return the process pool, started on first use
+        """
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.n_workers,
+                initializer=_initialize_worker,
+                initargs=(self.predictor, self.structure, self.species))
+        return self._executor
+
+    def close(self):
+        """
+        Shut down the process pool
+        """
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def iter_chunks(self, proposed_samples):
+        """
+        Split the samples into chunks of chunk_size samples
+        Species matrices and ConfigurationStores are sliced, any other
+        iterable (e.g. Materials.iter_configurations) is consumed lazily
+        """
+        return _iter_batches(proposed_samples, self.chunk_size)
+
+    def iter_evaluate(self, proposed_samples):
+        """
+        Score the samples on the process pool
+        At most n_workers * prefetch chunks are in flight, therefore the
+        samples can be a generator of any length
+        Yield:
+            np.ndarray: the scores of every chunk, in order
+        """
+        executor = self.get_executor()
+        window = self.n_workers * self.prefetch
+        futures = deque()
+        for chunk in self.iter_chunks(proposed_samples):
+            futures.append(executor.submit(_evaluate_chunk, chunk))
+            if len(futures) >= window:
+                yield futures.popleft().result()
+        while futures:
+            yield futures.popleft().result()
+
+    def evaluate(self, proposed_sample):
+        if self.structure is not None:
+            proposed_sample = substitute(self.structure, proposed_sample,
+                                         self.species)
+        return self.predictor.evaluate(proposed_sample)
+
+    def verify(self, structure_score):
+        return self.predictor.verify(structure_score)
+
+    def evaluate_batch(self, proposed_samples):
+        scores = list(self.iter_evaluate(proposed_samples))
+        if not scores:
+            return np.zeros(0)
+        return np.concatenate(scores)
+
+    def verify_batch(self, structure_scores):
+        return self.predictor.verify_batch(structure_scores)
@@ -0,0 +1,161 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from .predictor import _iter_batches
+
+
+class Pipeline(object):
+    """
+    Streaming Materials -> Predictor -> Validator orchestrator
+
+    The configurations of Materials are enumerated and scored by batches,
+    the accepted samples (verify_batch) are submitted to the Validator.
+    At most max_in_flight validations run at the same time: when the
+    window is full, enumeration and scoring pause until validations
+    finish, so memory stays constant and the cluster is kept busy.
+    The blocking submit, poll and results methods of the Validator run one
+    at a time in a dedicated thread, so that they do not block the event
+    loop (e.g. of a notebook) while they wait for the database or the
+    cluster.
+    """
+    def __init__(self, materials, predictor, validator, batch_size=1024,
+                 max_in_flight=16, poll_interval=10., on_result=None,
+                 **enumeration):
+        """
+        Args:
+            materials (Materials): the substitution problem
+            predictor (Predictor): scores the configurations
+            validator (Validator): validates the accepted structures
+            batch_size (int): number of configurations scored at once
+            max_in_flight (int): maximum number of running validations
+            poll_interval (float): seconds between two polls of the
+                                   running validations
+            on_result (callable): called as on_result(structure, score,
+                                  result) for every finished validation
+            enumeration: arguments of Materials.iter_configurations
+                         (orbits, candidates, n_substitutions, symprec)
+        """
+        self.materials = materials
+        self.predictor = predictor
+        self.validator = validator
+        self.batch_size = batch_size
+        self.max_in_flight = max_in_flight
+        self.poll_interval = poll_interval
+        self.on_result = on_result
+        self.enumeration = enumeration
+        self.statistics = {}
+
+    def run(self):
+        """
+        Run the pipeline until all validations are finished
+        (in a notebook, where an event loop is running, use
+        `await pipeline.run_async()` instead)
+        Return:
+            dict: the statistics of the pipeline
+        """
+        return asyncio.run(self.run_async())
+
+    async def run_async(self):
+        """
+        Coroutine running the pipeline, see run
+        """
+        self.statistics = {
+            'enumerated': 0,
+            'accepted': 0,
+            'submitted': 0,
+            'finished': 0,
+            'max_in_flight': 0,
+        }
+        self._window = asyncio.Semaphore(self.max_in_flight)
+        self._in_flight = []
+        self._producing = True
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        producer = asyncio.ensure_future(self.produce())
+        poller = asyncio.ensure_future(self.poll())
+        try:
+            # an exception in either coroutine (e.g. in the validator or
+            # on_result) stops the pipeline instead of leaving the other one
+            # waiting forever
+            done, _ = await asyncio.wait(
+                {producer, poller}, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                task.result()
+            # the poller only returns once production is over
+            await producer
+            self._producing = False
+            await poller
+        finally:
+            running = [task for task in (producer, poller)
+                       if not task.done()]
+            for task in running:
+                task.cancel()
+            await asyncio.gather(*running, return_exceptions=True)
+            self._executor.shutdown()
+        return self.statistics
+
+    async def call_validator(self, method, *args):
+        """
+        Run a blocking method of the validator in the validator thread
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, method, *args)
+
+    def iter_batches(self):
+        """
+        Enumerate the configurations of Materials by batches
+        """
+        configurations = self.materials.iter_configurations(
+            **self.enumeration)
+        return _iter_batches(configurations, self.batch_size)
+
+    async def produce(self):
+        """
+        Score the configurations and submit the accepted ones
+        """
+        candidates = self.enumeration.get('candidates')
+        for batch in self.iter_batches():
+            self.statistics['enumerated'] += len(batch)
+            scores = self.predictor.evaluate_batch(batch)
+            accepted = np.flatnonzero(self.predictor.verify_batch(scores))
+            self.statistics['accepted'] += len(accepted)
+            for index in accepted:
+                # wait for a free slot (backpressure)
+                await self._window.acquire()
+                structure = self.materials.build_structure(batch[index],
+                                                           candidates)
+                handle = await self.call_validator(self.validator.submit,
+                                                   structure)
+                self._in_flight.append((handle, structure, scores[index]))
+                self.statistics['submitted'] += 1
+                self.statistics['max_in_flight'] = max(
+                    self.statistics['max_in_flight'], len(self._in_flight))
+            # let the poller run between two batches
+            await asyncio.sleep(0)
+
+    async def poll(self):
+        """
+        Collect the finished validations and free their slots
+        """
+        while self._producing or self._in_flight:
+            if self._in_flight:
+                # the producer can submit more validations while polling
+                polled = list(self._in_flight)
+                finished = await self.call_validator(
+                    self.validator.poll,
+                    [handle for handle, _, _ in polled])
+                done = [item for item, is_finished in zip(polled, finished)
+                        if is_finished]
+                done_ids = {id(item) for item in done}
+                self._in_flight = [item for item in self._in_flight
+                                   if id(item) not in done_ids]
+                if done:
+                    results = await self.call_validator(
+                        self.validator.results,
+                        [handle for handle, _, _ in done])
+                    for (_, structure, score), result in zip(done, results):
+                        self.statistics['finished'] += 1
+                        if self.on_result is not None:
+                            self.on_result(structure, score, result)
+                        self._window.release()
+                    continue
+            await asyncio.sleep(self.poll_interval)
@@ -1,3 +1,8 @@
+import itertools
+import numpy as np
+from .selection import TopKSelector
+
+
 class Predictor(object):
     """
     A class for predicting new material
@@ -43,4 +48,140 @@ class Predictor(object):
         else:
             return False
 
+    def evaluate_batch(self, proposed_samples):
+        """
+        Evaluate (score) a batch of proposed samples
+        Subclasses should override it with a vectorized implementation,
+        the default calls evaluate for every sample
+        Input:
+            proposed_samples: species matrix (n_samples, n_sites),
+                              ConfigurationStore or list of structures
+        Return:
+            np.ndarray: the scores of shape (n_samples,)
+        """
+        return np.array([self.evaluate(sample)
+                         for sample in _iter_samples(proposed_samples)],
+                        dtype=float)
+
+    def verify_batch(self, structure_scores):
+        """
+        Justify a batch of scores obtained from evaluate_batch
+        The default calls verify for every score
+        Input:
+            structure_scores: the scores of the samples
+        Return:
+            np.ndarray: boolean mask, True for the optimal structures
+        """
+        return np.array([bool(self.verify(score))
+                         for score in structure_scores], dtype=bool)
+
+    def select_top_k(self, proposed_samples, k, batch_size=4096,
+                     max_per_composition=None):
+        """
+        Screen a stream of samples and keep the k best scored ones,
+        instead of the fixed threshold of verify
+        Input:
+            proposed_samples: species matrix, ConfigurationStore or any
+                              iterable of samples (e.g. a generator from
+                              Materials.iter_configurations)
+            k: number of selected samples
+            batch_size: number of samples scored by one evaluate_batch
+            max_per_composition: maximum number of selected samples with
+                                 the same composition
+        Return:
+            TopKSelector: the selection, its shortlist method returns the
+                          samples for the Validator
+        """
+        selector = TopKSelector(k, max_per_composition)
+        for batch in _iter_batches(proposed_samples, batch_size):
+            selector.push_batch(self.evaluate_batch(batch), batch)
+        return selector
+
+
+class SiteWeightPredictor(Predictor):
+    """
+    Reference vectorized predictor on species-code configurations
+    (see Materials.iter_configurations and ConfigurationStore)
+
+    The descriptor of a configuration is the one-hot encoding of the
+    species code of every site, the score is a logistic function of a
+    linear model on it:
+        score = 1 / (1 + exp(-(bias + sum_i weights[i, code_i])))
+    """
+    def __init__(self, weights, bias=0., threshold=0.5):
+        """
+        Args:
+            weights (np.ndarray): weights of shape (n_sites, n_codes),
+                                  n_codes = number of candidates + 1
+            bias (float): constant term of the linear model
+            threshold (float): minimum score of an optimal structure
+        """
+        super().__init__()
+        self.weights = np.asarray(weights, dtype=float)
+        self.bias = bias
+        self.threshold = threshold
+
+    def evaluate(self, proposed_sample):
+        """
+        Score one configuration (species codes of shape (n_sites,))
+        """
+        energy = self.bias
+        for site, code in enumerate(proposed_sample):
+            energy += self.weights[site, code]
+        return 1. / (1. + np.exp(-energy))
+
+    def verify(self, structure_score):
+        return structure_score > self.threshold
+
+    def evaluate_batch(self, proposed_samples):
+        configurations = _as_matrix(proposed_samples)
+        sites = np.arange(configurations.shape[1])
+        energies = self.bias + self.weights[sites, configurations].sum(axis=1)
+        return 1. / (1. + np.exp(-energies))
+
+    def verify_batch(self, structure_scores):
+        return np.asarray(structure_scores) > self.threshold
+
 
+def _iter_samples(samples):
+    """
+    Iterate over the samples of a batch
+    """
+    if hasattr(samples, 'configurations'):
+        # ConfigurationStore
+        samples = samples.configurations
+    return iter(samples)
+
+
+def _iter_batches(samples, batch_size):
+    """
+    Split the samples into batches of batch_size samples
+    Species matrices and ConfigurationStores are sliced, any other
+    iterable (e.g. Materials.iter_configurations) is consumed lazily and
+    its batches of species codes are stacked into matrices
+    """
+    if hasattr(samples, 'configurations'):
+        # ConfigurationStore
+        samples = samples.configurations
+    if isinstance(samples, np.ndarray):
+        for start in range(0, len(samples), batch_size):
+            yield samples[start:start + batch_size]
+        return
+    samples = iter(samples)
+    while True:
+        batch = list(itertools.islice(samples, batch_size))
+        if not batch:
+            return
+        if isinstance(batch[0], np.ndarray):
+            batch = np.array(batch)
+        yield batch
+
+
+def _as_matrix(samples):
+    """
+    Return the species matrix of a batch of configurations
+    """
+    if hasattr(samples, 'configurations'):
+        # ConfigurationStore
+        return samples.configurations
+    return np.atleast_2d(np.asarray(samples))
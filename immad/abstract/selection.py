@@ -0,0 +1,163 @@
+import heapq
+import itertools
+import numpy as np
+
+
+class TopKSelector(object):
+    """
+    Streaming selection of the k best scored samples
+
+    The selector keeps a bounded min-heap of the best k samples seen so
+    far, so that an unbounded stream of candidates is screened in O(k)
+    memory. Optionally, at most max_per_composition samples of the same
+    composition are kept to diversify the shortlist.
+    """
+    def __init__(self, k, max_per_composition=None, get_composition=None):
+        """
+        Args:
+            k (int): number of selected samples
+            max_per_composition (int): maximum number of selected samples
+                                       with the same composition, no limit
+                                       if None
+            get_composition (callable): function returning the (hashable)
+                                        composition of a sample, default
+                                        see get_composition
+        """
+        if k < 1:
+            raise ValueError('k must be positive.')
+        self.k = k
+        self.max_per_composition = max_per_composition
+        if get_composition is not None:
+            self.get_composition = get_composition
+        self.size = 0
+        self.seen = 0
+        # entries are [score, counter, alive, sample, composition], removed
+        # entries are only marked as dead and dropped lazily from the heaps
+        self._heap = []
+        self._compositions = {}
+        self._counts = {}
+        self._counter = itertools.count()
+
+    def __len__(self):
+        return self.size
+
+    @staticmethod
+    def get_composition(sample):
+        """
+        Return the composition of a sample: the reduced formula of a
+        structure or the number of sites per species code of a
+        configuration
+        """
+        if hasattr(sample, 'composition'):
+            return sample.composition.reduced_formula
+        return tuple(np.bincount(sample).tolist())
+
+    @property
+    def threshold(self):
+        """
+        Minimum score to enter the selection, -inf until k samples are
+        selected
+        """
+        if self.size < self.k:
+            return -np.inf
+        return self._top(self._heap)[0]
+
+    def push(self, score, sample):
+        """
+        Offer a scored sample to the selection
+
+        Returns:
+            bool: True if the sample is selected (for now)
+        """
+        self.seen += 1
+        if score <= self.threshold:
+            return False
+        if isinstance(sample, np.ndarray):
+            # do not keep the whole batch alive through a view
+            sample = sample.copy()
+
+        composition = None
+        if self.max_per_composition is not None:
+            composition = self.get_composition(sample)
+            if self._counts.get(composition, 0) >= \
+                    self.max_per_composition:
+                worst = self._top(self._compositions[composition])
+                if score <= worst[0]:
+                    return False
+                self._remove(worst)
+
+        entry = [score, next(self._counter), True, sample, composition]
+        heapq.heappush(self._heap, entry)
+        if composition is not None:
+            heapq.heappush(self._compositions.setdefault(composition, []),
+                           entry)
+            self._counts[composition] = self._counts.get(composition, 0) + 1
+        self.size += 1
+
+        if self.size > self.k:
+            self._remove(self._top(self._heap))
+        if len(self._heap) > 2 * self.k:
+            self._compact()
+        return True
+
+    def push_batch(self, scores, samples):
+        """
+        Offer a batch of scored samples to the selection
+
+        Args:
+            scores (np.ndarray): the scores of the samples
+            samples: the samples (species matrix, ConfigurationStore or
+                     list)
+        """
+        if hasattr(samples, 'configurations'):
+            # ConfigurationStore
+            samples = samples.configurations
+        scores = np.asarray(scores)
+        # only the samples above the current threshold can be selected
+        candidates = np.flatnonzero(scores > self.threshold)
+        self.seen += len(scores) - len(candidates)
+        for index in candidates[np.argsort(-scores[candidates],
+                                           kind='stable')]:
+            self.push(scores[index], samples[index])
+
+    def results(self):
+        """
+        Return the selected (score, sample) pairs, best first
+        """
+        entries = sorted((entry for entry in self._heap if entry[2]),
+                         key=lambda entry: (-entry[0], entry[1]))
+        return [(entry[0], entry[3]) for entry in entries]
+
+    def shortlist(self):
+        """
+        Return the selected samples, best first, e.g. for Validator.run
+        """
+        return [sample for _, sample in self.results()]
+
+    def _top(self, heap):
+        """
+        Return the smallest alive entry of a heap
+        """
+        while not heap[0][2]:
+            heapq.heappop(heap)
+        return heap[0]
+
+    def _remove(self, entry):
+        entry[2] = False
+        self.size -= 1
+        composition = entry[4]
+        if composition is not None:
+            self._counts[composition] -= 1
+            if self._counts[composition] == 0:
+                del self._counts[composition]
+                del self._compositions[composition]
+
+    def _compact(self):
+        """
+        Drop the dead entries of the heaps
+        """
+        self._heap = [entry for entry in self._heap if entry[2]]
+        heapq.heapify(self._heap)
+        for composition, heap in self._compositions.items():
+            heap[:] = [entry for entry in heap if entry[2]]
+            heapq.heapify(heap)
@@ -0,0 +1,251 @@
+import json
+import struct
+import numpy as np
+from .materials import Materials, substitute
+
+MAGIC = b'IMMADCFG'
+FORMAT_VERSION = 1
+# the species matrix starts at a multiple of ALIGNMENT bytes in the file
+ALIGNMENT = 64
+
+
+class ConfigurationStore(object):
+    """
+    A compact store of substitution configurations
+
+    The parent structure is kept once, every configuration is a row of
+    species codes in a (n_configs, n_sites) uint8 matrix: 0 keeps the
+    element of the parent and k substitutes the site by species[k - 1]
+    (same convention as Materials.iter_configurations).
+    Structures are only built on demand.
+    """
+    def __init__(self, structure, species, configurations=None):
+        """
+        Initialize the store
+
+        Args:
+            structure (Structure): the parent structure
+            species (list): substituting elements
+            configurations (np.ndarray): species codes of shape
+                                         (n_configs, n_sites), empty if None
+        """
+        self.structure = structure
+        self.species = list(species)
+        if configurations is None:
+            configurations = np.zeros((0, len(structure)), dtype=np.uint8)
+        configurations = np.asarray(configurations)
+        if configurations.ndim != 2 or \
+                configurations.shape[1] != len(structure):
+            raise ValueError('Configurations must have shape '
+                             f'(n_configs, {len(structure)}).')
+        if configurations.dtype != np.uint8:
+            configurations = configurations.astype(np.uint8)
+        self.configurations = configurations
+
+    @classmethod
+    def from_materials(cls, materials, orbits=None, candidates=None,
+                       n_substitutions=1, symprec=0.01, chunk_size=65536):
+        """
+        Enumerate the configurations of a Materials into a store
+
+        Args:
+            materials (Materials): the substitution problem
+            orbits, candidates, n_substitutions, symprec: see
+                Materials.iter_configurations
+            chunk_size (int): number of configurations copied at once
+
+        Returns:
+            ConfigurationStore: the store of the distinct configurations
+        """
+        if not isinstance(materials, Materials):
+            raise TypeError('Datatype not supported.')
+        if candidates is None:
+            candidates = materials.candidates
+        configurations = materials.iter_configurations(
+            orbits, candidates, n_substitutions, symprec)
+        n_sites = len(materials.structure)
+        chunks = []
+        chunk = []
+        for configuration in configurations:
+            chunk.append(configuration)
+            if len(chunk) == chunk_size:
+                chunks.append(np.array(chunk, dtype=np.uint8))
+                chunk = []
+        if chunk:
+            chunks.append(np.array(chunk, dtype=np.uint8))
+        if chunks:
+            matrix = np.concatenate(chunks)
+        else:
+            matrix = np.zeros((0, n_sites), dtype=np.uint8)
+        return cls(materials.structure, candidates, matrix)
+
+    @property
+    def n_sites(self):
+        """
+        Number of sites of the parent structure
+        """
+        return self.configurations.shape[1]
+
+    def __len__(self):
+        return self.configurations.shape[0]
+
+    def __getitem__(self, index):
+        """
+        Return the species codes of one configuration for an integer index,
+        otherwise a store of the selected configurations (slice, index
+        array or boolean mask)
+        """
+        if isinstance(index, (int, np.integer)):
+            return self.configurations[index]
+        return self.__class__(self.structure, self.species,
+                              self.configurations[index])
+
+    def __iter__(self):
+        return iter(self.configurations)
+
+    def append(self, configurations):
+        """
+        Add configurations to the store (copies the species matrix)
+
+        Args:
+            configurations (np.ndarray): species codes of shape
+                                         (n, n_sites) or (n_sites,)
+        """
+        configurations = np.atleast_2d(
+            np.asarray(configurations, dtype=np.uint8))
+        self.configurations = np.concatenate(
+            [self.configurations, configurations])
+
+    def filter(self, condition):
+        """
+        Select the configurations satisfying a condition
+
+        Args:
+            condition: boolean mask of shape (n_configs,) or a function
+                       receiving the species matrix and returning such mask
+
+        Returns:
+            ConfigurationStore: the store of the selected configurations
+        """
+        if callable(condition):
+            condition = condition(self.configurations)
+        mask = np.asarray(condition, dtype=bool)
+        if mask.shape != (len(self),):
+            raise ValueError(f'Mask must have shape ({len(self)},).')
+        return self[mask]
+
+    def count_substitutions(self):
+        """
+        Return the number of substituted sites of every configuration
+        """
+        return np.count_nonzero(self.configurations, axis=1)
+
+    def get_hashes(self):
+        """
+        Return a 64-bit hash of every configuration (row)
+
+        Returns:
+            np.ndarray: uint64 array of shape (n_configs,)
+        """
+        # FNV-1a over the bytes of the rows, vectorized over the rows
+        hashes = np.full(len(self), 0xcbf29ce484222325, dtype=np.uint64)
+        prime = np.uint64(0x100000001b3)
+        with np.errstate(over='ignore'):
+            for column in range(self.n_sites):
+                hashes ^= self.configurations[:, column].astype(np.uint64)
+                hashes *= prime
+        return hashes
+
+    def unique(self):
+        """
+        Remove duplicated configurations, keeping the first occurrence
+
+        Returns:
+            ConfigurationStore: the store without duplicates
+        """
+        rows = np.ascontiguousarray(self.configurations).view(
+            np.dtype((np.void, self.n_sites))).ravel()
+        _, first = np.unique(rows, return_index=True)
+        return self[np.sort(first)]
+
+    def to_structure(self, index):
+        """
+        Build the substituted pymatgen Structure of a configuration
+        """
+        return substitute(self.structure, self.configurations[index],
+                          self.species)
+
+    def to_structuredata(self, index):
+        """
+        Build the substituted AiiDA StructureData of a configuration
+        """
+        from aiida import orm
+
+        return orm.StructureData(pymatgen=self.to_structure(index))
+
+    def iter_structures(self):
+        """
+        Lazily build the Structure of every configuration
+        """
+        for index in range(len(self)):
+            yield self.to_structure(index)
+
+    def save(self, filename):
+        """
+        Write the store to a single file
+
+        The file holds a magic string, the length of a JSON header
+        (parent structure, species, shape) and the raw species matrix,
+        aligned so that it can be memory-mapped by load.
+
+        Args:
+            filename (str or Path): the output file
+        """
+        header = json.dumps({
+            'version': FORMAT_VERSION,
+            'structure': self.structure.as_dict(),
+            'species': self.species,
+            'shape': list(self.configurations.shape),
+        }).encode()
+        prefix = len(MAGIC) + struct.calcsize('<Q')
+        header += b' ' * (-(prefix + len(header)) % ALIGNMENT)
+        with open(filename, 'wb') as handle:
+            handle.write(MAGIC)
+            handle.write(struct.pack('<Q', len(header)))
+            handle.write(header)
+            handle.write(np.ascontiguousarray(self.configurations).tobytes())
+
+    @classmethod
+    def load(cls, filename, mmap=True):
+        """
+        Read a store written by save
+
+        Args:
+            filename (str or Path): the input file
+            mmap (bool): memory-map the species matrix (read-only) instead
+                         of reading it into memory
+
+        Returns:
+            ConfigurationStore: the store
+        """
+        with open(filename, 'rb') as handle:
+            if handle.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f'{filename} is not a configuration store.')
+            (length,) = struct.unpack('<Q', handle.read(struct.calcsize('<Q')))
+            header = json.loads(handle.read(length))
+            offset = handle.tell()
+            if header['version'] != FORMAT_VERSION:
+                raise ValueError('Unsupported configuration store version '
+                                 f'{header["version"]}.')
+            shape = tuple(header['shape'])
+            if mmap and shape[0] > 0:
+                configurations = np.memmap(filename, dtype=np.uint8,
+                                           mode='r', offset=offset,
+                                           shape=shape)
+            else:
+                configurations = np.fromfile(
+                    handle, dtype=np.uint8,
+                    count=shape[0] * shape[1]).reshape(shape)
+        from pymatgen.core import Structure
+        structure = Structure.from_dict(header['structure'])
+        return cls(structure, header['species'], configurations)
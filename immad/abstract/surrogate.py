@@ -0,0 +1,156 @@
+import numpy as np
+from .predictor import Predictor, _as_matrix
+from .selection import TopKSelector
+
+
+class SurrogatePredictor(Predictor):
+    """
+    Active-learning surrogate on species-code configurations
+
+    Bayesian ridge regression of a target property (e.g. the total energy
+    of DFTWorkChain) on the one-hot site descriptor of the configurations
+    plus a constant term. The inverse of the regularized Gram matrix is
+    kept, so that every new observation is added with a Sherman-Morrison
+    rank-one update in O(d^2) operations (d = n_sites * n_codes + 1)
+    instead of a refit on the whole history.
+
+    The score is the predicted target (negated if minimize), select_batch
+    picks the next samples with the upper confidence bound
+    score + kappa * std.
+    """
+    def __init__(self, n_sites, n_codes, alpha=1., noise=1.,
+                 minimize=True, threshold=None):
+        """
+        Args:
+            n_sites (int): number of sites of the configurations
+            n_codes (int): number of species codes (candidates + 1)
+            alpha (float): ridge regularization (prior precision)
+            noise (float): standard deviation of the observation noise
+            minimize (bool): lower targets are better (e.g. energies)
+            threshold (float): minimum score accepted by verify, all
+                               scores are accepted if None
+        """
+        super().__init__()
+        self.n_sites = n_sites
+        self.n_codes = n_codes
+        self.alpha = alpha
+        self.noise = noise
+        self.sign = -1. if minimize else 1.
+        self.threshold = threshold
+        self.n_features = n_sites * n_codes + 1
+        self.reset()
+
+    def reset(self):
+        """
+        Forget all observations
+        """
+        self.covariance = np.eye(self.n_features) / self.alpha
+        self.moment = np.zeros(self.n_features)
+        self.weights = np.zeros(self.n_features)
+        self.n_observations = 0
+
+    def get_descriptors(self, configurations):
+        """
+        Return the one-hot site descriptors (with a constant feature)
+        Input:
+            configurations: species codes of shape (n, n_sites)
+        Return:
+            np.ndarray: descriptors of shape (n, n_features)
+        """
+        configurations = _as_matrix(configurations)
+        descriptors = np.zeros((len(configurations), self.n_features))
+        columns = np.arange(self.n_sites) * self.n_codes + configurations
+        np.put_along_axis(descriptors, columns, 1., axis=1)
+        descriptors[:, -1] = 1.
+        return descriptors
+
+    def predict(self, configurations):
+        """
+        Predict the target and its standard deviation
+        Return:
+            (np.ndarray, np.ndarray): mean and standard deviation
+        """
+        descriptors = self.get_descriptors(configurations)
+        mean = descriptors @ self.weights
+        variance = np.einsum('ij,jk,ik->i', descriptors, self.covariance,
+                             descriptors)
+        return mean, self.noise * np.sqrt(1. + variance)
+
+    def update(self, configuration, value):
+        """
+        Add one observation with a Sherman-Morrison rank-one update
+        Input:
+            configuration: species codes of shape (n_sites,)
+            value: the observed target
+        """
+        descriptor = self.get_descriptors(configuration)[0]
+        projection = self.covariance @ descriptor
+        self.covariance -= np.outer(projection, projection) / \
+            (1. + descriptor @ projection)
+        self.moment += descriptor * value
+        self.weights = self.covariance @ self.moment
+        self.n_observations += 1
+
+    def update_batch(self, configurations, values):
+        """
+        Add many observations (one rank-one update each)
+        """
+        for configuration, value in zip(_as_matrix(configurations), values):
+            self.update(configuration, value)
+
+    def update_from_results(self, configurations, results,
+                            key='energy'):
+        """
+        Add the observations of finished validations, e.g. the results of
+        DFTValidator (failed validations are skipped)
+        Input:
+            configurations: species codes of the validated samples
+            results: list of dictionaries with the scf_parameters output
+            key: the output parameter used as target
+        Return:
+            int: the number of added observations
+        """
+        added = 0
+        for configuration, result in zip(_as_matrix(configurations),
+                                         results):
+            parameters = (result or {}).get('scf_parameters')
+            if not parameters or parameters.get(key) is None:
+                continue
+            self.update(configuration, parameters[key])
+            added += 1
+        return added
+
+    def evaluate(self, proposed_sample):
+        return self.evaluate_batch(proposed_sample)[0]
+
+    def evaluate_batch(self, proposed_samples):
+        mean, _ = self.predict(proposed_samples)
+        return self.sign * mean
+
+    def verify(self, structure_score):
+        return self.threshold is None or structure_score > self.threshold
+
+    def verify_batch(self, structure_scores):
+        structure_scores = np.asarray(structure_scores)
+        if self.threshold is None:
+            return np.ones(len(structure_scores), dtype=bool)
+        return structure_scores > self.threshold
+
+    def acquisition(self, proposed_samples, kappa=2.):
+        """
+        Upper confidence bound of the score: score + kappa * std
+        """
+        mean, std = self.predict(proposed_samples)
+        return self.sign * mean + kappa * std
+
+    def select_batch(self, proposed_samples, k, kappa=2.,
+                     max_per_composition=None):
+        """
+        Pick the next k samples to validate by upper confidence bound
+        Return:
+            list: the selected configurations, best first
+        """
+        selector = TopKSelector(k, max_per_composition)
+        selector.push_batch(self.acquisition(proposed_samples, kappa),
+                            proposed_samples)
+        return selector.shortlist()
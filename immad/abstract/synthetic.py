@@ -0,0 +1,158 @@
+import itertools
+import time
+import numpy as np
+from .validator import Validator
+
+# exit statuses of the synthetic validations
+EXIT_STATUS_FAILED = 1
+EXIT_STATUS_CALCULATOR_ERROR = 2
+
+
+class SyntheticValidator(Validator):
+    """
+    Cheap stand-in for DFTValidator to load-test a screening pipeline
+
+    The energy of a sample is computed by an ASE classical calculator (EMT,
+    Lennard-Jones) or a deterministic synthetic model. Validations have an
+    artificial latency and a failure rate, and use the same non-blocking
+    submit/poll/results surface and result dictionaries as DFTValidator,
+    so that they can replace it in Pipeline and
+    SurrogatePredictor.update_from_results.
+    """
+    def __init__(self, calculator='synthetic', latency=0., jitter=0.,
+                 failure_rate=0., seed=0):
+        """
+        Args:
+            calculator: 'synthetic', 'emt', 'lj', an ASE calculator or a
+                        function returning one
+            latency (float): seconds before a validation is finished
+            jitter (float): relative random variation of the latency
+            failure_rate (float): probability that a validation fails
+            seed (int): seed of the latency and failure random numbers
+        """
+        super().__init__()
+        self.calculator = calculator
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.rng = np.random.default_rng(seed)
+        self.handles = itertools.count()
+        # validations waiting for results: handle -> (ready time, failed,
+        # sample)
+        self.pending = {}
+
+    def get_calculator(self):
+        """
+        Return the ASE calculator, None for the synthetic model
+        """
+        if self.calculator == 'synthetic':
+            return None
+        if self.calculator == 'emt':
+            from ase.calculators.emt import EMT
+            return EMT()
+        if self.calculator == 'lj':
+            from ase.calculators.lj import LennardJones
+            return LennardJones()
+        if callable(self.calculator):
+            return self.calculator()
+        return self.calculator
+
+    def get_energy(self, sample):
+        """
+        Compute the energy of a sample (pymatgen Structure or ASE Atoms)
+        """
+        calculator = self.get_calculator()
+        if calculator is None:
+            return synthetic_energy(sample)
+        from ase import Atoms
+        from pymatgen.io.ase import AseAtomsAdaptor
+        if not isinstance(sample, Atoms):
+            sample = AseAtomsAdaptor.get_atoms(sample)
+        atoms = sample.copy()
+        atoms.calc = calculator
+        return float(atoms.get_potential_energy())
+
+    def run(self, sample):
+        """
+        Run the validation of a sample and wait for its result
+        """
+        handle = self.submit(sample)
+        time.sleep(max(0., self.pending[handle][0] - time.monotonic()))
+        return self.results([handle])[0]
+
+    def submit(self, sample):
+        latency = self.latency * (1. + self.jitter * self.rng.uniform(-1, 1))
+        failed = self.rng.random() < self.failure_rate
+        handle = next(self.handles)
+        self.pending[handle] = (time.monotonic() + latency, failed, sample)
+        return handle
+
+    def poll(self, handles):
+        """
+        Check whether the validations are finished
+        An unknown handle (e.g. whose result was already obtained) counts
+        as finished, its result is None, as for DFTValidator
+        """
+        now = time.monotonic()
+        return [handle not in self.pending or self.pending[handle][0] <= now
+                for handle in handles]
+
+    def results(self, handles):
+        """
+        Return the results of finished validations (the handles are
+        released, so every result can only be obtained once)
+        Return:
+            list of dictionaries with the handle, the exit status and the
+            energy in scf_parameters (None if the validation failed), None
+            for unknown handles
+        """
+        results = []
+        for handle in handles:
+            if handle not in self.pending:
+                results.append(None)
+                continue
+            _, failed, sample = self.pending.pop(handle)
+            result = {
+                'pk': handle,
+                'process_state': 'finished',
+                'exit_status': EXIT_STATUS_FAILED if failed else 0,
+                'scf_parameters': None,
+            }
+            if not failed:
+                try:
+                    energy = self.get_energy(sample)
+                except Exception:
+                    result['exit_status'] = EXIT_STATUS_CALCULATOR_ERROR
+                else:
+                    result['scf_parameters'] = {
+                        'energy': energy,
+                        'energy_per_atom': energy / len(sample),
+                    }
+            results.append(result)
+        return results
+
+
+def synthetic_energy(sample, cutoff=4.):
+    """
+    Deterministic synthetic energy of a structure: an on-site energy per
+    element plus a pair interaction between unlike neighbours
+    Input:
+        sample: pymatgen Structure or ASE Atoms
+        cutoff: maximum distance (in Angstrom) of the pair interaction
+    Return:
+        float: the energy
+    """
+    if hasattr(sample, 'get_all_distances'):
+        # ASE Atoms
+        numbers = sample.get_atomic_numbers()
+        distances = sample.get_all_distances(mic=True)
+    else:
+        numbers = np.array(sample.atomic_numbers)
+        distances = sample.distance_matrix
+    numbers = numbers.astype(float)
+    onsite = -0.1 * numbers - 0.01 * numbers ** 1.5
+    upper = np.triu(np.ones_like(distances, dtype=bool), k=1)
+    neighbours = upper & (distances < cutoff) & (distances > 0)
+    difference = np.subtract.outer(numbers, numbers)
+    pairs = 0.01 * difference ** 2 / np.where(neighbours, distances, 1.)
+    return float(onsite.sum() + pairs[neighbours].sum())
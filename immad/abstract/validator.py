@@ -15,4 +15,31 @@ class Validator(object):
         """
         pass
 
+    def submit(self, sample):
+        """
+        Start the validation of the input structure without waiting for it
+        The default calls run (blocking) and uses its result as handle
+        Return:
+            the handle of the validation, for poll and results
+        """
+        return self.run(sample)
 
+    def poll(self, handles):
+        """
+        Check whether the validations are finished
+        Input:
+            handles: the handles returned by submit
+        Return:
+            list of bool, True for the finished validations
+        """
+        return [True] * len(handles)
+
+    def results(self, handles):
+        """
+        Return the results of finished validations
+        Input:
+            handles: the handles returned by submit
+        Return:
+            list of the results, in the order of handles
+        """
+        return list(handles)
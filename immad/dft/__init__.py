@@ -1,6 +1,28 @@
-from electronic_structure import export_pdos_data, export_bands_data
-from dft import DFTWorkChain
-from phonon import PhononWorkChain
+import importlib
 
-__all__ = ['export_pdos_data', 'export_bands_data',
-           'DFTWorkChain', 'PhononWorkChain']
+# the workchains and functions are imported from their module on first
+# access, so that e.g. the exporters do not load the Quantum ESPRESSO plugins
+_MODULES = {
+    'export_pdos_data': '.electronic_structure',
+    'export_bands_data': '.electronic_structure',
+    'ExportCache': '.electronic_structure',
+    'DFTWorkChain': '.dft',
+    'PhononWorkChain': '.phonon',
+    'DFTBatchWorkChain': '.batch',
+    'DFTValidator': '.validator',
+    'export_bulk': '.bulk',
+}
+
+__all__ = list(_MODULES)
+
+
+def __getattr__(name):
+    if name not in _MODULES:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    value = getattr(importlib.import_module(_MODULES[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -0,0 +1,184 @@
+from aiida import orm
+from aiida.engine import WorkChain, append_, calcfunction, while_
+from .dft import DFTWorkChain
+
+# codes required by every enabled calculation, besides pw_code
+REQUIRED_CODES = {
+    'want_dos': ('dos_code', 'projwfc_code'),
+    'want_phonon': ('ph_code', 'q2r_code', 'matdyn_code'),
+}
+
+
+@calcfunction
+def collect_batch_results(exit_statuses, **scf_parameters):
+    """Collect the results of the DFTWorkChains of a batch.
+
+    Args:
+        exit_statuses (Dict): exit status of every DFTWorkChain by label
+        scf_parameters (Dict): SCF output parameters of the successful
+                               DFTWorkChains by label
+
+    Returns: dictionary with the `energies` and `exit_statuses` outputs
+    """
+    energies = {
+        label: parameters['energy']
+        for label, parameters in scf_parameters.items()
+    }
+    return {
+        'energies': orm.Dict(energies),
+        'exit_statuses': orm.Dict(exit_statuses.get_dict()),
+    }
+
+
+class DFTBatchWorkChain(WorkChain):
+    """Workchain running DFTWorkChain over many structures.
+
+    The DFTWorkChain builders are constructed from one shared protocol,
+    overrides and options. The structures are run by batches of
+    `max_concurrent` DFTWorkChains, the next batch is submitted when the
+    whole batch has terminated.
+    """
+
+    @classmethod
+    def define(cls, spec):
+        super().define(spec)
+
+        spec.input_namespace('structures', valid_type=orm.StructureData,
+                             dynamic=True,
+                             help='The input structures, keyed by label.')
+        spec.input('pw_code', valid_type=orm.AbstractCode,
+                   help='The code for pw.x.')
+        spec.input('dos_code', valid_type=orm.AbstractCode, required=False,
+                   help='The code for dos.x.')
+        spec.input('projwfc_code', valid_type=orm.AbstractCode,
+                   required=False, help='The code for projwfc.x.')
+        spec.input('ph_code', valid_type=orm.AbstractCode, required=False,
+                   help='The code for ph.x.')
+        spec.input('q2r_code', valid_type=orm.AbstractCode, required=False,
+                   help='The code for q2r.x.')
+        spec.input('matdyn_code', valid_type=orm.AbstractCode,
+                   required=False, help='The code for matdyn.x.')
+        spec.input('protocol', valid_type=orm.Str, required=False,
+                   help='The protocol shared by all DFTWorkChains.')
+        spec.input('overrides', valid_type=orm.Dict, required=False,
+                   help='The protocol overrides shared by all DFTWorkChains.')
+        spec.input('options', valid_type=orm.Dict, required=False,
+                   help='The calculation options shared by all '
+                        'DFTWorkChains.')
+        spec.input('want_relax', default=lambda: orm.Bool(False),
+                   valid_type=orm.Bool, help='Enable relaxation calculation')
+        spec.input('want_bands', default=lambda: orm.Bool(False),
+                   valid_type=orm.Bool, help='Enable band calculation')
+        spec.input('want_dos', default=lambda: orm.Bool(False),
+                   valid_type=orm.Bool, help='Enable PDOS calculation')
+        spec.input('want_phonon', default=lambda: orm.Bool(False),
+                   valid_type=orm.Bool, help='Enable phonon calculation')
+        spec.input('run_parallel', default=lambda: orm.Bool(False),
+                   valid_type=orm.Bool,
+                   help='Submit the enabled bands, PDOS and phonon '
+                        'calculations at once after SCF')
+        spec.input('max_concurrent', default=lambda: orm.Int(10),
+                   valid_type=orm.Int,
+                   help='Maximum number of DFTWorkChains in flight')
+        spec.inputs.validator = cls.validate_inputs
+
+        spec.output('energies', valid_type=orm.Dict, required=True,
+                    help='Total SCF energy of every successful structure.')
+        spec.output('exit_statuses', valid_type=orm.Dict, required=True,
+                    help='Exit status of the DFTWorkChain of every '
+                         'structure.')
+
+        spec.outline(
+            cls.setup,
+            while_(cls.should_continue)(
+                cls.run_dft,
+                cls.inspect_dft
+            ),
+            cls.finalize
+        )
+
+        spec.exit_code(400, 'ERROR_ALL_STRUCTURES_FAILED',
+                       message='the DFTWorkChain failed for every structure')
+
+    @staticmethod
+    def validate_inputs(inputs, _):
+        """Validate that the enabled calculations have their codes."""
+        for want, codes in REQUIRED_CODES.items():
+            if want in inputs and inputs[want].value:
+                missing = [code for code in codes if code not in inputs]
+                if missing:
+                    return f'`{want}` is enabled but no ' \
+                           f'`{"`, `".join(missing)}` is specified.'
+
+    def setup(self):
+        self.ctx.pending = sorted(self.inputs.structures.keys())
+        self.ctx.batch = []
+        self.ctx.children = []
+        self.ctx.finished = {}
+
+    def should_continue(self):
+        return len(self.ctx.pending) > 0
+
+    def get_child_builder(self, structure):
+        """Construct the DFTWorkChain builder for one structure."""
+        overrides = {}
+        if 'overrides' in self.inputs:
+            overrides = self.inputs.overrides.get_dict()
+        options = None
+        if 'options' in self.inputs:
+            options = self.inputs.options.get_dict()
+        protocol = None
+        if 'protocol' in self.inputs:
+            protocol = self.inputs.protocol.value
+
+        builder = DFTWorkChain.get_builder_from_protocol(
+            self.inputs.pw_code,
+            self.inputs.get('dos_code'),
+            self.inputs.get('projwfc_code'),
+            self.inputs.get('ph_code'),
+            self.inputs.get('q2r_code'),
+            self.inputs.get('matdyn_code'),
+            structure, overrides=overrides, options=options,
+            protocol=protocol,
+            want_relax=self.inputs.want_relax.value,
+            want_bands=self.inputs.want_bands.value,
+            want_dos=self.inputs.want_dos.value,
+            want_phonon=self.inputs.want_phonon.value)
+        builder.run_parallel = self.inputs.run_parallel
+        return builder
+
+    def run_dft(self):
+        """Submit the next batch of DFTWorkChains."""
+        max_concurrent = max(1, self.inputs.max_concurrent.value)
+        self.ctx.batch = self.ctx.pending[:max_concurrent]
+        self.ctx.pending = self.ctx.pending[max_concurrent:]
+        for label in self.ctx.batch:
+            builder = self.get_child_builder(self.inputs.structures[label])
+            builder.metadata.call_link_label = label
+            future = self.submit(builder)
+            self.report(f'launching DFTWorkChain<{future.pk}> for {label}')
+            self.to_context(children=append_(future))
+
+    def inspect_dft(self):
+        """Report the failed DFTWorkChains of the batch."""
+        children = self.ctx.children[-len(self.ctx.batch):]
+        for label, node in zip(self.ctx.batch, children):
+            self.ctx.finished[label] = node.pk
+            if not node.is_finished_ok:
+                self.report(f'DFTWorkChain<{node.pk}> for {label} failed '
+                            f'with exit status {node.exit_status}')
+
+    def finalize(self):
+        exit_statuses = {}
+        scf_parameters = {}
+        for label, pk in self.ctx.finished.items():
+            node = orm.load_node(pk)
+            exit_statuses[label] = node.exit_status
+            if node.is_finished_ok:
+                scf_parameters[label] = node.outputs.scf_parameters
+
+        self.out_many(collect_batch_results(
+            exit_statuses=orm.Dict(exit_statuses), **scf_parameters))
+
+        if not scf_parameters:
+            return self.exit_codes.ERROR_ALL_STRUCTURES_FAILED
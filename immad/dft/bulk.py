@@ -0,0 +1,262 @@
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from aiida import orm
+from aiida.manage import get_manager
+
+# output link labels of DFTWorkChain read by the bulk export
+OUTPUT_LABELS = {
+    'scf_parameters': 'scf',
+    'bands__band_structure': 'bands',
+    'dos__dos__output_dos': 'dos',
+}
+INDEX_FILE = 'index.npz'
+SHARD_FILE = 'shard_{:05d}.npz'
+
+
+def query_outputs(workchains):
+    """Find the SCF, bands and DOS outputs of many workchains at once.
+
+    One QueryBuilder query finds the workchains and a second one projects
+    the output parameters and the repository metadata (the keys of the
+    array files) of their outputs, no node is loaded.
+
+    Args:
+        workchains (Group or list): a group of DFTWorkChains, or the
+                                    workchain nodes or pks
+
+    Returns: dictionary by workchain pk with the `uuid` and, for the outputs
+             that exist, `scf` (the output parameters), `bands` and `dos`
+             (the attributes and the repository keys of the arrays). The
+             workchains without any of these outputs only have the `uuid`.
+    """
+    if not isinstance(workchains, orm.Group):
+        pks = [getattr(node, 'pk', node) for node in workchains]
+        # QueryBuilder does not accept an empty `in` filter
+        if not pks:
+            return {}
+
+    def append_workchains(qb, project):
+        if isinstance(workchains, orm.Group):
+            qb.append(orm.Group, filters={'id': workchains.pk}, tag='group')
+            qb.append(orm.WorkChainNode, with_group='group',
+                      tag='workchain', project=project)
+        else:
+            qb.append(orm.WorkChainNode, filters={'id': {'in': pks}},
+                      tag='workchain', project=project)
+        return qb
+
+    outputs = {
+        pk: {'uuid': uuid} for pk, uuid in
+        append_workchains(orm.QueryBuilder(), ['id', 'uuid']).iterall()
+    }
+
+    qb = append_workchains(orm.QueryBuilder(), ['id'])
+    qb.append(orm.Data, with_incoming='workchain', tag='output',
+              edge_tag='link',
+              edge_filters={'label': {'in': list(OUTPUT_LABELS)}},
+              edge_project=['label'],
+              project=['attributes', 'repository_metadata'])
+
+    for result in qb.iterdict():
+        workchain, output = result['workchain'], result['output']
+        record = outputs[workchain['id']]
+        name = OUTPUT_LABELS[result['link']['label']]
+        if name == 'scf':
+            record[name] = output['attributes']
+        else:
+            keys = {
+                object_name[:-len('.npy')]: item['k']
+                for object_name, item in
+                output['repository_metadata'].get('o', {}).items()
+                if object_name.endswith('.npy')
+            }
+            record[name] = {'attributes': output['attributes'],
+                            'keys': keys}
+    return outputs
+
+
+class RepositoryReader(object):
+    """Read array files of the repository from many threads.
+
+    The AiiDA repository backend is not thread-safe, every thread opens its
+    own disk-objectstore container, the containers are closed by `close`.
+    For other repository backends the files are read one at a time.
+    """
+
+    def __init__(self):
+        self.repository = get_manager().get_profile_storage().get_repository()
+        container = getattr(self.repository, '_container', None)
+        self.folder = container.get_folder() if container is not None \
+            else None
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.containers = []
+
+    def read_array(self, key):
+        """Return the array stored in the repository under `key`."""
+        if self.folder is None:
+            with self.lock:
+                content = self.repository.get_object_content(key)
+        else:
+            if not hasattr(self.local, 'container'):
+                from disk_objectstore import Container
+                self.local.container = Container(self.folder)
+                with self.lock:
+                    self.containers.append(self.local.container)
+            content = self.local.container.get_object_content(key)
+        return np.load(io.BytesIO(content), allow_pickle=False)
+
+    def close(self):
+        """Close the containers opened by the threads."""
+        with self.lock:
+            for container in self.containers:
+                container.close()
+            self.containers = []
+        # the threads open a new container if they read again
+        self.local = threading.local()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def get_band_gap(bands, fermi_energy):
+    """Return the band gap, 0 for a metal.
+
+    Args:
+        bands (np.ndarray): band energies, shape (n_kpoints, n_bands) or
+                            (n_spins, n_kpoints, n_bands)
+        fermi_energy (float): the Fermi energy
+    """
+    bands = bands.reshape((-1,) + bands.shape[-2:])
+    lowest = bands.min(axis=1)
+    highest = bands.max(axis=1)
+    if np.any((lowest < fermi_energy) & (highest > fermi_energy)):
+        return 0.
+    occupied = highest[highest <= fermi_energy]
+    empty = lowest[lowest > fermi_energy]
+    if len(occupied) == 0 or len(empty) == 0:
+        return np.nan
+    return float(empty.min() - occupied.max())
+
+
+def export_bulk(workchains, directory, shard_size=500, max_workers=8,
+                dtype=np.float32):
+    """Export the electronic structure of many DFTWorkChains.
+
+    The outputs are found with one query (`query_outputs`), the array files
+    are read by a thread pool and written to npz shards of `shard_size`
+    workchains, with arrays named `<uuid>/bands`, `<uuid>/kpoints`,
+    `<uuid>/dos_energy` and `<uuid>/dos`. The columns `pk`, `uuid`,
+    `shard`, `energy`, `fermi_energy` and `band_gap` (NaN if not available,
+    also for the workchains without outputs) are written to `index.npz`.
+
+    Args:
+        workchains (Group or list): see `query_outputs`
+        directory (str or Path): the output directory
+        shard_size (int): number of workchains per shard
+        max_workers (int): number of threads reading the arrays
+        dtype: the data type of the exported arrays
+
+    Returns: the index as a dictionary of columns
+    """
+    os.makedirs(directory, exist_ok=True)
+    outputs = query_outputs(workchains)
+    pks = sorted(outputs)
+    rows = {pk: row for row, pk in enumerate(pks)}
+
+    index = {
+        'pk': np.array(pks, dtype=np.int64),
+        'uuid': np.array([outputs[pk]['uuid'] for pk in pks], dtype=str),
+        'shard': np.arange(len(pks)) // shard_size,
+        'energy': np.full(len(pks), np.nan),
+        'fermi_energy': np.full(len(pks), np.nan),
+        'band_gap': np.full(len(pks), np.nan),
+    }
+    for row, pk in enumerate(pks):
+        scf = outputs[pk].get('scf') or {}
+        index['energy'][row] = scf.get('energy', np.nan)
+        index['fermi_energy'][row] = scf.get('fermi_energy', np.nan)
+
+    with RepositoryReader() as reader, \
+            ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for shard, start in enumerate(range(0, len(pks), shard_size)):
+            requests = []
+            for pk in pks[start:start + shard_size]:
+                uuid = outputs[pk]['uuid']
+                for name in ('bands', 'dos'):
+                    if name not in outputs[pk]:
+                        continue
+                    for array_name, key in outputs[pk][name]['keys'].items():
+                        requests.append((pk, uuid, name, array_name, key))
+            arrays = executor.map(reader.read_array,
+                                  [request[-1] for request in requests])
+            read = {}
+            for (pk, uuid, name, array_name, _), array in zip(requests,
+                                                               arrays):
+                read.setdefault((pk, uuid, name), {})[array_name] = array
+
+            shard_arrays = {}
+            for (pk, uuid, name), data in read.items():
+                if name == 'bands':
+                    shard_arrays[f'{uuid}/bands'] = data['bands'].astype(dtype)
+                    if 'kpoints' in data:
+                        shard_arrays[f'{uuid}/kpoints'] = \
+                            data['kpoints'].astype(dtype)
+                    fermi_energy = index['fermi_energy'][rows[pk]]
+                    if not np.isnan(fermi_energy):
+                        index['band_gap'][rows[pk]] = get_band_gap(
+                            data['bands'], fermi_energy)
+                else:
+                    attributes = outputs[pk]['dos']['attributes']
+                    y_arrays = sorted(
+                        (array_name for array_name in data
+                         if array_name.startswith('y_array_')),
+                        key=lambda array_name: int(array_name.split('_')[-1]))
+                    shard_arrays[f'{uuid}/dos_energy'] = \
+                        data['x_array'].astype(dtype)
+                    shard_arrays[f'{uuid}/dos'] = np.array(
+                        [data[array_name] for array_name in y_arrays],
+                        dtype=dtype)
+                    shard_arrays[f'{uuid}/dos_names'] = np.array(
+                        attributes.get('y_names', []))
+            np.savez(os.path.join(directory, SHARD_FILE.format(shard)),
+                     **shard_arrays)
+
+    np.savez(os.path.join(directory, INDEX_FILE), **index)
+    return index
+
+
+def load_index(directory):
+    """Return the index of a bulk export as a dictionary of columns."""
+    with np.load(os.path.join(directory, INDEX_FILE)) as index:
+        return {name: index[name] for name in index.files}
+
+
+def load_arrays(directory, uuid, index=None):
+    """Return the exported arrays of one workchain.
+
+    Args:
+        directory (str or Path): the directory of the bulk export
+        uuid (str): the uuid of the workchain
+        index (dict): the index, loaded if not given
+
+    Returns: dictionary of the arrays by name (bands, kpoints, dos_energy,
+             dos, dos_names)
+    """
+    if index is None:
+        index = load_index(directory)
+    row = np.flatnonzero(index['uuid'] == uuid)
+    if len(row) == 0:
+        raise KeyError(f'{uuid} is not in the bulk export.')
+    shard = SHARD_FILE.format(int(index['shard'][row[0]]))
+    prefix = f'{uuid}/'
+    with np.load(os.path.join(directory, shard)) as arrays:
+        return {name[len(prefix):]: arrays[name] for name in arrays.files
+                if name.startswith(prefix)}
@@ -0,0 +1,307 @@
+import hashlib
+import json
+from collections.abc import Mapping
+
+import numpy as np
+
+from aiida import orm
+from aiida.common.links import LinkType
+
+FINGERPRINT_EXTRA = 'immad_fingerprint'
+PROTOCOL_EXTRA = 'immad_protocol'
+CACHE_HIT_EXTRA = 'immad_cache_hit'
+CACHE_SOURCE_EXTRA = 'immad_cache_source'
+
+# inputs that do not change the results of a calculation
+IGNORED_INPUTS = ('metadata', 'structure', 'parent_folder', 'scf_folder',
+                  'code', 'clean_workdir', 'use_cache', 'run_parallel',
+                  'parallelize_qpoints', 'qpoints_chunk_size',
+                  'max_concurrent_ph', 'restart_from', 'ph_restart_folder')
+# tolerances of the StructureMatcher confirming a cache hit
+MATCHER_TOLERANCES = {'ltol': 1e-2, 'stol': 1e-2, 'angle_tol': 0.1}
+
+
+def get_structure_fingerprint(structure, symprec=1e-3):
+    """Return the cache bucket of a crystal structure.
+
+    The sites are labelled by kind name (and magnetic moment for a pymatgen
+    Structure with `magmom` site properties). The fingerprint hashes the
+    space group and the labelled composition of the primitive cell, which
+    are exact invariants: supercells, permuted sites, origin shifts and
+    symmetry-equivalent substitutions all get the same fingerprint.
+    Different structures may share a fingerprint, a cached run is only
+    reused if `structures_match` confirms it.
+
+    Args:
+        structure (StructureData or Structure): the crystal structure
+        symprec (float): tolerance for the symmetry analysis
+
+    Returns: the SHA-256 hex digest of the invariants
+    """
+    import spglib
+
+    lattice, positions, labels = _get_labelled_cell(structure)
+    names = sorted(set(labels))
+    numbers = [names.index(label) for label in labels]
+    cell = (lattice, positions, numbers)
+    primitive = spglib.find_primitive(cell, symprec=symprec)
+    if primitive is None:
+        raise ValueError('The symmetry analysis of the structure failed.')
+    counts = np.bincount(primitive[2], minlength=len(names))
+    canonical = {
+        'spacegroup': spglib.get_spacegroup(cell, symprec=symprec),
+        'composition': [[name, int(count)]
+                        for name, count in zip(names, counts)],
+    }
+    return _hash(canonical)
+
+
+def structures_match(structure, other):
+    """Return whether two structures are equivalent for the cache.
+
+    The structures are compared with the pymatgen StructureMatcher (up to
+    supercells, site permutations and symmetry operations, without volume
+    scaling, with the `MATCHER_TOLERANCES`), sites only match if they have
+    the same label (kind name and magnetic moment).
+    """
+    from pymatgen.analysis.structure_matcher import StructureMatcher
+
+    matcher = StructureMatcher(scale=False, attempt_supercell=True,
+                               **MATCHER_TOLERANCES)
+    return matcher.fit(_get_labelled_structure(structure),
+                       _get_labelled_structure(other))
+
+
+def _get_labelled_cell(structure):
+    """Return the lattice, fractional positions and site labels.
+
+    The label of a site is its kind name, plus its magnetic moment if the
+    pymatgen Structure has `magmom` site properties, so that structures
+    differing only in their kinds or magnetic configuration get different
+    keys.
+    """
+    if isinstance(structure, orm.StructureData):
+        lattice = np.array(structure.cell)
+        cartesian = np.array([site.position for site in structure.sites])
+        labels = [site.kind_name for site in structure.sites]
+    else:
+        lattice = structure.lattice.matrix
+        cartesian = structure.cart_coords
+        magmoms = structure.site_properties.get('magmom')
+        labels = [
+            site.species_string if magmoms is None else
+            f'{site.species_string}:{np.round(magmoms[i], 3).tolist()}'
+            for i, site in enumerate(structure)
+        ]
+    positions = np.linalg.solve(lattice.T, cartesian.T).T
+    return lattice, positions, labels
+
+
+def _get_labelled_structure(structure):
+    """Return a pymatgen Structure whose species encode the site labels.
+
+    StructureMatcher only compares species, so every label is mapped to the
+    element of the site with a fictitious oxidation state derived from a
+    digest of the label.
+    """
+    from pymatgen.core import Lattice, Species, Structure
+
+    lattice, positions, labels = _get_labelled_cell(structure)
+    if isinstance(structure, orm.StructureData):
+        kinds = {kind.name: kind.symbol for kind in structure.kinds}
+        elements = [kinds[label] for label in labels]
+    else:
+        elements = [site.specie.symbol for site in structure]
+    species = [
+        Species(element, int.from_bytes(
+            hashlib.blake2b(label.encode(), digest_size=3).digest(), 'big'))
+        for element, label in zip(elements, labels)
+    ]
+    return Structure(Lattice(lattice), species, positions)
+
+
+def get_protocol_fingerprint(inputs, structure):
+    """Return a fingerprint of the calculation inputs of a workchain.
+
+    All parameters, pseudopotentials, k-points and flags are included, while
+    inputs that do not change the results (codes, metadata, structures and
+    parent folders) are left out. Dictionaries keyed by kind name, such as
+    the starting magnetization, keep the kind names, which are part of the
+    structure comparison of `structures_match`.
+
+    Args:
+        inputs (Mapping): the inputs of the workchain
+        structure (StructureData): the input structure of the workchain
+
+    Returns: the SHA-256 hex digest of the inputs
+    """
+    kinds = {kind.name: kind.symbol for kind in structure.kinds}
+    return _hash(_normalize(inputs, kinds))
+
+
+def find_cached_workchain(process_class, fingerprint, protocol,
+                          structure=None):
+    """Return the latest successful workchain with the same fingerprints.
+
+    The structure fingerprint is only a bucket, if `structure` is given the
+    input structure of every candidate is compared with `structures_match`
+    and the latest matching workchain is returned.
+
+    The extras are not indexed by AiiDA: the query relies on the index of
+    the `process_type` column to only scan the workchains of
+    `process_class`, and filters their extras row by row. The lookup is
+    therefore linear in the number of these workchains, which stays cheap
+    compared to a DFT calculation up to a few hundred thousand runs.
+
+    Args:
+        process_class (WorkChain): the class of the workchain
+        fingerprint (str): the structure fingerprint
+        protocol (str): the protocol fingerprint
+        structure (StructureData): the structure to match
+
+    Returns: the WorkChainNode or None if there is no match
+    """
+    qb = orm.QueryBuilder()
+    qb.append(process_class, tag='workchain', filters={
+        f'extras.{FINGERPRINT_EXTRA}': fingerprint,
+        f'extras.{PROTOCOL_EXTRA}': protocol,
+        'attributes.process_state': 'finished',
+        'attributes.exit_status': 0,
+    }, project=['*'])
+    qb.append(orm.StructureData, with_outgoing='workchain',
+              edge_filters={'label': 'structure'}, project=['*'])
+    qb.order_by({'workchain': {'ctime': 'desc'}})
+    for node, candidate in qb.iterall():
+        if structure is None or structures_match(structure, candidate):
+            return node
+    return None
+
+
+def set_fingerprint_extras(process):
+    """Fingerprint the inputs of a workchain and store them as extras.
+
+    Every workchain is fingerprinted, also when it does not use the cache
+    itself, so that later runs can find it once it is finished.
+
+    Args:
+        process (WorkChain): the running workchain
+
+    Returns: the structure and the protocol fingerprints
+    """
+    structure = process.inputs.structure
+    fingerprint = get_structure_fingerprint(structure)
+    protocol = get_protocol_fingerprint(process.inputs, structure)
+    process.node.base.extras.set_many({
+        FINGERPRINT_EXTRA: fingerprint,
+        PROTOCOL_EXTRA: protocol,
+    })
+    return fingerprint, protocol
+
+
+def lookup_cache(process, fingerprint, protocol):
+    """Look for a cached run of a workchain.
+
+    The hit/miss outcome is stored as extras of the workchain node, so that
+    the statistics can be gathered with `get_cache_statistics`.
+
+    Args:
+        process (WorkChain): the running workchain
+        fingerprint (str): the structure fingerprint
+        protocol (str): the protocol fingerprint, see
+                        `set_fingerprint_extras`
+
+    Returns: the cached WorkChainNode or None on a cache miss
+    """
+    cached = find_cached_workchain(process.__class__, fingerprint, protocol,
+                                   process.inputs.structure)
+    extras = {CACHE_HIT_EXTRA: cached is not None}
+    if cached is not None:
+        extras[CACHE_SOURCE_EXTRA] = cached.uuid
+    process.node.base.extras.set_many(extras)
+    return cached
+
+
+def setup_cache(process):
+    """Fingerprint a workchain and look for a cached run if it uses the cache.
+
+    A structure that cannot be fingerprinted is reported and the workchain
+    then runs without the cache.
+
+    Args:
+        process (WorkChain): the running workchain, with a `use_cache` input
+
+    Returns: the cached WorkChainNode or None
+    """
+    try:
+        fingerprints = set_fingerprint_extras(process)
+    except ValueError as exception:
+        process.report(f'the structure cannot be fingerprinted ({exception}),'
+                       ' the cache is not used')
+        return None
+    if not process.inputs.use_cache.value:
+        return None
+    return lookup_cache(process, *fingerprints)
+
+
+def reuse_outputs(process, node):
+    """Attach all the outputs of a finished workchain to a running one."""
+    outputs = node.base.links.get_outgoing(link_type=LinkType.RETURN)
+    for link in outputs.all():
+        process.out(link.link_label.replace('__', '.'), link.node)
+
+
+def get_cache_statistics(process_class=None):
+    """Return the hit/miss statistics of the structure-fingerprint cache.
+
+    Args:
+        process_class (WorkChain): only count the runs of this workchain
+
+    Returns: dictionary with the number of hits, misses and the hit rate
+    """
+    statistics = {}
+    for key, hit in (('hits', True), ('misses', False)):
+        qb = orm.QueryBuilder()
+        qb.append(process_class or orm.WorkflowNode,
+                  filters={f'extras.{CACHE_HIT_EXTRA}': hit})
+        statistics[key] = qb.count()
+    total = statistics['hits'] + statistics['misses']
+    statistics['hit_rate'] = statistics['hits'] / total if total else 0.
+    return statistics
+
+
+def _normalize(value, kinds):
+    """Convert the inputs into a JSON-serializable canonical form."""
+    if isinstance(value, orm.Dict):
+        value = value.get_dict()
+    if isinstance(value, orm.BaseType):
+        return value.value
+    if isinstance(value, orm.SinglefileData):
+        return value.base.attributes.get('md5', value.uuid)
+    if isinstance(value, orm.KpointsData):
+        try:
+            return {'mesh': value.get_kpoints_mesh()}
+        except AttributeError:
+            return {'kpoints': value.get_kpoints().round(6).tolist()}
+    if isinstance(value, Mapping):
+        if value and all(key in kinds for key in value):
+            # keyed by kind, the kind names are compared with the structure
+            return sorted(([key, _normalize(item, kinds)]
+                           for key, item in value.items()), key=_serialize)
+        return {
+            key: _normalize(item, kinds)
+            for key, item in sorted(value.items())
+            if key not in IGNORED_INPUTS
+        }
+    if isinstance(value, (list, tuple)):
+        return [_normalize(item, kinds) for item in value]
+    if isinstance(value, orm.Data):
+        return None
+    return value
+
+
+def _serialize(data):
+    return json.dumps(data, sort_keys=True, default=str)
+
+
+def _hash(data):
+    return hashlib.sha256(_serialize(data).encode()).hexdigest()
@@ -1,26 +1,51 @@
+import math
+
 from aiida.plugins import WorkflowFactory
 from aiida.common import AttributeDict
+from aiida.common.links import LinkType
 from aiida.engine import submit, ToContext, WorkChain, if_
 from aiida import orm
 from aiida_quantumespresso.workflows.protocols.utils import ProtocolMixin
-from .phonon import PhononWorkChain
+from .cache import reuse_outputs, setup_cache
+from .phonon import PhononWorkChain, get_ph_restart_calculation
+from .prerelax import (PrerelaxError, get_prerelax_rejection,
+                       prerelax_structure)
+
+# The Quantum ESPRESSO workchains are resolved by `load_workflows` when the
+# spec is defined instead of at import, which takes about a second. Every
+# new or reloaded DFTWorkChain defines its spec before running any step.
+PwBaseWorkChain = PwRelaxWorkChain = PwBandsWorkChain = PdosWorkChain = None
+
+# dos.x and projwfc.x do not scale beyond this number of MPI processes
+DOS_MAX_PROCS = 8
+
+
+def load_workflows():
+    """Resolve the Quantum ESPRESSO workchains run by DFTWorkChain."""
+    global PwBaseWorkChain, PwRelaxWorkChain, PwBandsWorkChain, PdosWorkChain
+    if PwBaseWorkChain is None:
+        PwBaseWorkChain = WorkflowFactory('quantumespresso.pw.base')
+        PwRelaxWorkChain = WorkflowFactory('quantumespresso.pw.relax')
+        PwBandsWorkChain = WorkflowFactory('quantumespresso.pw.bands')
+        PdosWorkChain = WorkflowFactory('quantumespresso.pdos')
 
-PwBaseWorkChain = WorkflowFactory('quantumespresso.pw.base')
-PwRelaxWorkChain = WorkflowFactory('quantumespresso.pw.relax')
-PwBandsWorkChain = WorkflowFactory('quantumespresso.pw.bands')
-PdosWorkChain = WorkflowFactory('quantumespresso.pdos')
 
 class DFTWorkChain(ProtocolMixin, WorkChain):
     @classmethod
     def define(cls, spec):
         super().define(spec)
+        load_workflows()
 
         # input parameters
         spec.expose_inputs(PwBaseWorkChain, namespace='scf')
-        spec.expose_inputs(PwRelaxWorkChain, namespace='relax')
-        spec.expose_inputs(PwBandsWorkChain, namespace='bands')
-        spec.expose_inputs(PdosWorkChain, namespace='dos')
-        spec.expose_inputs(PhononWorkChain, namespace='phonon')
+        spec.expose_inputs(PwRelaxWorkChain, namespace='relax',
+            namespace_options={'required': False, 'populate_defaults': False})
+        spec.expose_inputs(PwBandsWorkChain, namespace='bands',
+            namespace_options={'required': False, 'populate_defaults': False})
+        spec.expose_inputs(PdosWorkChain, namespace='dos',
+            namespace_options={'required': False, 'populate_defaults': False})
+        spec.expose_inputs(PhononWorkChain, namespace='phonon',
+            namespace_options={'required': False, 'populate_defaults': False})
 
         spec.expose_outputs(PwBaseWorkChain, namespace='scf')
         spec.expose_outputs(PwRelaxWorkChain, namespace='relax')
@@ -32,40 +57,88 @@ class DFTWorkChain(ProtocolMixin, WorkChain):
                    help='The inputs structure.')
         spec.input('want_relax', default=lambda: orm.Bool(False),
                    valid_type=orm.Bool, help='Enable relaxation calculation')
+        spec.input('want_prerelax', default=lambda: orm.Bool(False),
+                   valid_type=orm.Bool,
+                   help='Pre-relax the structure with a cheap ASE calculator '
+                        'before the relaxation calculation')
+        spec.input('prerelax_calculator', default=lambda: orm.Str('emt'),
+                   valid_type=orm.Str,
+                   help='The ASE calculator of the pre-relaxation: emt, lj '
+                        'or module:Class')
+        spec.input('prerelax_parameters', valid_type=orm.Dict,
+                   required=False,
+                   help='The parameters of the pre-relaxation: fmax, steps, '
+                        'optimizer, relax_cell, calculator_kwargs, '
+                        'max_volume_change and max_displacement')
         spec.input('want_bands', default=lambda: orm.Bool(False),
                    valid_type=orm.Bool, help='Enable band calculation')
         spec.input('want_dos', default=lambda: orm.Bool(False),
                    valid_type=orm.Bool, help='Enable PDOS calculation')
         spec.input('want_phonon', default=lambda: orm.Bool(False),
                    valid_type=orm.Bool, help='Enable phonon calculation')
+        spec.input('run_parallel', default=lambda: orm.Bool(False),
+                   valid_type=orm.Bool,
+                   help='Submit the enabled bands, PDOS and phonon '
+                        'calculations at once after SCF')
+        spec.input('reuse_relax_scf', default=lambda: orm.Bool(False),
+                   valid_type=orm.Bool,
+                   help='Use the final SCF of the relaxation (or its last '
+                        'iteration) instead of running a separate SCF '
+                        'calculation')
+        spec.input('use_cache', default=lambda: orm.Bool(False),
+                   valid_type=orm.Bool,
+                   help='Reuse the outputs of a finished DFTWorkChain with '
+                        'an equivalent structure and the same inputs')
+        spec.input('restart_from', valid_type=orm.WorkflowNode,
+                   required=False,
+                   help='A previous DFTWorkChain whose successful steps are '
+                        'reused, only the failed ones are run again')
 
         spec.output('structure', valid_type=orm.StructureData, required=True,
                     help='The output crystal structure.')
+        spec.output('prerelaxed_structure', valid_type=orm.StructureData,
+                    required=False,
+                    help='The structure after the pre-relaxation.')
         spec.output('scf_parameters', valid_type=orm.Dict, required=True,
                     help='Output parameters for the pwSCF calculation.')
+        spec.inputs.validator = cls.validate_inputs
 
         # outline
         spec.outline(
             cls.setup,
-            if_(cls.is_relax_enabled)(
-                cls.run_relax,
-                cls.inspect_relax
-            ),
-            cls.run_scf,
-            cls.inspect_scf,
-            if_(cls.is_bands_enabled)(
-                cls.run_bands,
-                cls.inspect_bands
-            ),
-            if_(cls.is_dos_enabled)(
-                cls.run_dos,
-                cls.inspect_dos
-            ),
-            if_(cls.is_phonon_enabled)(
-                cls.run_phonon,
-                cls.inspect_phonon
-            ),
-            cls.finalize
+            if_(cls.is_cached)(
+                cls.reuse_cached
+            ).else_(
+                if_(cls.should_run_prerelax)(
+                    cls.run_prerelax
+                ),
+                if_(cls.should_run_relax)(
+                    cls.run_relax,
+                    cls.inspect_relax
+                ),
+                if_(cls.should_run_scf)(
+                    cls.run_scf,
+                    cls.inspect_scf
+                ),
+                if_(cls.is_parallel_enabled)(
+                    cls.run_branches,
+                    cls.inspect_branches
+                ).else_(
+                    if_(cls.should_run_bands)(
+                        cls.run_bands,
+                        cls.inspect_bands
+                    ),
+                    if_(cls.should_run_dos)(
+                        cls.run_dos,
+                        cls.inspect_dos
+                    ),
+                    if_(cls.should_run_phonon)(
+                        cls.run_phonon,
+                        cls.inspect_phonon
+                    )
+                ),
+                cls.finalize
+            )
         )
 
         spec.exit_code(400, 'ERROR_DFT_PROCESS_FAILED_SCF',
@@ -83,7 +156,41 @@ class DFTWorkChain(ProtocolMixin, WorkChain):
     def get_builder_from_protocol(cls, pw_code, dos_code, projwfc_code,
                                   ph_code, q2r_code, matdyn_code,
                                   structure, overrides: dict={}, options=None,
-                                  protocol=None, **kwargs):
+                                  protocol=None, want_relax=None,
+                                  want_bands=None, want_dos=None,
+                                  want_phonon=None, reuse_relax_scf=False,
+                                  resource_estimator=None,
+                                  want_prerelax=False,
+                                  prerelax_calculator=None,
+                                  prerelax_parameters=None, **kwargs):
+        """Obtain builder based on input protocols
+
+        The sub-builders are only constructed for the calculations that will
+        run. If a `want_*` flag is None, the corresponding sub-builder is
+        constructed and the flag is left to its default, so that it can still
+        be enabled on the returned builder.
+
+        Args:
+            want_relax (bool): enable the relaxation calculation
+            want_bands (bool): enable the band calculation
+            want_dos (bool): enable the PDOS calculation
+            want_phonon (bool): enable the phonon calculation
+            reuse_relax_scf (bool): use the final SCF of the relaxation, or
+                                    its last iteration if the installed
+                                    PwRelaxWorkChain runs none, instead of
+                                    a separate SCF
+            resource_estimator (ResourceEstimator): if specified, the
+                resources, k-point pools and walltime of every stage are
+                estimated instead of using `options` everywhere
+            want_prerelax (bool): pre-relax the structure with a cheap ASE
+                                  calculator before the relaxation
+            prerelax_calculator (str): the ASE calculator of the
+                                       pre-relaxation
+            prerelax_parameters (dict): the parameters of the
+                                        pre-relaxation
+
+        Returns: the builder for running DFTWorkChain
+        """
         relax_overrides = bands_overrides = None
         dos_overrides = phonon_overrides = None
         scf_overrides = None
@@ -98,53 +205,227 @@ class DFTWorkChain(ProtocolMixin, WorkChain):
         if 'phonon' in overrides:
             phonon_overrides = overrides['phonon']
 
-        scf = PwBaseWorkChain.get_builder_from_protocol(
+        builder = cls.get_builder()
+        builder.structure = structure
+        builder.scf = PwBaseWorkChain.get_builder_from_protocol(
                 pw_code, structure, protocol, overrides=scf_overrides,
                 options=options, **kwargs)
-        relax = PwRelaxWorkChain.get_builder_from_protocol(
-                pw_code, structure, protocol, overrides=relax_overrides,
-                options=options, **kwargs)
-        bands = PwBandsWorkChain.get_builder_from_protocol(
-                pw_code, structure, protocol, overrides=bands_overrides,
-                options=options, **kwargs)
-        dos_options = options.copy()
-        num_machines = 1
-        tot_num_mpiprocs = min(8, dos_options['resources']['tot_num_mpiprocs'])
-        dos_options['resources'] = {
-                'num_machines': num_machines,
-                'tot_num_mpiprocs': tot_num_mpiprocs
-                }
-        dos = PdosWorkChain.get_builder_from_protocol(
-                pw_code, dos_code, projwfc_code,
-                structure, protocol, overrides=dos_overrides,
-                options=dos_options, **kwargs)
-        phonon = PhononWorkChain.get_builder_from_protocol(
-                pw_code, ph_code, q2r_code, matdyn_code,
-                structure,
-                protocol, phonon_overrides, options, **kwargs)
-
-        relax.pop('base_final_scf', None)
-        bands.pop('relax', None)
-        dos.pop('scf', None)
-        dos['nscf']['pw']['parent_folder'] = None #orm.Data()
-        phonon.pop('scf', None)
-        phonon.run_scf = orm.Bool(False)
+        if resource_estimator is not None:
+            resource_estimator.configure(builder.scf, 'scf', structure,
+                                         options)
 
-        builder = cls.get_builder()
-        builder.relax = relax
-        builder.scf = scf
-        builder.bands = bands
-        builder.dos = dos
-        builder.phonon = phonon
-        builder.structure = structure
+        if want_relax is not False:
+            relax = PwRelaxWorkChain.get_builder_from_protocol(
+                    pw_code, structure, protocol, overrides=relax_overrides,
+                    options=options, **kwargs)
+            if not reuse_relax_scf:
+                relax.pop('base_final_scf', None)
+            if resource_estimator is not None:
+                resource_estimator.configure(relax.base_relax, 'relax',
+                                             structure, options)
+                if relax.get('base_final_scf'):
+                    resource_estimator.configure(relax.base_final_scf,
+                                                 'scf', structure, options)
+            builder.relax = relax
+
+        if want_bands is not False:
+            bands = PwBandsWorkChain.get_builder_from_protocol(
+                    pw_code, structure, protocol, overrides=bands_overrides,
+                    options=options, **kwargs)
+            bands.pop('relax', None)
+            if resource_estimator is not None:
+                resource_estimator.configure(bands.scf, 'scf', structure,
+                                             options)
+                # the band path is set by the PwBandsWorkChain
+                resource_estimator.configure(
+                        bands.bands, 'bands', structure, options,
+                        nkpoints=resource_estimator.get_number_of_kpoints(
+                            'bands', structure, bands))
+            builder.bands = bands
+
+        if want_dos is not False:
+            dos_options = options
+            if options:
+                dos_options = options.copy()
+                num_machines = 1
+                procs = dos_options['resources']['tot_num_mpiprocs']
+                tot_num_mpiprocs = min(DOS_MAX_PROCS, procs)
+                dos_options['resources'] = {
+                        'num_machines': num_machines,
+                        'tot_num_mpiprocs': tot_num_mpiprocs
+                        }
+                # the same work is done by fewer processes
+                if 'max_wallclock_seconds' in dos_options:
+                    dos_options['max_wallclock_seconds'] = math.ceil(
+                        dos_options['max_wallclock_seconds'] * procs
+                        / tot_num_mpiprocs)
+            dos = PdosWorkChain.get_builder_from_protocol(
+                    pw_code, dos_code, projwfc_code,
+                    structure, protocol, overrides=dos_overrides,
+                    options=dos_options, **kwargs)
+            dos.pop('scf', None)
+            dos['nscf']['pw']['parent_folder'] = None #orm.Data()
+            if resource_estimator is not None:
+                nkpoints = resource_estimator.get_number_of_kpoints(
+                        'dos', structure, dos.nscf)
+                resource_estimator.configure(dos.nscf, 'dos', structure,
+                                             options, nkpoints=nkpoints)
+                # dos.x and projwfc.x do not scale beyond one machine, the
+                # walltime is estimated for the limited number of processes
+                dos_options = resource_estimator.get_options(
+                        'dos', structure, options,
+                        pseudos=dos.nscf.pw.get('pseudos'), nkpoints=nkpoints,
+                        max_procs=min(DOS_MAX_PROCS,
+                                      resource_estimator.procs_per_machine))
+                dos.dos.metadata.options = dos_options
+                dos.projwfc.metadata.options = dos_options
+            builder.dos = dos
+
+        if want_phonon is not False:
+            builder.phonon = PhononWorkChain.get_builder_from_protocol(
+                    pw_code, ph_code, q2r_code, matdyn_code,
+                    structure,
+                    protocol, phonon_overrides, options,
+                    run_scf=False, resource_estimator=resource_estimator,
+                    **kwargs)
+
+        for name, want in (('want_relax', want_relax),
+                           ('want_bands', want_bands),
+                           ('want_dos', want_dos),
+                           ('want_phonon', want_phonon)):
+            if want is not None:
+                builder[name] = orm.Bool(want)
+        builder.reuse_relax_scf = orm.Bool(reuse_relax_scf)
+        builder.want_prerelax = orm.Bool(want_prerelax)
+        if prerelax_calculator is not None:
+            builder.prerelax_calculator = orm.Str(prerelax_calculator)
+        if prerelax_parameters is not None:
+            builder.prerelax_parameters = orm.Dict(prerelax_parameters)
 
         return builder
 
+    @staticmethod
+    def validate_inputs(inputs, _):
+        """Validate that the enabled calculations have their inputs."""
+        for name in ('relax', 'bands', 'dos', 'phonon'):
+            want = inputs.get(f'want_{name}')
+            if want is not None and want.value and name not in inputs:
+                return f'`want_{name}` is enabled but no `{name}` inputs ' \
+                       'are specified.'
+        want_prerelax = inputs.get('want_prerelax')
+        want_relax = inputs.get('want_relax')
+        if want_prerelax is not None and want_prerelax.value and \
+                (want_relax is None or not want_relax.value):
+            return '`want_prerelax` requires `want_relax`.'
+
     def setup(self):
         self.ctx.current_structure = self.inputs.structure
+        self.ctx.cached = setup_cache(self)
+        if 'restart_from' in self.inputs and self.ctx.cached is None:
+            self.restore(self.inputs.restart_from)
+
+    def restore(self, previous):
+        """Reuse the successful steps of a previous DFTWorkChain.
+
+        The steps are looked up by their call link label in the previous
+        run and, if it was itself restarted, in the runs it restarted from.
+        If the phonon calculation failed, the remote folder of its last
+        ph.x calculation is kept so that ph.x can recover from it, unless
+        the q-points were split over several ph.x calculations.
+        """
+        if previous.inputs.want_relax.value != self.inputs.want_relax.value:
+            self.report(f'DFTWorkChain<{previous.pk}> was run with a '
+                        'different want_relax, nothing is reused')
+            return
+
+        steps = {}
+        node = previous
+        while node is not None:
+            for link in node.base.links.get_outgoing(
+                    link_type=LinkType.CALL_WORK).all():
+                steps.setdefault(link.link_label, link.node)
+            node = node.inputs.restart_from \
+                if 'restart_from' in node.inputs else None
+
+        for name in ('relax', 'scf', 'bands', 'dos', 'phonon'):
+            if name == 'relax' and not self.is_relax_enabled():
+                continue
+            step = steps.get(name)
+            if step is None or not step.is_finished_ok:
+                continue
+            self.report(f'reusing {name} {step.process_label}<{step.pk}> '
+                        f'of DFTWorkChain<{previous.pk}>')
+            self.ctx[name] = step
+            if name == 'relax':
+                self.ctx.current_structure = step.outputs.output_structure
+                if self.inputs['reuse_relax_scf'] and 'scf' not in steps:
+                    final_scf = self.get_relax_final_scf()
+                    if final_scf is not None:
+                        self.ctx.scf = final_scf
+            if name == 'scf':
+                self.ctx.scf_folder = step.outputs.remote_folder
+
+        if 'scf' in self.ctx and 'scf_folder' not in self.ctx:
+            self.ctx.scf_folder = self.ctx.scf.outputs.remote_folder
+
+        phonon = steps.get('phonon')
+        if phonon is not None and 'phonon' not in self.ctx:
+            ph_calculation = get_ph_restart_calculation(phonon)
+            if ph_calculation is not None:
+                self.ctx.ph_restart_folder = ph_calculation.outputs.remote_folder
+                self.report('recovering ph.x from PhCalculation'
+                            f'<{ph_calculation.pk}>')
+            else:
+                self.report(f'PhononWorkChain<{phonon.pk}> cannot be '
+                            'recovered, ph.x is run again')
+
+    def is_cached(self):
+        return self.ctx.cached is not None
+
+    def reuse_cached(self):
+        """Attach the outputs of the cached DFTWorkChain."""
+        self.report('reusing the outputs of equivalent DFTWorkChain'
+                    f'<{self.ctx.cached.pk}>')
+        reuse_outputs(self, self.ctx.cached)
+
+    def should_run_prerelax(self):
+        return self.inputs['want_prerelax'] and self.should_run_relax()
+
+    def run_prerelax(self):
+        """Pre-relax the structure with a cheap ASE calculator.
+
+        A failure of the calculator or the optimizer is not fatal, the
+        relaxation then starts from the input structure. So does it when the
+        optimizer did not converge or the structure changed more than the
+        `max_volume_change` and `max_displacement` thresholds.
+        """
+        parameters = self.inputs.get('prerelax_parameters', orm.Dict())
+        try:
+            results = prerelax_structure(
+                self.ctx.current_structure,
+                self.inputs.prerelax_calculator, parameters,
+                metadata={'call_link_label': 'prerelax'})
+        except PrerelaxError as exception:
+            self.report(f'pre-relaxation failed ({exception}), relaxing the '
+                        'input structure')
+            return
+        output_parameters = results['output_parameters'].get_dict()
+        self.report('pre-relaxation: {steps} steps, energy {initial_energy:.4f}'
+                    ' -> {final_energy:.4f} eV'.format(**output_parameters))
+        rejection = get_prerelax_rejection(output_parameters,
+                                           parameters.get_dict())
+        if rejection is not None:
+            self.report(f'pre-relaxed structure rejected ({rejection}), '
+                        'relaxing the input structure')
+            return
+        self.ctx.prerelax = results['structure']
+        self.ctx.current_structure = results['structure']
 
     def is_relax_enabled(self):
         return self.inputs['want_relax']
+
+    def should_run_relax(self):
+        return self.is_relax_enabled() and 'relax' not in self.ctx
    
     def run_relax(self):
         inputs = AttributeDict(self.exposed_inputs(PwRelaxWorkChain,
@@ -164,6 +445,41 @@ class DFTWorkChain(ProtocolMixin, WorkChain):
         relaxed_structure = self.ctx.relax.outputs.output_structure
         self.ctx.current_structure = relaxed_structure
 
+        if self.inputs['reuse_relax_scf']:
+            final_scf = self.get_relax_final_scf()
+            if final_scf is None:
+                self.report('PwRelaxWorkChain has no successful SCF to '
+                            'reuse, running a separate SCF calculation')
+            else:
+                self.report(f'reusing PwBaseWorkChain<{final_scf.pk}> of the '
+                            'relaxation as SCF')
+                self.ctx.scf = final_scf
+                self.ctx.scf_folder = final_scf.outputs.remote_folder
+
+    def get_relax_final_scf(self):
+        """Return the SCF of the relaxation reused instead of a separate SCF.
+
+        This is the final SCF of the relaxation if the PwRelaxWorkChain runs
+        one (the `base_final_scf` input of older aiida-quantumespresso
+        versions). Otherwise it is the last iteration of the relaxation,
+        whose charge density and output parameters belong to the relaxed
+        structure. None if there is no successful one.
+        """
+        children = self.ctx.relax.base.links.get_outgoing(
+            link_type=LinkType.CALL_WORK).all()
+        final_scfs = [link.node for link in children
+                      if link.link_label == 'final_scf']
+        if not final_scfs:
+            final_scfs = sorted((link.node for link in children),
+                                key=lambda node: node.ctime, reverse=True)[:1]
+        for final_scf in final_scfs:
+            if final_scf.is_finished_ok and 'remote_folder' in final_scf.outputs:
+                return final_scf
+        return None
+
+    def should_run_scf(self):
+        return 'scf' not in self.ctx
+
     def run_scf(self):
         inputs = AttributeDict(self.exposed_inputs(PwBaseWorkChain,
                                                    namespace='scf'))
@@ -181,8 +497,46 @@ class DFTWorkChain(ProtocolMixin, WorkChain):
             return self.exit_codes.ERROR_DFT_PROCESS_FAILED_SCF
         self.ctx.scf_folder = self.ctx.scf.outputs.remote_folder
  
+    def is_parallel_enabled(self):
+        return self.inputs['run_parallel']
+
+    def get_enabled_branches(self):
+        """Return the (should_run, run, inspect) steps of the enabled
+        post-SCF branches."""
+        branches = []
+        if self.is_bands_enabled():
+            branches.append((self.should_run_bands, self.run_bands,
+                             self.inspect_bands))
+        if self.is_dos_enabled():
+            branches.append((self.should_run_dos, self.run_dos,
+                             self.inspect_dos))
+        if self.is_phonon_enabled():
+            branches.append((self.should_run_phonon, self.run_phonon,
+                             self.inspect_phonon))
+        return branches
+
+    def run_branches(self):
+        """Submit all enabled post-SCF calculations at once."""
+        futures = {}
+        for should_run, run, _ in self.get_enabled_branches():
+            if should_run():
+                futures.update(run())
+        return ToContext(**futures)
+
+    def inspect_branches(self):
+        """Inspect every post-SCF calculation and report all failures."""
+        exit_code = None
+        for _, _, inspect in self.get_enabled_branches():
+            result = inspect()
+            if result is not None and exit_code is None:
+                exit_code = result
+        return exit_code
+
     def is_bands_enabled(self):
         return self.inputs['want_bands']
+
+    def should_run_bands(self):
+        return self.is_bands_enabled() and 'bands' not in self.ctx
     
     def run_bands(self):
         inputs = AttributeDict(self.exposed_inputs(PwBandsWorkChain,
@@ -202,6 +556,9 @@ class DFTWorkChain(ProtocolMixin, WorkChain):
    
     def is_dos_enabled(self):
         return self.inputs['want_dos']
+
+    def should_run_dos(self):
+        return self.is_dos_enabled() and 'dos' not in self.ctx
     
     def run_dos(self):
         inputs = AttributeDict(self.exposed_inputs(PdosWorkChain, namespace='dos'))
@@ -222,11 +579,16 @@ class DFTWorkChain(ProtocolMixin, WorkChain):
     def is_phonon_enabled(self):
         return self.inputs['want_phonon']
 
+    def should_run_phonon(self):
+        return self.is_phonon_enabled() and 'phonon' not in self.ctx
+
     def run_phonon(self):
         inputs = AttributeDict(self.exposed_inputs(PhononWorkChain,
                                                    namespace='phonon'))
         inputs.structure = self.ctx.current_structure
         inputs.scf_folder = self.ctx.scf_folder
+        if 'ph_restart_folder' in self.ctx:
+            inputs.ph_restart_folder = self.ctx.ph_restart_folder
         inputs.metadata.call_link_label = 'phonon'
         future = self.submit(PhononWorkChain, **inputs)
         self.report(f'launching PhononWorkChain<{future.pk}>')
@@ -260,6 +622,8 @@ class DFTWorkChain(ProtocolMixin, WorkChain):
                                            PwBaseWorkChain,
                                            namespace='scf'))
 
+        if 'prerelax' in self.ctx:
+            self.out('prerelaxed_structure', self.ctx.prerelax)
         self.out('structure', self.ctx.current_structure)
         self.out('scf_parameters', self.ctx.scf.outputs.output_parameters)
 
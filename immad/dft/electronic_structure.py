@@ -1,19 +1,181 @@
+import base64
+import getpass
+import hashlib
+import io
 import json
+import os
 import random
+import sqlite3
+import tempfile
 
+import numpy as np
 from aiida import orm
 from monty.json import jsanitize
 
+from immad.abstract.cache import DiskCache
 
-def export_pdos_data(work_chain_node, fermi_energy, group_dos_by="atom"):
+
+OUTPUT_FORMATS = ("json", "arrays", "npz", "base64")
+# Increase when the exported payloads change, older cache entries are ignored.
+EXPORT_VERSION = 1
+# The default cache is node-local ($TMPDIR, /tmp if not set): the home
+# directory of a cluster is usually on NFS, where SQLite locking is unreliable.
+DEFAULT_CACHE_FILE = os.path.join(
+    tempfile.gettempdir(), f"immad-{getpass.getuser()}", "exports.sqlite"
+)
+
+
+class ExportCache(DiskCache):
+    """Persistent cache of the payloads of `export_pdos_data` and
+    `export_bands_data`.
+
+    Stored output nodes are immutable, so a payload is keyed by the UUIDs of
+    the output nodes it is computed from, the export options and
+    `EXPORT_VERSION`. The least recently used payloads are evicted when the
+    cache exceeds `max_bytes`, also when several processes share the file.
+
+    SQLite locking is unreliable on network file systems, the default
+    `DEFAULT_CACHE_FILE` is therefore in the node-local temporary directory
+    (`$TMPDIR`); only pass a `filename` on NFS if a single process uses it.
+    A cache that stays locked for more than `timeout` seconds, also while it
+    is opened, is bypassed: the payloads are then computed without caching.
+    """
+
+    def __init__(self, filename=None, max_bytes=2**30, timeout=30.0):
+        if filename is None:
+            filename = DEFAULT_CACHE_FILE
+            os.makedirs(os.path.dirname(filename), mode=0o700, exist_ok=True)
+        try:
+            super().__init__(filename, max_bytes=max_bytes, timeout=timeout)
+        except sqlite3.OperationalError:
+            if getattr(self, "connection", None) is not None:
+                self.connection.close()
+            self.connection = None
+
+    @property
+    def bypassed(self):
+        """Whether the cache could not be opened and is bypassed."""
+        return self.connection is None
+
+    def close(self):
+        if not self.bypassed:
+            super().close()
+
+    def get_key(self, kind, nodes, **options):
+        """Return the key of the `kind` payload of `nodes` with `options`."""
+        description = json.dumps(
+            {
+                "version": EXPORT_VERSION,
+                "kind": kind,
+                "uuids": [node.uuid for node in nodes],
+                "options": options,
+            },
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.blake2b(description.encode(), digest_size=16).digest()
+
+    def get_or_compute(self, key, compute):
+        """Return the cached payload of `key`, computed and stored on a miss.
+
+        If the cache is locked by another process (`sqlite3.OperationalError`)
+        or bypassed, the payload is computed and not stored.
+        """
+        if self.bypassed:
+            self.misses += 1
+            return compute()
+        try:
+            found = self.get_many([key])
+        except sqlite3.OperationalError:
+            self.misses += 1
+            return compute()
+        if key in found:
+            return found[key]
+        payload = compute()
+        try:
+            self.put(key, payload)
+        except sqlite3.OperationalError:
+            pass
+        return payload
+
+    def get_statistics(self):
+        """Return the hit/miss counters and the size of the cache."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": 0 if self.bypassed else len(self),
+            "total_bytes": 0 if self.bypassed else self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "bypassed": self.bypassed,
+        }
+
+
+def export_pdos_data(
+    work_chain_node,
+    fermi_energy,
+    group_dos_by="atom",
+    output_format="json",
+    max_points=None,
+    energy_window=None,
+    cache=None,
+):
+    """Export the total and projected DOS for the bandsplot widget.
+
+    `output_format` is "json" for the list of curves with their x and y values,
+    otherwise the compact float32 payload of `export_pdos_arrays` encoded by
+    `encode_arrays`. The curves are restricted to `energy_window`, a (min, max)
+    range relative to the Fermi energy, and reduced to at most `max_points`
+    points by `downsample_curves`, which can move peaks by up to one bucket
+    width. If an `ExportCache` is given, the payload is only computed if it is
+    not cached yet.
+    """
     if "dos" not in work_chain_node:
         return None
+    if cache is not None:
+        node = work_chain_node.dos
+        labels = ("projections", "projections_up", "projections_down")
+        outputs = [node.dos.output_dos] + [
+            node.projwfc[label] for label in labels if label in node.projwfc
+        ]
+        options = {
+            "fermi_energy": fermi_energy,
+            "group_dos_by": group_dos_by,
+            "output_format": output_format,
+            "max_points": max_points,
+            "energy_window": energy_window,
+        }
+        return cache.get_or_compute(
+            cache.get_key("pdos", outputs, **options),
+            lambda: export_pdos_data(work_chain_node, **options),
+        )
+    if output_format != "json":
+        return encode_arrays(
+            export_pdos_arrays(
+                work_chain_node,
+                fermi_energy,
+                group_dos_by,
+                max_points=max_points,
+                energy_window=energy_window,
+            ),
+            output_format,
+        )
 
     node = work_chain_node.dos
     _, energy_dos, _ = node.dos.output_dos.get_x()
     tdos_values = {
         f"{n}": v for n, v, _ in node.dos.output_dos.get_y()
     }
+    reduction = {
+        "fermi_energy": fermi_energy,
+        "max_points": max_points,
+        "energy_window": energy_window,
+    }
+    if max_points is not None or energy_window is not None:
+        names = list(tdos_values)
+        energy_dos, values = _reduce_curves(
+            energy_dos, np.array([tdos_values[n] for n in names]), **reduction
+        )
+        tdos_values = dict(zip(names, values))
 
     dos = []
     
@@ -34,6 +196,7 @@ def export_pdos_data(work_chain_node, fermi_energy, group_dos_by="atom"):
             node.projwfc.projections,
             group_dos_by=group_dos_by,
             spin_type="none",
+            **reduction,
         )
     else:
         # The total dos parsed
@@ -62,6 +225,7 @@ def export_pdos_data(work_chain_node, fermi_energy, group_dos_by="atom"):
             node.projwfc.projections_up,
             group_dos_by=group_dos_by,
             spin_type="up",
+            **reduction,
         )
 
         # spin-dn (↓)
@@ -70,6 +234,7 @@ def export_pdos_data(work_chain_node, fermi_energy, group_dos_by="atom"):
             group_dos_by=group_dos_by,
             spin_type="down",
             line_style="dash",
+            **reduction,
         )
     data_dict = {
         "fermi_energy": fermi_energy,
@@ -77,9 +242,39 @@ def export_pdos_data(work_chain_node, fermi_energy, group_dos_by="atom"):
     }
     return json.loads(json.dumps(data_dict))
 
-def export_bands_data(work_chain_node, fermi_energy=None):
+def export_bands_data(
+    work_chain_node,
+    fermi_energy=None,
+    output_format="json",
+    max_kpoints=None,
+    cache=None,
+):
+    """Export the band structure for the bandsplot widget.
+
+    `output_format` is "json" for the AiiDA band visualizer format, otherwise
+    the compact float32 payload of `export_bands_arrays` encoded by
+    `encode_arrays`. If `max_kpoints` is given, the k-points of the path are
+    thinned to about `max_kpoints`, keeping the high-symmetry points. If an
+    `ExportCache` is given, the payload is only computed if it is not cached
+    yet.
+    """
     if "bands" not in work_chain_node:
         return None
+    if cache is not None:
+        options = {
+            "fermi_energy": fermi_energy,
+            "output_format": output_format,
+            "max_kpoints": max_kpoints,
+        }
+        return cache.get_or_compute(
+            cache.get_key("bands", [work_chain_node.bands.band_structure], **options),
+            lambda: export_bands_data(work_chain_node, **options),
+        )
+    if output_format != "json":
+        return encode_arrays(
+            export_bands_arrays(work_chain_node, fermi_energy, max_kpoints),
+            output_format,
+        )
 
     data = json.loads(
         work_chain_node.bands.band_structure._exportcontent(
@@ -88,44 +283,257 @@ def export_bands_data(work_chain_node, fermi_energy=None):
     )
     # The fermi energy from band calculation is not robust.
     data["fermi_level"] = fermi_energy
+    if max_kpoints is not None:
+        total = sum(path["length"] for path in data["paths"]) or 1
+        for path in data["paths"]:
+            indices = _thin_indices(
+                path["length"] + 1, [], max(2, max_kpoints * path["length"] // total)
+            )
+            path["x"] = [path["x"][i] for i in indices]
+            path["values"] = np.array(path["values"])[:, indices].tolist()
+            path["length"] = len(indices) - 1
     return [jsanitize(data),]
 
+
+def export_pdos_arrays(
+    work_chain_node,
+    fermi_energy,
+    group_dos_by="atom",
+    max_points=None,
+    energy_window=None,
+):
+    """Export the total and projected DOS as float32 arrays.
+
+    Every energy axis is stored once in `energies`, the curves sharing an axis
+    are the rows of one matrix in `values`. Each curve of `curves` has the
+    style of the JSON export plus its `axis` and `row`. `max_points` and
+    `energy_window` reduce the curves as in `export_pdos_data`.
+    """
+    if "dos" not in work_chain_node:
+        return None
+
+    node = work_chain_node.dos
+    _, energy_dos, _ = node.dos.output_dos.get_x()
+    tdos_values = {f"{n}": v for n, v, _ in node.dos.output_dos.get_y()}
+
+    energies = []
+    rows = []
+    curves = []
+
+    def add_curve(energy, values, **style):
+        for axis, axis_energy in enumerate(energies):
+            if axis_energy is energy or np.array_equal(axis_energy, energy):
+                break
+        else:
+            axis = len(energies)
+            energies.append(energy)
+            rows.append([])
+        curves.append(dict(style, axis=axis, row=len(rows[axis])))
+        rows[axis].append(values)
+
+    total_style = {
+        "borderColor": "#8A8A8A",  # dark gray
+        "backgroundColor": "#999999",  # light gray
+        "backgroundAlpha": "40%",
+    }
+    if "projections" in node.projwfc:
+        spins = [(node.projwfc.projections, "none", "solid")]
+        add_curve(energy_dos, tdos_values.get("dos"), label="Total DOS",
+                  lineStyle="solid", **total_style)
+    else:
+        spins = [
+            (node.projwfc.projections_up, "up", "solid"),
+            (node.projwfc.projections_down, "down", "dash"),
+        ]
+        add_curve(energy_dos, tdos_values.get("dos_spin_up"),
+                  label="Total DOS (↑)", lineStyle="solid", **total_style)
+        add_curve(energy_dos, -tdos_values.get("dos_spin_down"),
+                  label="Total DOS (↓)", lineStyle="dash", **total_style)
+
+    for projections, spin_type, line_style in spins:
+        _pdos = _group_projections(projections, group_dos_by)
+        for label, (energy, pdos) in _pdos.items():
+            if spin_type == "down":
+                pdos = -pdos
+                label = f"{label} (↓)"
+            if spin_type == "up":
+                label = f"{label} (↑)"
+            add_curve(energy, pdos, label=label, borderColor=cmap(label),
+                      lineStyle=line_style)
+
+    if max_points is not None or energy_window is not None:
+        for axis, (energy, values) in enumerate(zip(energies, rows)):
+            energies[axis], rows[axis] = _reduce_curves(
+                energy,
+                np.array(values),
+                fermi_energy=fermi_energy,
+                max_points=max_points,
+                energy_window=energy_window,
+            )
+
+    return {
+        "fermi_energy": fermi_energy,
+        "energies": [np.asarray(energy, dtype=np.float32) for energy in energies],
+        "values": [np.array(values, dtype=np.float32) for values in rows],
+        "curves": curves,
+    }
+
+
+def export_bands_arrays(work_chain_node, fermi_energy=None, max_kpoints=None):
+    """Export the band structure as float32 arrays.
+
+    `x` is the distance along the path for every k-point, `bands` the
+    (n_kpoints, n_bands) energies, `band_type` the spin of every band and
+    `labels` the (x, label) high-symmetry points. If `max_kpoints` is given,
+    the k-points are thinned keeping the high-symmetry points.
+    """
+    if "bands" not in work_chain_node:
+        return None
+
+    band_structure = work_chain_node.bands.band_structure
+    labels = band_structure.labels or []
+    x = _get_path_distances(band_structure, [i for i, _ in labels])
+    bands = band_structure.get_bands()
+    band_type = np.zeros(bands.shape[-1], dtype=np.int8)
+    if bands.ndim == 3:
+        # spin up and spin down bands side by side
+        band_type = np.repeat(np.arange(len(bands), dtype=np.int8), bands.shape[-1])
+        bands = np.concatenate(bands, axis=1)
+    label_x = [[float(x[i]), label] for i, label in labels]
+    if max_kpoints is not None:
+        indices = _thin_indices(len(x), [i for i, _ in labels], max_kpoints)
+        x = x[indices]
+        bands = bands[indices]
+    return {
+        "label": band_structure.label,
+        # The fermi energy from band calculation is not robust.
+        "fermi_level": fermi_energy,
+        "x": x.astype(np.float32),
+        "bands": bands.astype(np.float32),
+        "band_type": band_type,
+        "labels": label_x,
+    }
+
+
+def _get_path_distances(band_structure, label_indices):
+    """Return the distance along the k-point path of every k-point.
+
+    The distances are cartesian if the cell is set. Two consecutive labelled
+    k-points are a discontinuity of the path (e.g. X|U) and get the same
+    distance.
+    """
+    try:
+        kpoints = band_structure.get_kpoints(cartesian=True)
+    except AttributeError:
+        # no cell, the distances are in reciprocal coordinates
+        kpoints = band_structure.get_kpoints()
+    steps = np.linalg.norm(np.diff(kpoints, axis=0), axis=1)
+    labelled = np.isin(np.arange(len(kpoints)), label_indices)
+    steps[labelled[1:] & labelled[:-1]] = 0.0
+    return np.concatenate([[0.0], np.cumsum(steps)])
+
+
+def encode_arrays(payload, output_format="arrays"):
+    """Encode a payload of `export_pdos_arrays` or `export_bands_arrays`.
+
+    "arrays" returns the payload unchanged, "npz" compressed npz bytes (see
+    `decode_npz`) and "base64" a JSON-serializable dictionary where every array
+    is replaced by its dtype, shape and base64 encoded bytes.
+    """
+    if output_format not in OUTPUT_FORMATS[1:]:
+        raise ValueError(f"Unknown output format: {output_format}!")
+    if payload is None or output_format == "arrays":
+        return payload
+
+    arrays = {}
+    metadata = _extract_arrays(payload, arrays)
+    if output_format == "npz":
+        stream = io.BytesIO()
+        np.savez_compressed(
+            stream, __metadata__=np.array(json.dumps(metadata)), **arrays
+        )
+        return stream.getvalue()
+    return {
+        "metadata": metadata,
+        "arrays": {
+            name: {
+                "dtype": array.dtype.str,
+                "shape": list(array.shape),
+                "data": base64.b64encode(array.tobytes()).decode(),
+            }
+            for name, array in arrays.items()
+        },
+    }
+
+
+def decode_npz(data):
+    """Decode the npz bytes of `encode_arrays` back into a payload."""
+    with np.load(io.BytesIO(data)) as npz:
+        metadata = json.loads(str(npz["__metadata__"]))
+        arrays = {name: npz[name] for name in npz.files if name != "__metadata__"}
+    return _insert_arrays(metadata, arrays)
+
+
+def _extract_arrays(value, arrays):
+    """Replace the arrays of a payload by references stored in `arrays`."""
+    if isinstance(value, np.ndarray):
+        name = f"array_{len(arrays)}"
+        arrays[name] = value
+        return {"__array__": name}
+    if isinstance(value, dict):
+        return {key: _extract_arrays(item, arrays) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_extract_arrays(item, arrays) for item in value]
+    return value
+
+
+def _insert_arrays(value, arrays):
+    """Inverse of `_extract_arrays`."""
+    if isinstance(value, dict):
+        if set(value) == {"__array__"}:
+            return arrays[value["__array__"]]
+        return {key: _insert_arrays(item, arrays) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_insert_arrays(item, arrays) for item in value]
+    return value
+
 def _projections_curated(
     projections: orm.ProjectionData,
     group_dos_by="atom",
     spin_type="none",
     line_style="solid",
+    fermi_energy=0.0,
+    max_points=None,
+    energy_window=None,
 ):
     """Collect the data from ProjectionData and parse it as dos list which can be
     understand by bandsplot widget. `group_dos_by` is for which tag to be grouped, by atom or by orbital name.
     The spin_type is used to invert all the y values of pdos to be shown as spin down pdos and to set label.
+    `max_points` and `energy_window` reduce the curves as in `export_pdos_data`.
     """
-    _pdos = {}
-
-    for orbital, pdos, energy in projections.get_pdos():
-        orbital_data = orbital.get_orbital_dict()
-        kind_name = orbital_data["kind_name"]
-        atom_position = [round(i, 2) for i in orbital_data["position"]]
-        orbital_name = orbital.get_name_from_quantum_numbers(
-            orbital_data["angular_momentum"], orbital_data["magnetic_number"]
-        ).lower()
-
-        if group_dos_by == "atom":
-            dos_group_name = atom_position
-        elif group_dos_by == "angular":
-            # by orbital label
-            dos_group_name = orbital_name[0]
-        elif group_dos_by == "angular_and_magnetic":
-            # by orbital label
-            dos_group_name = orbital_name
+    _pdos = _group_projections(projections, group_dos_by)
+    if _pdos and (max_points is not None or energy_window is not None):
+        energy, _ = next(iter(_pdos.values()))
+        if all(np.array_equal(e, energy) for e, _ in _pdos.values()):
+            # all curves on one energy grid, reduce them at once
+            energy, values = _reduce_curves(
+                energy,
+                np.array([pdos for _, pdos in _pdos.values()]),
+                fermi_energy=fermi_energy,
+                max_points=max_points,
+                energy_window=energy_window,
+            )
+            _pdos = {key: [energy, pdos] for key, pdos in zip(_pdos, values)}
         else:
-            raise Exception(f"Unknow dos type: {group_dos_by}!")
-
-        key = f"{kind_name}-{dos_group_name}"
-        if key in _pdos:
-            _pdos[key][1] += pdos
-        else:
-            _pdos[key] = [energy, pdos]
+            for key, (energy, pdos) in _pdos.items():
+                energy, values = _reduce_curves(
+                    energy,
+                    pdos[None],
+                    fermi_energy=fermi_energy,
+                    max_points=max_points,
+                    energy_window=energy_window,
+                )
+                _pdos[key] = [energy, values[0]]
 
     dos = []
     for label, (energy, pdos) in _pdos.items():
@@ -149,6 +557,142 @@ def _projections_curated(
     return dos
 
 
+def _group_projections(projections: orm.ProjectionData, group_dos_by="atom"):
+    """Sum the PDOS of the orbitals of ProjectionData by group.
+
+    The orbital metadata is extracted once and the PDOS arrays are reduced
+    with a single grouped sum, in the order of the orbitals so that the
+    result is identical to summing them one by one. Returns a dictionary
+    of [energy, pdos] by group key, in order of first occurrence.
+    """
+    # orbital, pdos and energy of every orbital, in order
+    orbitals_pdos = projections.get_pdos()
+    names = {}
+    positions = {}
+    keys = []
+    for orbital, _, _ in orbitals_pdos:
+        orbital_data = orbital.get_orbital_dict()
+        if group_dos_by == "atom":
+            position = tuple(orbital_data["position"])
+            if position not in positions:
+                positions[position] = [round(i, 2) for i in position]
+            dos_group_name = positions[position]
+        elif group_dos_by in ("angular", "angular_and_magnetic"):
+            quantum_numbers = (
+                orbital_data["angular_momentum"],
+                orbital_data["magnetic_number"],
+            )
+            if quantum_numbers not in names:
+                names[quantum_numbers] = orbital.get_name_from_quantum_numbers(
+                    *quantum_numbers
+                ).lower()
+            dos_group_name = names[quantum_numbers]
+            if group_dos_by == "angular":
+                # by orbital label
+                dos_group_name = dos_group_name[0]
+        else:
+            raise Exception(f"Unknow dos type: {group_dos_by}!")
+        keys.append(f"{orbital_data['kind_name']}-{dos_group_name}")
+
+    groups = {}
+    for key in keys:
+        groups.setdefault(key, len(groups))
+    indices = np.array([groups[key] for key in keys], dtype=int)
+
+    pdos_arrays = [pdos for _, pdos, _ in orbitals_pdos]
+    first = {}
+    for index, (_, _, energy) in zip(indices, orbitals_pdos):
+        first.setdefault(index, energy)
+    energies = [first[i] for i in range(len(groups))]
+
+    if len({pdos.shape for pdos in pdos_arrays}) > 1:
+        # orbitals on different energy grids, sum them one by one
+        _pdos = {}
+        for key, energy_index, pdos in zip(keys, indices, pdos_arrays):
+            if key in _pdos:
+                _pdos[key][1] = _pdos[key][1] + pdos
+            else:
+                _pdos[key] = [energies[energy_index], pdos]
+        return _pdos
+
+    pdos_matrix = np.stack(pdos_arrays)
+    summed = np.zeros((len(groups),) + pdos_matrix.shape[1:], dtype=pdos_matrix.dtype)
+    np.add.at(summed, indices, pdos_matrix)
+    return {key: [energies[i], summed[i]] for key, i in groups.items()}
+
+
+def downsample_curves(x, values, max_points):
+    """Reduce curves sharing an x axis to at most `max_points` points.
+
+    The points are split into `max_points // 2` buckets and the minimum and
+    the maximum of every curve in every bucket are kept, in their original
+    order, so that peaks survive. The first and the last x of every bucket
+    are used for all curves, so the reduced curves still share one x axis.
+    The kept values are exact, but they are placed at the bucket edges and
+    not at the x where they occur: a peak can move by up to one bucket
+    width, `(x[-1] - x[0]) / (max_points // 2)` on a uniform grid. Increase
+    `max_points` if the peak positions matter.
+
+    Args:
+        x (np.ndarray): the x values, shape (n,)
+        values (np.ndarray): the curves, shape (n_curves, n)
+        max_points (int): the maximum number of points
+
+    Returns: the reduced x and values
+    """
+    n = len(x)
+    n_buckets = max(1, max_points // 2)
+    if n <= max_points or n < 2 * n_buckets:
+        return x, values
+
+    bounds = np.linspace(0, n, n_buckets + 1).astype(int)
+    size = np.diff(bounds).max()
+    # pad every bucket to the same size by repeating its last point
+    positions = np.minimum(bounds[:-1, None] + np.arange(size), bounds[1:, None] - 1)
+    buckets = values[:, positions]
+    lowest = buckets.argmin(axis=2)
+    highest = buckets.argmax(axis=2)
+    low = np.take_along_axis(buckets, lowest[..., None], axis=2)[..., 0]
+    high = np.take_along_axis(buckets, highest[..., None], axis=2)[..., 0]
+    low_first = lowest <= highest
+
+    reduced = np.empty((len(values), 2 * n_buckets), dtype=values.dtype)
+    reduced[:, 0::2] = np.where(low_first, low, high)
+    reduced[:, 1::2] = np.where(low_first, high, low)
+    reduced_x = np.empty(2 * n_buckets, dtype=np.asarray(x).dtype)
+    reduced_x[0::2] = x[bounds[:-1]]
+    reduced_x[1::2] = x[bounds[1:] - 1]
+    return reduced_x, reduced
+
+
+def _reduce_curves(x, values, fermi_energy, max_points=None, energy_window=None):
+    """Restrict curves to an energy window around the Fermi energy and
+    downsample them, see `export_pdos_data`."""
+    x = np.asarray(x)
+    if energy_window is not None:
+        emin, emax = energy_window
+        reference = fermi_energy or 0.0
+        mask = (x >= reference + emin) & (x <= reference + emax)
+        x = x[mask]
+        values = values[:, mask]
+    if max_points is not None:
+        x, values = downsample_curves(x, values, max_points)
+    return x, values
+
+
+def _thin_indices(n, keep, max_points):
+    """Return about `max_points` sorted indices of `range(n)`.
+
+    The indices in `keep` and both ends are always kept, the other points are
+    picked uniformly between them.
+    """
+    if n <= max_points:
+        return np.arange(n)
+    anchors = np.unique(np.concatenate([[0, n - 1], np.asarray(keep, dtype=int)]))
+    uniform = np.round(np.linspace(0, n - 1, max(2, max_points - len(anchors))))
+    return np.union1d(anchors, uniform.astype(int))
+
+
 def cmap(label: str) -> str:
     """Return RGB string of color for given pseudo info
     Hardcoded at the momment.
@@ -1,6 +1,7 @@
 from aiida import engine, orm
 
 from first_principle import DFTWorkChain
+from immad.dft.resources import ResourceEstimator
 
 if __name__ == '__main__':
     pw = orm.load_code('pw@phpc')
@@ -23,13 +24,13 @@ if __name__ == '__main__':
     structure = orm.load_node(pk=4408)
     builder = DFTWorkChain.get_builder_from_protocol(
         pw, dos, projwfc, ph, q2r, matdyn, structure,
-        options=options
+        options=options,
+        resource_estimator=ResourceEstimator(procs_per_machine=16),
+        want_relax=False,
+        want_bands=True,
+        want_dos=True,
+        want_phonon=False,
         )
 
-    builder.want_relax = orm.Bool(False)
-    builder.want_bands = orm.Bool(True)
-    builder.want_dos = orm.Bool(True)
-    builder.want_phonon = orm.Bool(False)
-
     node = engine.run(builder)
     print(node)
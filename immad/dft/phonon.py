@@ -1,14 +1,111 @@
 from aiida import orm
 from aiida.common import AttributeDict, exceptions
 from aiida.engine import ToContext, WorkChain, append_, if_, while_
-from aiida.plugins import WorkflowFactory, DataFactory
+from aiida.plugins import CalculationFactory, WorkflowFactory, DataFactory
 from aiida.tools.data.array.kpoints import get_explicit_kpoints_path
+from aiida_quantumespresso.calculations.functions.merge_ph_outputs import merge_ph_outputs
 from aiida_quantumespresso.workflows.protocols.utils import ProtocolMixin
+from .cache import reuse_outputs, setup_cache
+
+# The Quantum ESPRESSO workchains and the transfer CalcJob are resolved by
+# `load_workflows` when the spec is defined instead of at import, see
+# `immad.dft.dft`.
+PwBaseWorkChain = PhBaseWorkChain = None
+Q2rBaseWorkChain = MatdynBaseWorkChain = TransferCalculation = None
+
+
+def load_workflows():
+    """Resolve the processes run by PhononWorkChain."""
+    global PwBaseWorkChain, PhBaseWorkChain, Q2rBaseWorkChain
+    global MatdynBaseWorkChain, TransferCalculation
+    if PwBaseWorkChain is None:
+        PwBaseWorkChain = WorkflowFactory('quantumespresso.pw.base')
+        PhBaseWorkChain = WorkflowFactory('quantumespresso.ph.base')
+        Q2rBaseWorkChain = WorkflowFactory('quantumespresso.q2r.base')
+        MatdynBaseWorkChain = WorkflowFactory('quantumespresso.matdyn.base')
+        TransferCalculation = CalculationFactory('core.transfer')
+
+
+DYNAMICAL_MATRIX_FOLDER = 'DYN_MAT'
+PH_PROCESS_TYPE = 'aiida.calculations:quantumespresso.ph'
+# INPUTPH keys of ph.x calculations that only run part of the q-points
+PARTIAL_PH_KEYS = ('start_q', 'last_q', 'only_init')
+
+
+def get_dynamical_matrices_transfer(folders):
+    """Return the inputs of a TransferCalculation collecting the dynamical
+    matrices of several ph.x runs in one folder.
+
+    Every ph.x calculation over a subset of q-points writes its dynamical
+    matrices into its own remote `DYN_MAT` directory. The `core.transfer`
+    CalcJob copies them into one new remote folder on the same computer, so
+    that q2r.x can read all of them from a single parent folder.
+
+    Args:
+        folders (list): remote folders of the ph.x calculations
+
+    Returns: dictionary of inputs of the `core.transfer` CalcJob
+    """
+    source_nodes = {f'chunk_{index:04d}': folder
+                    for index, folder in enumerate(folders)}
+    # the first copy creates the directory, the others add their files to it
+    remote_files = [
+        (label, DYNAMICAL_MATRIX_FOLDER if index == 0
+         else f'{DYNAMICAL_MATRIX_FOLDER}/*', DYNAMICAL_MATRIX_FOLDER)
+        for index, label in enumerate(source_nodes)
+    ]
+    return {
+        'source_nodes': source_nodes,
+        'instructions': orm.Dict({'retrieve_files': False,
+                                  'remote_files': remote_files}),
+        'metadata': {'computer': folders[0].computer},
+    }
+
+
+def get_ph_restart_calculation(phonon):
+    """Return the PhCalculation of a failed PhononWorkChain to recover from.
+
+    The last PhCalculation with a remote folder is returned, None if there is
+    none or if the q-points were split over several ph.x calculations: the
+    folder of one of them only holds its own q-points.
+
+    Args:
+        phonon (WorkChainNode): the failed PhononWorkChain
+    """
+    calculations = [
+        node for node in phonon.called_descendants
+        if node.process_type == PH_PROCESS_TYPE
+        and 'remote_folder' in node.outputs
+    ]
+    if not calculations:
+        return None
+    for calculation in calculations:
+        inputph = calculation.inputs.parameters.get_dict().get('INPUTPH', {})
+        if any(key in inputph for key in PARTIAL_PH_KEYS):
+            return None
+    return max(calculations, key=lambda node: node.ctime)
+
+
+def get_ph_restart_inputs(inputs, restart_folder):
+    """Set the PhBaseWorkChain inputs recovering ph.x from a remote folder.
+
+    The q-points of the interrupted PhCalculation are reused. A
+    `qpoints_distance` would be converted to a mesh with the structure of the
+    parent calculation, which a PhCalculation does not have.
+
+    Args:
+        inputs (AttributeDict): the PhBaseWorkChain inputs, modified
+        restart_folder (RemoteData): remote folder of a PhCalculation
+
+    Returns: the inputs
+    """
+    # PhBaseWorkChain sets `recover` when the parent folder is a ph.x one
+    inputs.ph.parent_folder = restart_folder
+    inputs.qpoints = restart_folder.creator.inputs.qpoints
+    inputs.pop('qpoints_distance', None)
+    inputs.pop('qpoints_force_parity', None)
+    return inputs
 
-PwBaseWorkChain = WorkflowFactory('quantumespresso.pw.base')
-PhBaseWorkChain = WorkflowFactory('quantumespresso.ph.base')
-Q2rBaseWorkChain = WorkflowFactory('quantumespresso.q2r.base')
-MatdynBaseWorkChain = WorkflowFactory('quantumespresso.matdyn.base')
 
 class PhononWorkChain(ProtocolMixin, WorkChain):
     """Workchain for phonon calculation using Quantum ESPRESSO."""
@@ -28,6 +125,7 @@ class PhononWorkChain(ProtocolMixin, WorkChain):
             spec (ProcessSpec): specifications
         """
         super().define(spec)
+        load_workflows()
 
         spec.expose_inputs(PwBaseWorkChain, namespace='scf',
             namespace_options={'required': False, 'populate_defaults': False,
@@ -52,6 +150,25 @@ class PhononWorkChain(ProtocolMixin, WorkChain):
                    help='A flag for running SCF calculation')
         spec.input('scf_folder', valid_type=orm.RemoteData, required=False,
                    help='Remote directory for pwSCF calculation')
+        spec.input('parallelize_qpoints', valid_type=orm.Bool,
+                   default=lambda: orm.Bool(False),
+                   help='Split the ph.x calculation over q-points into '
+                        'independent sub-calculations')
+        spec.input('qpoints_chunk_size', valid_type=orm.Int,
+                   default=lambda: orm.Int(1),
+                   help='Number of q-points computed by each ph.x '
+                        'sub-calculation')
+        spec.input('max_concurrent_ph', valid_type=orm.Int, required=False,
+                   help='Maximum number of ph.x sub-calculations running '
+                        'at the same time. No limit if not specified')
+        spec.input('ph_restart_folder', valid_type=orm.RemoteData,
+                   required=False,
+                   help='Remote directory of a previous ph.x calculation to '
+                        'recover from')
+        spec.input('use_cache', valid_type=orm.Bool,
+                   default=lambda: orm.Bool(False),
+                   help='Reuse the outputs of a finished PhononWorkChain '
+                        'with an equivalent structure and the same inputs')
 
         spec.expose_outputs(PwBaseWorkChain, namespace='scf')
         spec.expose_outputs(PhBaseWorkChain, namespace='ph')
@@ -59,17 +176,33 @@ class PhononWorkChain(ProtocolMixin, WorkChain):
         spec.expose_outputs(MatdynBaseWorkChain, namespace='matdyn')
 
         spec.outline(
-            if_(cls.should_run_scf)(
-                cls.run_scf,
-                cls.inspect_scf,
+            cls.setup,
+            if_(cls.is_cached)(
+                cls.reuse_cached,
+            ).else_(
+                if_(cls.should_run_scf)(
+                    cls.run_scf,
+                    cls.inspect_scf,
+                ),
+                if_(cls.should_parallelize_qpoints)(
+                    cls.run_ph_init,
+                    cls.inspect_ph_init,
+                    while_(cls.should_run_ph_chunks)(
+                        cls.run_ph_chunks,
+                        cls.inspect_ph_chunks,
+                    ),
+                    cls.collect_ph,
+                    cls.inspect_collect_ph,
+                ).else_(
+                    cls.run_ph,
+                    cls.inspect_ph,
+                ),
+                cls.run_q2r,
+                cls.inspect_q2r,
+                cls.run_matdyn,
+                cls.inspect_matdyn,
+                cls.results,
             ),
-            cls.run_ph,
-            cls.inspect_ph,
-            cls.run_q2r,
-            cls.inspect_q2r,
-            cls.run_matdyn,
-            cls.inspect_matdyn,
-            cls.results,
         )
         spec.exit_code(401, 'ERROR_SUB_PROCESS_FAILED_SCF',
                        message='the scf PwBaseWorkChain sub process failed')
@@ -79,12 +212,19 @@ class PhononWorkChain(ProtocolMixin, WorkChain):
                        message='the Q2rBaseWorkChain sub process failed')
         spec.exit_code(404, 'ERROR_SUB_PROCESS_FAILED_MATDYN',
                        message='the MatdynBaseWorkChain sub process failed')
+        spec.exit_code(405, 'ERROR_SUB_PROCESS_FAILED_PH_INIT',
+                       message='the initialization PhBaseWorkChain sub process '
+                               'failed')
+        spec.exit_code(406, 'ERROR_SUB_PROCESS_FAILED_COLLECT',
+                       message='the TransferCalculation collecting the '
+                               'dynamical matrices failed')
 
     @classmethod
     def get_builder_from_protocol(cls,
                                   pw_code, ph_code, q2r_code, matdyn_code,
                                   structure,
                                   protocol=None, overrides=None, options=None,
+                                  run_scf=True, resource_estimator=None,
                                   **kwargs):
         """Obtain builder based on input protocols
 
@@ -107,6 +247,11 @@ class PhononWorkChain(ProtocolMixin, WorkChain):
             overrides (dict): a dictionary with keys 'scf' for PwBaseWorkChain overrides
                               and 'ph' for PhBaseWorkChain overrides
             options (dict): predefined options for calculations
+            run_scf (bool): if False, the SCF builder is not constructed and
+                            `scf_folder` has to be set before launching
+            resource_estimator (ResourceEstimator): if specified, the
+                resources, k-point pools and walltime of every stage are
+                estimated instead of using `options` everywhere
 
         Returns: the builder for running PhononWorkChain
         """
@@ -118,11 +263,14 @@ class PhononWorkChain(ProtocolMixin, WorkChain):
         builder = cls.get_builder()
         builder.structure = structure
 
-        scf = PwBaseWorkChain.get_builder_from_protocol(
-                pw_code, structure, protocol=protocol['scf'],
-                overrides=overrides['scf'], options=options, **kwargs)
-        scf.pw.parameters['CONTROL']['calculation'] = 'scf'
-        builder.scf = scf
+        if run_scf:
+            scf = PwBaseWorkChain.get_builder_from_protocol(
+                    pw_code, structure, protocol=protocol['scf'],
+                    overrides=overrides['scf'], options=options, **kwargs)
+            scf.pw.parameters['CONTROL']['calculation'] = 'scf'
+            builder.scf = scf
+        else:
+            builder.run_scf = orm.Bool(False)
 
         ph = PhBaseWorkChain.get_builder_from_protocol(
                 ph_code, protocol=protocol['ph'], overrides=overrides['ph'],
@@ -139,8 +287,41 @@ class PhononWorkChain(ProtocolMixin, WorkChain):
         kpoints = get_explicit_kpoints_path(structure)['explicit_kpoints']
         builder.matdyn.matdyn.kpoints = kpoints
 
+        if resource_estimator is not None:
+            if run_scf:
+                resource_estimator.configure(builder.scf, 'scf',
+                                             structure, options)
+            nqpoints = resource_estimator.get_number_of_qpoints(structure,
+                                                                builder.ph)
+            scf = builder.scf if run_scf else None
+            resource_estimator.configure(
+                    builder.ph, 'ph', structure, options, nqpoints=nqpoints,
+                    nkpoints=resource_estimator.get_number_of_kpoints(
+                        'scf', structure, scf))
+            resource_estimator.configure(builder.q2r, 'q2r', structure,
+                                         options, pools=False,
+                                         nqpoints=nqpoints)
+            resource_estimator.configure(builder.matdyn, 'matdyn',
+                                         structure, options, pools=False,
+                                         nqpoints=nqpoints)
+
         return builder
 
+    def setup(self):
+        """Fingerprint the inputs and look for a cached run if the cache is
+        enabled."""
+        self.ctx.cached = setup_cache(self)
+
+    def is_cached(self):
+        """Check if a finished equivalent PhononWorkChain was found."""
+        return self.ctx.cached is not None
+
+    def reuse_cached(self):
+        """Attach the outputs of the cached PhononWorkChain."""
+        self.report('reusing the outputs of equivalent PhononWorkChain'
+                    f'<{self.ctx.cached.pk}>')
+        reuse_outputs(self, self.ctx.cached)
+
     def should_run_scf(self):
         """Check if one needs to run SCF calculation
 
@@ -175,14 +356,22 @@ class PhononWorkChain(ProtocolMixin, WorkChain):
                         f'{self.ctx.workchain_scf.exit_status}')
             return self.exit_codes.ERROR_SUB_PROCESS_FAILED_SCF
 
+    def get_scf_folder(self):
+        """Return the remote folder of the SCF calculation."""
+        if not self.ctx.run_scf:
+            return self.inputs.scf_folder
+        return self.ctx.workchain_scf.outputs.remote_folder
+
     def run_ph(self):
         """Run phonon calculation using ph.x (via PhBaseWorkChain)."""
         inputs = AttributeDict(self.exposed_inputs(PhBaseWorkChain,
                                                    namespace='ph'))
-        if not self.ctx.run_scf:
-            inputs.ph.parent_folder = self.inputs.scf_folder
+        if 'ph_restart_folder' in self.inputs:
+            get_ph_restart_inputs(inputs, self.inputs.ph_restart_folder)
+            self.report('recovering ph.x from RemoteData'
+                        f'<{self.inputs.ph_restart_folder.pk}>')
         else:
-            inputs.ph.parent_folder = self.ctx.workchain_scf.outputs.remote_folder
+            inputs.ph.parent_folder = self.get_scf_folder()
         running = self.submit(PhBaseWorkChain, **inputs)
         self.report(f'launching PhBaseWorkChain<{running.pk}> '
                     'for ph.x calculation')
@@ -194,12 +383,114 @@ class PhononWorkChain(ProtocolMixin, WorkChain):
             self.report('PhBaseWorkChain failed with exit status '
                         f'{self.ctx.workchain_ph.exit_status}')
             return self.exit_codes.ERROR_SUB_PROCESS_FAILED_PH
+        self.ctx.ph_folder = self.ctx.workchain_ph.outputs.remote_folder
+
+    def should_parallelize_qpoints(self):
+        """Check if ph.x should be split over q-points."""
+        if 'ph_restart_folder' in self.inputs:
+            return False
+        return self.inputs.parallelize_qpoints.value
+
+    def run_ph_init(self):
+        """Run ph.x initialization only to obtain the irreducible q-points."""
+        inputs = AttributeDict(self.exposed_inputs(PhBaseWorkChain,
+                                                   namespace='ph'))
+        inputs.ph.parent_folder = self.get_scf_folder()
+        inputs.only_initialization = orm.Bool(True)
+        inputs.metadata.call_link_label = 'ph_init'
+        running = self.submit(PhBaseWorkChain, **inputs)
+        self.report(f'launching PhBaseWorkChain<{running.pk}> '
+                    'for ph.x initialization')
+        return ToContext(workchain_ph_init=running)
+
+    def inspect_ph_init(self):
+        """Inspect the initialization and split the q-points into chunks."""
+        if not self.ctx.workchain_ph_init.is_finished_ok:
+            self.report('initialization PhBaseWorkChain failed with exit '
+                        f'status {self.ctx.workchain_ph_init.exit_status}')
+            return self.exit_codes.ERROR_SUB_PROCESS_FAILED_PH_INIT
+
+        output_parameters = self.ctx.workchain_ph_init.outputs.output_parameters
+        number_of_qpoints = output_parameters['number_of_qpoints']
+        chunk_size = max(1, self.inputs.qpoints_chunk_size.value)
+        self.ctx.ph_chunks = [
+            (start_q, min(start_q + chunk_size - 1, number_of_qpoints))
+            for start_q in range(1, number_of_qpoints + 1, chunk_size)
+        ]
+        self.ctx.workchain_ph_chunks = []
+        self.report(f'splitting {number_of_qpoints} q-points into '
+                    f'{len(self.ctx.ph_chunks)} ph.x calculations')
+
+    def should_run_ph_chunks(self):
+        """Check if there are q-point chunks left to submit."""
+        return len(self.ctx.ph_chunks) > 0
+
+    def run_ph_chunks(self):
+        """Submit the next batch of q-point chunks.
+
+        At most `max_concurrent_ph` PhBaseWorkChains are submitted at once,
+        the next batch is submitted when the whole batch has terminated, so
+        a slow chunk delays the next batch.
+        """
+        if 'max_concurrent_ph' in self.inputs:
+            max_concurrent = max(1, self.inputs.max_concurrent_ph.value)
+        else:
+            max_concurrent = len(self.ctx.ph_chunks)
+        batch = self.ctx.ph_chunks[:max_concurrent]
+        self.ctx.ph_chunks = self.ctx.ph_chunks[max_concurrent:]
+
+        for start_q, last_q in batch:
+            inputs = AttributeDict(self.exposed_inputs(PhBaseWorkChain,
+                                                       namespace='ph'))
+            parameters = inputs.ph.parameters.get_dict()
+            parameters.setdefault('INPUTPH', {})
+            parameters['INPUTPH']['start_q'] = start_q
+            parameters['INPUTPH']['last_q'] = last_q
+            inputs.ph.parameters = orm.Dict(parameters)
+            inputs.ph.parent_folder = self.get_scf_folder()
+            inputs.metadata.call_link_label = f'ph_q{start_q}_{last_q}'
+            running = self.submit(PhBaseWorkChain, **inputs)
+            self.report(f'launching PhBaseWorkChain<{running.pk}> '
+                        f'for ph.x calculation of q-points {start_q}-{last_q}')
+            self.to_context(workchain_ph_chunks=append_(running))
+
+    def inspect_ph_chunks(self):
+        """Inspect if all the q-point chunks are successful."""
+        for workchain in self.ctx.workchain_ph_chunks:
+            if not workchain.is_finished_ok:
+                self.report(f'PhBaseWorkChain<{workchain.pk}> failed with '
+                            f'exit status {workchain.exit_status}')
+                return self.exit_codes.ERROR_SUB_PROCESS_FAILED_PH
+
+    def collect_ph(self):
+        """Collect the dynamical matrices and outputs of all q-point chunks."""
+        chunks = self.ctx.workchain_ph_chunks
+        self.ctx.ph_parameters = merge_ph_outputs(**{
+            f'output_{index:04d}': workchain.outputs.output_parameters
+            for index, workchain in enumerate(chunks)
+        })
+        inputs = get_dynamical_matrices_transfer(
+            [workchain.outputs.remote_folder for workchain in chunks])
+        inputs['metadata']['call_link_label'] = 'collect_dynamical_matrices'
+        running = self.submit(TransferCalculation, **inputs)
+        self.report(f'launching TransferCalculation<{running.pk}> to collect '
+                    'the dynamical matrices')
+        return ToContext(transfer_dynamical_matrices=running)
+
+    def inspect_collect_ph(self):
+        """Inspect if the dynamical matrices were collected."""
+        transfer = self.ctx.transfer_dynamical_matrices
+        if not transfer.is_finished_ok:
+            self.report('TransferCalculation failed with exit status '
+                        f'{transfer.exit_status}')
+            return self.exit_codes.ERROR_SUB_PROCESS_FAILED_COLLECT
+        self.ctx.ph_folder = transfer.outputs.remote_folder
 
     def run_q2r(self):
         """q -> r transformation using q2r.x (via Q2rBaseWorkChain)."""
         inputs = AttributeDict(self.exposed_inputs(Q2rBaseWorkChain,
                                                    namespace='q2r'))
-        inputs.q2r.parent_folder = self.ctx.workchain_ph.outputs.remote_folder
+        inputs.q2r.parent_folder = self.ctx.ph_folder
         running = self.submit(Q2rBaseWorkChain, **inputs)
         self.report(f'launching Q2rBaseWorkChain<{running.pk}> '
                     'for q2r.x calculation')
@@ -236,9 +527,17 @@ class PhononWorkChain(ProtocolMixin, WorkChain):
             self.out_many(self.exposed_outputs(self.ctx.workchain_scf,
                                                PwBaseWorkChain,
                                                namespace='scf'))
-        self.out_many(self.exposed_outputs(self.ctx.workchain_ph,
+        if self.should_parallelize_qpoints():
+            outputs = self.exposed_outputs(self.ctx.workchain_ph_chunks[-1],
                                            PhBaseWorkChain,
-                                           namespace='ph'))
+                                           namespace='ph')
+            outputs['ph.remote_folder'] = self.ctx.ph_folder
+            outputs['ph.output_parameters'] = self.ctx.ph_parameters
+            self.out_many(outputs)
+        else:
+            self.out_many(self.exposed_outputs(self.ctx.workchain_ph,
+                                               PhBaseWorkChain,
+                                               namespace='ph'))
         self.out_many(self.exposed_outputs(self.ctx.workchain_q2r,
                                            Q2rBaseWorkChain,
                                            namespace='q2r'))
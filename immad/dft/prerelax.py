@@ -0,0 +1,134 @@
+import importlib
+
+from aiida import orm
+from aiida.engine import calcfunction
+
+# calculators available by name, any other calculator is given as
+# 'module:Class'
+CALCULATORS = {
+    'emt': 'ase.calculators.emt:EMT',
+    'lj': 'ase.calculators.lj:LennardJones',
+}
+DEFAULT_PARAMETERS = {
+    'fmax': 0.05,
+    'steps': 200,
+    'optimizer': 'BFGS',
+    'relax_cell': False,
+    'calculator_kwargs': {},
+    'max_volume_change': 0.2,
+    'max_displacement': 1.0,
+}
+
+
+class PrerelaxError(RuntimeError):
+    """Error of the ASE calculator or optimizer during a pre-relaxation."""
+
+
+def get_calculator(name, **kwargs):
+    """Instantiate an ASE calculator.
+
+    Args:
+        name (str): a name of `CALCULATORS` or 'module:Class'
+        kwargs: the arguments of the calculator
+
+    Returns: the ASE calculator
+    """
+    path = CALCULATORS.get(name.lower(), name)
+    module_name, _, class_name = path.partition(':')
+    if not class_name:
+        raise ValueError(f'Unknown calculator {name}, use one of '
+                         f'{", ".join(CALCULATORS)} or module:Class.')
+    module = importlib.import_module(module_name)
+    return getattr(module, class_name)(**kwargs)
+
+
+@calcfunction
+def prerelax_structure(structure, calculator, parameters):
+    """Relax a structure with a cheap ASE calculator.
+
+    Only the positions (and the cell if `relax_cell`) are changed, the kinds
+    of the input structure are kept.
+
+    Args:
+        structure (StructureData): the structure to relax
+        calculator (Str): the ASE calculator, see `get_calculator`
+        parameters (Dict): `fmax`, `steps`, `optimizer` (a class of
+                           ase.optimize), `relax_cell` and
+                           `calculator_kwargs`, see `DEFAULT_PARAMETERS`
+
+    Returns: dictionary with the relaxed `structure` and the
+             `output_parameters` of the optimization, including the relative
+             `volume_change` and the `max_displacement` of the atoms in
+             Angstrom
+
+    Raises:
+        PrerelaxError: the calculator or the optimizer failed
+    """
+    import numpy as np
+    import ase.optimize
+    from ase.calculators.calculator import CalculatorError
+    from ase.filters import FrechetCellFilter
+
+    settings = dict(DEFAULT_PARAMETERS, **parameters.get_dict())
+    atoms = structure.get_ase()
+    initial_volume = atoms.get_volume()
+    initial_positions = atoms.get_scaled_positions(wrap=False)
+    atoms.calc = get_calculator(calculator.value,
+                                **settings['calculator_kwargs'])
+    try:
+        initial_energy = atoms.get_potential_energy()
+        target = FrechetCellFilter(atoms) if settings['relax_cell'] \
+            else atoms
+        optimizer = getattr(ase.optimize, settings['optimizer'])(
+            target, logfile=None)
+        converged = optimizer.run(fmax=settings['fmax'],
+                                  steps=settings['steps'])
+        final_energy = atoms.get_potential_energy()
+    except (CalculatorError, np.linalg.LinAlgError) as exception:
+        raise PrerelaxError(str(exception)) from exception
+
+    # displacements in the relaxed cell, without the strain of the cell
+    displacements = (atoms.get_scaled_positions(wrap=False)
+                     - initial_positions) @ atoms.cell.array
+
+    relaxed = structure.clone()
+    relaxed.reset_cell(atoms.cell.tolist())
+    relaxed.reset_sites_positions(atoms.positions.tolist())
+    return {
+        'structure': relaxed,
+        'output_parameters': orm.Dict({
+            'initial_energy': float(initial_energy),
+            'final_energy': float(final_energy),
+            'steps': optimizer.nsteps,
+            'converged': bool(converged),
+            'volume_change': float(atoms.get_volume() / initial_volume - 1),
+            'max_displacement': float(
+                np.linalg.norm(displacements, axis=1).max(initial=0.)),
+        }),
+    }
+
+
+def get_prerelax_rejection(output_parameters, parameters=None):
+    """Check whether a pre-relaxed structure can be used.
+
+    Args:
+        output_parameters (dict): the `output_parameters` of
+                                  `prerelax_structure`
+        parameters (dict): the parameters of `prerelax_structure` with the
+                           `max_volume_change` and `max_displacement`
+                           thresholds, see `DEFAULT_PARAMETERS`
+
+    Returns: the reason to reject the structure, or None if it can be used
+    """
+    settings = dict(DEFAULT_PARAMETERS, **(parameters or {}))
+    if not output_parameters['converged']:
+        return 'the optimizer did not converge in ' \
+               f'{output_parameters["steps"]} steps'
+    if abs(output_parameters['volume_change']) > \
+            settings['max_volume_change']:
+        return 'the volume changed by ' \
+               f'{output_parameters["volume_change"]:.1%}'
+    if output_parameters['max_displacement'] > settings['max_displacement']:
+        return 'an atom moved by ' \
+               f'{output_parameters["max_displacement"]:.2f} Angstrom'
+    return None
@@ -0,0 +1,478 @@
+import math
+import statistics
+
+import numpy as np
+from aiida import orm
+
+STAGES = ('relax', 'scf', 'bands', 'dos', 'ph', 'q2r', 'matdyn')
+
+# Seconds x processes per unit of cost, see `ResourceEstimator.get_cost`.
+# These are rough defaults, use `ResourceEstimator.calibrate` to replace
+# them with the walltimes recorded by previous runs on the cluster.
+DEFAULT_CALIBRATION = {
+    'relax': 1e-4,
+    'scf': 1e-5,
+    'bands': 5e-6,
+    'dos': 1e-5,
+    'ph': 5e-5,
+    'q2r': 1e-2,
+    'matdyn': 1e-2,
+}
+
+# stages that are not parallelized over k-points
+SERIAL_STAGES = ('q2r', 'matdyn')
+
+PROCESS_TYPE_STAGES = {
+    'aiida.calculations:quantumespresso.ph': 'ph',
+    'aiida.calculations:quantumespresso.q2r': 'q2r',
+    'aiida.calculations:quantumespresso.matdyn': 'matdyn',
+}
+
+PW_CALCULATION_STAGES = {
+    'scf': 'scf',
+    'relax': 'relax',
+    'vc-relax': 'relax',
+    'bands': 'bands',
+    'nscf': 'dos',
+}
+
+# namespaces of the CalcJob in the builder of its BaseRestartWorkChain
+CALCJOB_NAMESPACES = ('pw', 'ph', 'q2r', 'matdyn')
+
+
+class ResourceEstimator(object):
+    """Estimate the computational resources of every calculation stage
+
+    The cost of a stage is estimated from the number of atoms, electrons,
+    irreducible k-points and q-points, which are read from the k-point and
+    q-point inputs of the builder being configured. The walltime is the
+    cost multiplied by a per-stage calibration coefficient and divided by
+    the number of processes. The number of processes is chosen as the
+    smallest one that finishes the stage within `target_wallclock_seconds`,
+    and the processes are split into k-point pools.
+    """
+    def __init__(self, procs_per_machine=16, max_machines=4,
+                 target_wallclock_seconds=14400,
+                 min_wallclock_seconds=1800, max_wallclock_seconds=86400,
+                 safety_factor=2., kpoints_distance=0.15,
+                 nscf_kpoints_distance=0.1, bands_kpoints=100, nqpoints=8,
+                 calibration=None):
+        """
+        Args:
+            procs_per_machine (int): number of MPI processes per machine
+            max_machines (int): maximum number of machines for one stage
+            target_wallclock_seconds (int): desired walltime of one stage
+            min_wallclock_seconds (int): lower bound of the walltime request
+            max_wallclock_seconds (int): upper bound of the walltime request
+            safety_factor (float): factor applied to the estimated walltime
+            kpoints_distance (float): k-points distance of the SCF, used
+                                      if the builder does not set it
+            nscf_kpoints_distance (float): k-points distance of the nscf
+                                           calculation for the PDOS, used
+                                           if the builder does not set it
+            bands_kpoints (int): number of k-points along the band path,
+                                 used if the builder does not set it
+            nqpoints (int): number of irreducible q-points for ph.x, used
+                            if the builder does not set the q-points
+            calibration (dict): calibration coefficients by stage
+        """
+        self.procs_per_machine = procs_per_machine
+        self.max_machines = max_machines
+        self.target_wallclock_seconds = target_wallclock_seconds
+        self.min_wallclock_seconds = min_wallclock_seconds
+        self.max_wallclock_seconds = max_wallclock_seconds
+        self.safety_factor = safety_factor
+        self.kpoints_distance = kpoints_distance
+        self.nscf_kpoints_distance = nscf_kpoints_distance
+        self.bands_kpoints = bands_kpoints
+        self.nqpoints = nqpoints
+        self.calibration = dict(DEFAULT_CALIBRATION)
+        if calibration:
+            self.calibration.update(calibration)
+
+    def get_number_of_kpoints(self, stage, structure, inputs=None):
+        """Return the number of irreducible k-points of a stage.
+
+        Args:
+            stage (str): one of `STAGES`
+            structure (StructureData): the crystal structure
+            inputs (ProcessBuilderNamespace): the inputs of the workchain
+                running the stage, `kpoints` or `kpoints_distance` of a
+                PwBaseWorkChain, `bands_kpoints` or `bands_kpoints_distance`
+                of a PwBandsWorkChain. The constructor defaults are used for
+                the inputs that are not set.
+        """
+        inputs = inputs or {}
+        if stage == 'bands':
+            if inputs.get('bands_kpoints') is not None:
+                return count_kpoints(structure, inputs['bands_kpoints'])
+            distance = inputs.get('bands_kpoints_distance')
+            if distance is None:
+                return self.bands_kpoints
+            from aiida.tools.data.array.kpoints import \
+                get_explicit_kpoints_path
+            path = get_explicit_kpoints_path(
+                structure, reference_distance=float(distance))
+            return len(path['explicit_kpoints'].get_kpoints())
+        if inputs.get('kpoints') is not None:
+            return count_kpoints(structure, inputs['kpoints'])
+        distance = inputs.get('kpoints_distance')
+        if distance is None:
+            distance = self.nscf_kpoints_distance if stage == 'dos' \
+                else self.kpoints_distance
+        return count_kpoints(structure, distance=float(distance),
+                             force_parity=bool(inputs.get(
+                                 'kpoints_force_parity', False)))
+
+    def get_number_of_qpoints(self, structure, inputs=None):
+        """Return the number of irreducible q-points of ph.x.
+
+        Args:
+            structure (StructureData): the crystal structure
+            inputs (ProcessBuilderNamespace): the inputs of the
+                PhBaseWorkChain, `qpoints` or `qpoints_distance`.
+                `self.nqpoints` is used if they are not set.
+        """
+        inputs = inputs or {}
+        if inputs.get('qpoints') is not None:
+            return count_kpoints(structure, inputs['qpoints'])
+        if inputs.get('qpoints_distance') is not None:
+            return count_kpoints(structure,
+                                 distance=float(inputs['qpoints_distance']),
+                                 force_parity=bool(inputs.get(
+                                     'qpoints_force_parity', False)))
+        return self.nqpoints
+
+    def get_cost(self, stage, natoms, nelectrons, nkpoints, nqpoints=1):
+        """Return the cost of a stage in arbitrary units.
+
+        The cost of a plane-wave calculation scales with the number of
+        k-points, the number of atoms (number of plane waves) and the square
+        of the number of electrons (number of bands). ph.x solves this
+        problem for 3 x natoms perturbations at every q-point.
+        """
+        if stage in SERIAL_STAGES:
+            return natoms ** 2 * nqpoints
+        cost = nkpoints * natoms * nelectrons ** 2
+        if stage == 'ph':
+            cost *= 3 * natoms * nqpoints
+        return cost
+
+    def estimate(self, stage, structure, pseudos=None, nkpoints=None,
+                 nqpoints=None, max_procs=None):
+        """Estimate the resources of a stage.
+
+        Args:
+            stage (str): one of `STAGES`
+            structure (StructureData): the crystal structure
+            pseudos (dict): pseudopotentials by kind name, used to count the
+                            valence electrons
+            nkpoints (int): number of k-points, estimated if not specified
+            nqpoints (int): number of q-points, `self.nqpoints` if not
+                            specified
+            max_procs (int): maximum number of processes for codes that do
+                             not scale further, the walltime is estimated
+                             for the limited number of processes
+
+        Returns: dictionary with `num_machines`, `tot_num_mpiprocs`, `npool`
+                 and `max_wallclock_seconds`
+        """
+        if stage not in STAGES:
+            raise ValueError(f'Unknown stage: {stage}!')
+        if nkpoints is None:
+            nkpoints = self.get_number_of_kpoints(stage, structure)
+        if nqpoints is None:
+            nqpoints = self.nqpoints
+        natoms = len(structure.sites)
+        nelectrons = get_number_of_electrons(structure, pseudos)
+
+        cost = self.get_cost(stage, natoms, nelectrons, nkpoints, nqpoints)
+        cpu_seconds = self.safety_factor * self.calibration[stage] * cost
+
+        limit = self.max_machines * self.procs_per_machine
+        if max_procs is not None:
+            limit = min(limit, max_procs)
+        if stage in SERIAL_STAGES:
+            procs = 1
+        else:
+            procs = math.ceil(cpu_seconds / self.target_wallclock_seconds)
+            procs = min(max(procs, 1), limit)
+        num_machines = math.ceil(procs / self.procs_per_machine)
+        if num_machines > 1:
+            procs = min(num_machines * self.procs_per_machine, limit)
+
+        npool = 1
+        if stage not in SERIAL_STAGES:
+            npool = max(pools for pools in range(1, procs + 1)
+                        if procs % pools == 0 and pools <= nkpoints)
+
+        wallclock = min(max(math.ceil(cpu_seconds / procs),
+                            self.min_wallclock_seconds),
+                        self.max_wallclock_seconds)
+        return {
+            'num_machines': num_machines,
+            'tot_num_mpiprocs': procs,
+            'npool': npool,
+            'max_wallclock_seconds': wallclock,
+        }
+
+    def get_options(self, stage, structure, options=None, **kwargs):
+        """Return the calculation options of a stage.
+
+        The resources and walltime of `options` are replaced by the
+        estimated ones, the other options are kept.
+        """
+        estimate = self.estimate(stage, structure, **kwargs)
+        options = dict(options or {})
+        options['resources'] = {
+            'num_machines': estimate['num_machines'],
+            'tot_num_mpiprocs': estimate['tot_num_mpiprocs'],
+        }
+        options['max_wallclock_seconds'] = estimate['max_wallclock_seconds']
+        options['withmpi'] = estimate['tot_num_mpiprocs'] > 1
+        return options
+
+    def configure(self, namespace, stage, structure, options=None,
+                  pools=True, **kwargs):
+        """Set the options and k-point pools of a calculation namespace.
+
+        The number of k-points (q-points for ph.x) is read from the inputs
+        of the namespace, unless `nkpoints` (`nqpoints`) is given.
+
+        Args:
+            namespace (ProcessBuilderNamespace): the namespace of a
+                BaseRestartWorkChain, e.g. `builder.scf`, or directly of
+                its CalcJob, e.g. `builder.q2r.q2r`
+            stage (str): one of `STAGES`
+            structure (StructureData): the crystal structure
+            options (dict): options that are kept unless estimated
+            pools (bool): set the number of k-point pools on the command line
+        """
+        inputs = None
+        for name in CALCJOB_NAMESPACES:
+            if name in namespace:
+                inputs, namespace = namespace, namespace[name]
+                break
+        if stage not in SERIAL_STAGES and kwargs.get('nkpoints') is None:
+            kwargs['nkpoints'] = self.get_number_of_kpoints(stage, structure,
+                                                            inputs)
+        if stage == 'ph' and kwargs.get('nqpoints') is None:
+            kwargs['nqpoints'] = self.get_number_of_qpoints(structure, inputs)
+        if kwargs.get('pseudos') is None and namespace.get('pseudos'):
+            kwargs['pseudos'] = namespace['pseudos']
+        namespace['metadata']['options'] = self.get_options(
+            stage, structure, options, **kwargs)
+        if pools:
+            self.set_parallelization(namespace, stage, structure, **kwargs)
+
+    def set_parallelization(self, namespace, stage, structure, **kwargs):
+        """Set the k-point pools of a pw.x or ph.x builder namespace."""
+        estimate = self.estimate(stage, structure, **kwargs)
+        settings = {}
+        if 'settings' in namespace and namespace['settings'] is not None:
+            settings = namespace['settings'].get_dict()
+        cmdline = list(settings.get('cmdline', []))
+        if '-nk' in cmdline:
+            del cmdline[cmdline.index('-nk'):cmdline.index('-nk') + 2]
+        if estimate['npool'] > 1:
+            cmdline += ['-nk', str(estimate['npool'])]
+        if cmdline:
+            settings['cmdline'] = cmdline
+        else:
+            settings.pop('cmdline', None)
+        if settings or 'settings' in namespace:
+            namespace['settings'] = orm.Dict(settings)
+
+    def calibrate(self, calcjobs):
+        """Fit the calibration coefficients to finished calculations.
+
+        For every calculation the coefficient is the recorded walltime times
+        the number of processes divided by the cost. The coefficient of a
+        stage is the median over all its calculations.
+
+        Args:
+            calcjobs (list): finished CalcJobNodes of pw.x, ph.x, q2r.x and
+                             matdyn.x
+
+        Returns: the calibration table by stage
+        """
+        samples = {stage: [] for stage in STAGES}
+        for calcjob in calcjobs:
+            sample = _get_calibration_sample(self, calcjob)
+            if sample is not None:
+                stage, coefficient = sample
+                samples[stage].append(coefficient)
+
+        for stage, coefficients in samples.items():
+            if coefficients:
+                self.calibration[stage] = statistics.median(coefficients)
+        return self.calibration
+
+    @classmethod
+    def from_database(cls, limit=1000, **kwargs):
+        """Return an estimator calibrated on the latest finished calculations.
+
+        Args:
+            limit (int): maximum number of calculations
+            kwargs: arguments of the constructor
+
+        Returns: the calibrated ResourceEstimator
+        """
+        process_types = list(PROCESS_TYPE_STAGES)
+        process_types.append('aiida.calculations:quantumespresso.pw')
+        qb = orm.QueryBuilder()
+        qb.append(orm.CalcJobNode, tag='calcjob', project='*', filters={
+            'process_type': {'in': process_types},
+            'attributes.exit_status': 0,
+        })
+        qb.order_by({'calcjob': {'ctime': 'desc'}})
+        qb.limit(limit)
+
+        estimator = cls(**kwargs)
+        estimator.calibrate(qb.all(flat=True))
+        return estimator
+
+
+def count_kpoints(structure, kpoints=None, distance=None,
+                  force_parity=False):
+    """Return the number of irreducible k-points of a mesh or list.
+
+    Args:
+        structure (StructureData): the crystal structure
+        kpoints (KpointsData): an explicit mesh or list of k-points
+        distance (float): the k-points distance of the mesh, if kpoints is
+                          not given
+        force_parity (bool): force an even number of points per direction
+    """
+    if kpoints is None:
+        kpoints = orm.KpointsData()
+        kpoints.set_cell_from_structure(structure)
+        kpoints.set_kpoints_mesh_from_density(distance,
+                                              force_parity=force_parity)
+    try:
+        mesh, offset = kpoints.get_kpoints_mesh()
+    except AttributeError:
+        return len(kpoints.get_kpoints())
+
+    import spglib
+
+    cell = np.array(structure.cell)
+    positions = np.array([site.position for site in structure.sites])
+    kind_names = [site.kind_name for site in structure.sites]
+    numbers = [sorted(set(kind_names)).index(name) for name in kind_names]
+    shift = [int(round(2 * value)) % 2 for value in offset]
+    mapping = spglib.get_ir_reciprocal_mesh(
+        mesh, (cell, positions @ np.linalg.inv(cell), numbers),
+        is_shift=shift)
+    if mapping is None:
+        return math.prod(mesh)
+    return len(np.unique(mapping[0]))
+
+
+def get_number_of_electrons(structure, pseudos=None):
+    """Return the number of valence electrons of a structure.
+
+    The valence charge of the pseudopotentials is used when available,
+    otherwise the atomic number is used as an upper bound.
+    """
+    from ase.data import atomic_numbers
+
+    nelectrons = 0
+    for site in structure.sites:
+        kind = structure.get_kind(site.kind_name)
+        pseudo = (pseudos or {}).get(kind.name)
+        z_valence = getattr(pseudo, 'z_valence', None)
+        if z_valence is None:
+            z_valence = atomic_numbers[kind.symbol]
+        nelectrons += z_valence
+    return nelectrons
+
+
+def _get_calibration_sample(estimator, calcjob):
+    """Return the stage and calibration coefficient of a calculation."""
+    if calcjob.process_type in PROCESS_TYPE_STAGES:
+        stage = PROCESS_TYPE_STAGES[calcjob.process_type]
+    else:
+        parameters = calcjob.inputs.parameters.get_dict()
+        calculation = parameters.get('CONTROL', {}).get('calculation', 'scf')
+        stage = PW_CALCULATION_STAGES.get(calculation)
+    if stage is None or 'output_parameters' not in calcjob.outputs:
+        return None
+
+    output_parameters = calcjob.outputs.output_parameters.get_dict()
+    walltime = output_parameters.get('wall_time_seconds')
+    if not walltime:
+        return None
+
+    structure = _get_structure(calcjob)
+    if structure is None:
+        return None
+    natoms = len(structure.sites)
+    nelectrons = output_parameters.get('number_of_electrons',
+                                       get_number_of_electrons(structure))
+    if stage == 'ph':
+        # ph.x does not report the k-points, take them from the SCF
+        nkpoints = _get_parent_number_of_kpoints(calcjob)
+        nqpoints = _get_number_of_computed_qpoints(calcjob, output_parameters)
+    else:
+        nkpoints = output_parameters.get('number_of_k_points')
+        nqpoints = output_parameters.get('number_of_qpoints')
+    if stage not in SERIAL_STAGES and not nkpoints:
+        return None
+    if not nqpoints:
+        nqpoints = estimator.nqpoints
+
+    resources = calcjob.get_option('resources') or {}
+    procs = resources.get('tot_num_mpiprocs',
+                          resources.get('num_machines', 1) *
+                          resources.get('num_mpiprocs_per_machine', 1))
+    cost = estimator.get_cost(stage, natoms, nelectrons, nkpoints, nqpoints)
+    return stage, walltime * procs / cost
+
+
+def _get_parent_number_of_kpoints(calcjob):
+    """Return the number of k-points of the pw.x parent of a calculation."""
+    node = calcjob
+    for _ in range(10):
+        if 'parent_folder' not in node.inputs:
+            return None
+        node = node.inputs.parent_folder.creator
+        if node is None:
+            return None
+        if node.process_type == 'aiida.calculations:quantumespresso.pw':
+            if 'output_parameters' not in node.outputs:
+                return None
+            return node.outputs.output_parameters.get('number_of_k_points')
+    return None
+
+
+def _get_number_of_computed_qpoints(calcjob, output_parameters):
+    """Return the number of q-points computed by a ph.x calculation.
+
+    A calculation split over q-points only computes `start_q` to `last_q`
+    of the `number_of_qpoints` irreducible q-points.
+    """
+    nqpoints = output_parameters.get('number_of_qpoints')
+    inputph = calcjob.inputs.parameters.get_dict().get('INPUTPH', {})
+    if nqpoints and ('start_q' in inputph or 'last_q' in inputph):
+        start_q = inputph.get('start_q', 1)
+        last_q = min(inputph.get('last_q', nqpoints), nqpoints)
+        return max(last_q - start_q + 1, 1)
+    return nqpoints
+
+
+def _get_structure(calcjob):
+    """Return the structure of a calculation, following parent folders."""
+    node = calcjob
+    for _ in range(10):
+        if 'structure' in node.inputs:
+            return node.inputs.structure
+        if 'parent_folder' in node.inputs:
+            node = node.inputs.parent_folder.creator
+        elif 'force_constants' in node.inputs:
+            node = node.inputs.force_constants.creator
+        else:
+            return None
+        if node is None:
+            return None
+    return None
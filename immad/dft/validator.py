@@ -0,0 +1,151 @@
+from aiida import engine, orm
+from ..abstract.validator import Validator
+from .dft import DFTWorkChain
+
+TERMINATED_STATES = ('finished', 'excepted', 'killed')
+
+
+class DFTValidator(Validator):
+    """Validator running DFTWorkChain on the AiiDA daemon.
+
+    `submit` returns the pk of the DFTWorkChain without waiting for it, the
+    status and the results of many validations are obtained with a single
+    QueryBuilder query instead of loading every node.
+    """
+
+    def __init__(self, pw_code, dos_code=None, projwfc_code=None,
+                 ph_code=None, q2r_code=None, matdyn_code=None,
+                 protocol=None, overrides=None, options=None,
+                 resource_estimator=None, group=None, want_relax=False,
+                 want_bands=False, want_dos=False, want_phonon=False):
+        """Initialize the validator.
+
+        Args:
+            pw_code, dos_code, projwfc_code, ph_code, q2r_code, matdyn_code
+                (AbstractCode): the codes of the DFTWorkChain
+            protocol (str): the protocol of the DFTWorkChain
+            overrides (dict): the protocol overrides
+            options (dict): the calculation options
+            resource_estimator (ResourceEstimator): estimate the resources of
+                                                    every stage
+            group (Group): if specified, the submitted DFTWorkChains are
+                           added to the group
+            want_relax, want_bands, want_dos, want_phonon (bool): the
+                calculations enabled after SCF
+        """
+        super().__init__()
+        self.codes = (pw_code, dos_code, projwfc_code, ph_code, q2r_code,
+                      matdyn_code)
+        self.protocol = protocol
+        self.overrides = overrides or {}
+        self.options = options
+        self.resource_estimator = resource_estimator
+        self.group = group
+        self.wants = {
+            'want_relax': want_relax,
+            'want_bands': want_bands,
+            'want_dos': want_dos,
+            'want_phonon': want_phonon,
+        }
+
+    def get_builder(self, sample):
+        """Construct the DFTWorkChain builder of a sample.
+
+        Args:
+            sample (StructureData, Structure or Atoms): the structure
+
+        Returns: the builder for running DFTWorkChain
+        """
+        from ase import Atoms
+        from pymatgen.core import Structure
+
+        if isinstance(sample, Structure):
+            sample = orm.StructureData(pymatgen=sample)
+        elif isinstance(sample, Atoms):
+            sample = orm.StructureData(ase=sample)
+        elif not isinstance(sample, orm.StructureData):
+            raise TypeError('Datatype not supported.')
+        return DFTWorkChain.get_builder_from_protocol(
+            *self.codes, sample, overrides=self.overrides,
+            options=self.options, protocol=self.protocol,
+            resource_estimator=self.resource_estimator, **self.wants)
+
+    def run(self, sample):
+        """Run the DFTWorkChain of a sample and wait for its results."""
+        _, node = engine.run_get_node(self.get_builder(sample))
+        return self.results([node.pk])[0]
+
+    def submit(self, sample):
+        """Submit the DFTWorkChain of a sample to the daemon.
+
+        Returns: the pk of the DFTWorkChain
+        """
+        node = engine.submit(self.get_builder(sample))
+        if self.group is not None:
+            self.group.add_nodes(node)
+        return node.pk
+
+    def get_status(self, handles):
+        """Return the process state and exit status of many DFTWorkChains.
+
+        Args:
+            handles (list): the pks returned by `submit`
+
+        Returns: dictionary of (process_state, exit_status) by pk, without
+                 the pks that are not stored
+        """
+        if not handles:
+            return {}
+        qb = orm.QueryBuilder()
+        qb.append(orm.WorkChainNode,
+                  filters={'id': {'in': list(handles)}},
+                  project=['id', 'attributes.process_state',
+                           'attributes.exit_status'])
+        return {pk: (state, exit_status)
+                for pk, state, exit_status in qb.iterall()}
+
+    def poll(self, handles):
+        """Return whether every DFTWorkChain is terminated.
+
+        A pk that is not stored (e.g. a deleted node) counts as terminated,
+        its result is None, so that a Pipeline does not wait for it forever.
+        """
+        status = self.get_status(handles)
+        return [pk not in status or status[pk][0] in TERMINATED_STATES
+                for pk in handles]
+
+    def results(self, handles):
+        """Return the results of many DFTWorkChains with two queries.
+
+        Args:
+            handles (list): the pks returned by `submit`
+
+        Returns: list of dictionaries with the pk, process state, exit
+                 status and SCF output parameters (None if not available)
+                 of every DFTWorkChain, in the order of `handles` (None for
+                 unknown pks)
+        """
+        status = self.get_status(handles)
+        scf_parameters = {}
+        if status:
+            qb = orm.QueryBuilder()
+            qb.append(orm.WorkChainNode, tag='workchain',
+                      filters={'id': {'in': list(status)}}, project=['id'])
+            qb.append(orm.Dict, with_incoming='workchain',
+                      edge_filters={'label': 'scf_parameters'},
+                      project=['attributes'])
+            scf_parameters = dict(qb.all())
+
+        results = []
+        for pk in handles:
+            if pk not in status:
+                results.append(None)
+                continue
+            state, exit_status = status[pk]
+            results.append({
+                'pk': pk,
+                'process_state': state,
+                'exit_status': exit_status,
+                'scf_parameters': scf_parameters.get(pk),
+            })
+        return results
@@ -0,0 +1,15 @@
+import pytest
+
+pytest_plugins = ['aiida.tools.pytest_fixtures']
+
+
+@pytest.fixture
+def rutile():
+    """Return the rutile TiO2 cell as a pymatgen Structure."""
+    pymatgen = pytest.importorskip('pymatgen.core')
+    u = 0.305
+    return pymatgen.Structure(
+        pymatgen.Lattice.tetragonal(4.594, 2.959),
+        ['Ti', 'Ti', 'O', 'O', 'O', 'O'],
+        [[0, 0, 0], [.5, .5, .5], [u, u, 0], [-u, -u, 0],
+         [.5 + u, .5 - u, .5], [.5 - u, .5 + u, .5]])
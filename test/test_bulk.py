@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+
+from aiida import orm
+from aiida.common import LinkType
+
+from immad.dft.bulk import (export_bulk, get_band_gap, load_arrays,
+                            load_index, query_outputs)
+
+
+def store_workchain(energy=None, fermi_energy=None, bands=None, dos=None):
+    """Store a DFTWorkChain node returning the given outputs."""
+    workchain = orm.WorkChainNode().store()
+    outputs = {}
+    if energy is not None:
+        outputs['scf_parameters'] = orm.Dict({'energy': energy,
+                                              'fermi_energy': fermi_energy})
+    if bands is not None:
+        kpoints = np.linspace(0., 0.5, len(bands))[:, None] * [1., 0., 0.]
+        band_structure = orm.BandsData()
+        band_structure.set_kpoints(kpoints)
+        band_structure.set_bands(bands, units='eV')
+        outputs['bands__band_structure'] = band_structure
+    if dos is not None:
+        output_dos = orm.XyData()
+        output_dos.set_x(dos[0], 'Energy', 'eV')
+        output_dos.set_y(list(dos[1:]), ['dos', 'integrated_dos'],
+                         ['states/eV', 'states'])
+        outputs['dos__dos__output_dos'] = output_dos
+    for label, output in outputs.items():
+        output.store()
+        output.base.links.add_incoming(workchain, LinkType.RETURN, label)
+    workchain.seal()
+    return workchain
+
+
+@pytest.mark.parametrize('bands, fermi_energy, band_gap', [
+    ([[-2., 1.], [-1., 2.]], 0., 2.),
+    ([[-2., -0.5], [-1., 2.]], 0., 0.),
+    ([[[-2., 1.], [-1., 2.]], [[-1.5, 0.5], [-1.2, 3.]]], 0., 1.5),
+    ([[-2., -1.], [-1., -0.5]], 0., np.nan),
+])
+def test_get_band_gap(bands, fermi_energy, band_gap):
+    np.testing.assert_equal(get_band_gap(np.array(bands), fermi_energy),
+                            band_gap)
+
+
+def test_export_bulk(aiida_profile, tmp_path):
+    rng = np.random.default_rng(0)
+    energy = np.linspace(-5., 5., 11)
+    insulator = store_workchain(
+        -10., 0.5, bands=np.array([[-1., 2.], [0., 3.], [-0.5, 2.5]]),
+        dos=(energy, rng.random(11), rng.random(11)))
+    metal = store_workchain(-20., 1., bands=rng.random((4, 3)) * 2.)
+    empty = store_workchain()
+    group = orm.Group(label='bulk').store()
+    group.add_nodes([insulator, metal, empty])
+
+    assert set(query_outputs(group)) == {insulator.pk, metal.pk, empty.pk}
+    assert query_outputs([]) == {}
+    index = export_bulk(group, tmp_path, shard_size=2)
+
+    for name, values in load_index(tmp_path).items():
+        np.testing.assert_array_equal(values, index[name])
+    np.testing.assert_array_equal(index['pk'],
+                                  sorted([insulator.pk, metal.pk, empty.pk]))
+    rows = {uuid: row for row, uuid in enumerate(index['uuid'])}
+    np.testing.assert_equal(
+        [index['band_gap'][rows[node.uuid]]
+         for node in (insulator, metal, empty)], [2., 0., np.nan])
+    np.testing.assert_equal(
+        [index['energy'][rows[node.uuid]]
+         for node in (insulator, metal, empty)], [-10., -20., np.nan])
+    assert sorted(index['shard'].tolist()) == [0, 0, 1]
+
+    arrays = load_arrays(tmp_path, insulator.uuid)
+    assert arrays['bands'].dtype == np.float32
+    np.testing.assert_allclose(
+        arrays['bands'], insulator.outputs.bands.band_structure.get_bands())
+    np.testing.assert_allclose(arrays['dos_energy'], energy)
+    np.testing.assert_allclose(
+        arrays['dos'],
+        [y for _, y, _ in insulator.outputs.dos.dos.output_dos.get_y()],
+        rtol=1e-6)
+    assert arrays['dos_names'].tolist() == ['dos', 'integrated_dos']
+    assert 'dos' not in load_arrays(tmp_path, metal.uuid)
+    assert load_arrays(tmp_path, empty.uuid) == {}
+    with pytest.raises(KeyError):
+        load_arrays(tmp_path, 'unknown')
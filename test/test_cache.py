@@ -0,0 +1,77 @@
+import pytest
+
+pytest.importorskip('spglib')
+pymatgen = pytest.importorskip('pymatgen.core')
+
+from types import SimpleNamespace
+
+from aiida import orm
+
+from immad.dft.cache import (CACHE_HIT_EXTRA, FINGERPRINT_EXTRA,
+                             PROTOCOL_EXTRA, get_structure_fingerprint,
+                             setup_cache, structures_match)
+
+
+def get_rutile(u=0.305):
+    return pymatgen.Structure(
+        pymatgen.Lattice.tetragonal(4.594, 2.959),
+        ['Ti', 'Ti', 'O', 'O', 'O', 'O'],
+        [[0, 0, 0], [.5, .5, .5], [u, u, 0], [-u, -u, 0],
+         [.5 + u, .5 - u, .5], [.5 - u, .5 + u, .5]])
+
+
+@pytest.mark.parametrize('element, substitute', [('Ti', 'V'), ('O', 'F')])
+def test_equivalent_substitutions_collide(element, substitute):
+    supercell = get_rutile() * (2, 2, 2)
+    structures = []
+    for index, site in enumerate(supercell):
+        if site.species_string == element:
+            structure = supercell.copy()
+            structure.replace(index, substitute)
+            structures.append(structure)
+
+    fingerprints = {get_structure_fingerprint(structure)
+                    for structure in structures}
+    assert len(fingerprints) == 1
+    assert all(structures_match(structures[0], structure)
+               for structure in structures[1:])
+
+
+def test_origin_shift():
+    rutile = get_rutile()
+    shifted = rutile.copy()
+    shifted.translate_sites(range(len(shifted)), [.5, .5, .5])
+    assert get_structure_fingerprint(rutile) == \
+        get_structure_fingerprint(shifted)
+    assert structures_match(rutile, shifted)
+
+
+def test_magnetic_moments():
+    parallel, antiparallel = get_rutile(), get_rutile()
+    parallel.add_site_property('magmom', [1, 1, 0, 0, 0, 0])
+    antiparallel.add_site_property('magmom', [1, -1, 0, 0, 0, 0])
+    assert not structures_match(parallel, antiparallel)
+
+
+def test_volume():
+    rutile = get_rutile()
+    expanded = rutile.copy()
+    expanded.scale_lattice(rutile.volume * 1.05)
+    assert get_structure_fingerprint(rutile) == \
+        get_structure_fingerprint(expanded)
+    assert not structures_match(rutile, expanded)
+
+
+def test_fingerprint_extras_without_cache(aiida_profile):
+    structure = orm.StructureData(pymatgen=get_rutile())
+    reports = []
+    inputs = SimpleNamespace(structure=structure, use_cache=orm.Bool(False))
+    process = SimpleNamespace(inputs=inputs, node=orm.WorkChainNode(),
+                              report=reports.append)
+    assert setup_cache(process) is None
+
+    extras = process.node.base.extras.all
+    assert extras[FINGERPRINT_EXTRA] == get_structure_fingerprint(structure)
+    assert PROTOCOL_EXTRA in extras
+    assert CACHE_HIT_EXTRA not in extras
+    assert not reports
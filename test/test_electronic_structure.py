@@ -0,0 +1,271 @@
+import base64
+import sqlite3
+import tempfile
+
+import numpy as np
+import pytest
+
+from aiida import orm
+from aiida.common import AttributeDict
+from aiida.tools.data.orbital.realhydrogen import RealhydrogenOrbital
+
+from immad.dft.electronic_structure import (DEFAULT_CACHE_FILE, ExportCache,
+                                            _group_projections, _reduce_curves,
+                                            _thin_indices, decode_npz,
+                                            downsample_curves, encode_arrays,
+                                            export_bands_arrays,
+                                            export_pdos_arrays,
+                                            export_pdos_data)
+
+
+@pytest.fixture
+def projections(aiida_profile):
+    """Return the PDOS of the s and p orbitals of two Si and one O atoms."""
+    rng = np.random.default_rng(0)
+    energy = np.linspace(-10., 10., 50)
+    orbitals = []
+    for kind_name, position in (('Si', [0., 0., 0.]),
+                                ('Si', [1.3575, 1.3575, 1.3575]),
+                                ('O', [0.123456, 0.5, 0.5])):
+        for angular_momentum, magnetic_number in ((0, 0), (1, 0), (1, 1),
+                                                  (1, 2)):
+            orbitals.append(RealhydrogenOrbital(
+                position=position, angular_momentum=angular_momentum,
+                magnetic_number=magnetic_number, radial_nodes=0,
+                kind_name=kind_name))
+    projection_data = orm.ProjectionData()
+    projection_data.set_projectiondata(
+        orbitals,
+        list_of_projections=[rng.random((4, 6)) for _ in orbitals],
+        list_of_energy=[energy for _ in orbitals],
+        list_of_pdos=[rng.random(len(energy)) for _ in orbitals],
+        bands_check=False)
+    return projection_data
+
+
+@pytest.fixture
+def dos_outputs(projections):
+    """Return the outputs of a DFTWorkChain with a spin-unpolarized PDOS."""
+    energy = projections.get_pdos()[0][2]
+    output_dos = orm.XyData()
+    output_dos.set_x(energy, 'Energy', 'eV')
+    output_dos.set_y([np.cos(energy) ** 2], ['dos'], ['states/eV'])
+    return AttributeDict({'dos': AttributeDict({
+        'dos': AttributeDict({'output_dos': output_dos}),
+        'projwfc': AttributeDict({'projections': projections}),
+    })})
+
+
+def get_bands_outputs(bands):
+    """Return the outputs of a DFTWorkChain with a band structure along
+    G-X|U-G in a cubic cell of 2 pi Angstrom."""
+    band_structure = orm.BandsData()
+    band_structure.set_cell(np.eye(3) * 2 * np.pi)
+    band_structure.set_kpoints(
+        [[0., 0., 0.], [.25, 0., 0.], [.5, 0., 0.], [.5, .5, 0.],
+         [.25, .25, 0.], [0., 0., 0.]],
+        labels=[(0, 'G'), (2, 'X'), (3, 'U'), (5, 'G')])
+    band_structure.set_bands(bands, units='eV')
+    return AttributeDict({'bands': AttributeDict({
+        'band_structure': band_structure})})
+
+
+def assert_payload_equal(payload, expected):
+    """Compare two payloads with arrays, including their dtypes."""
+    if isinstance(expected, np.ndarray):
+        assert payload.dtype == expected.dtype
+        np.testing.assert_array_equal(payload, expected)
+    elif isinstance(expected, dict):
+        assert list(payload) == list(expected)
+        for key, value in expected.items():
+            assert_payload_equal(payload[key], value)
+    elif isinstance(expected, (list, tuple)):
+        assert len(payload) == len(expected)
+        for item, value in zip(payload, expected):
+            assert_payload_equal(item, value)
+    else:
+        assert payload == expected
+
+
+def group_projections_loop(projections, group_dos_by):
+    """Sum the PDOS orbital by orbital, as before the grouped sum."""
+    _pdos = {}
+    for orbital, pdos, energy in projections.get_pdos():
+        orbital_data = orbital.get_orbital_dict()
+        kind_name = orbital_data['kind_name']
+        atom_position = [round(i, 2) for i in orbital_data['position']]
+        orbital_name = orbital.get_name_from_quantum_numbers(
+            orbital_data['angular_momentum'],
+            orbital_data['magnetic_number']).lower()
+        if group_dos_by == 'atom':
+            dos_group_name = atom_position
+        elif group_dos_by == 'angular':
+            dos_group_name = orbital_name[0]
+        else:
+            dos_group_name = orbital_name
+        key = f'{kind_name}-{dos_group_name}'
+        if key in _pdos:
+            _pdos[key][1] = _pdos[key][1] + pdos
+        else:
+            _pdos[key] = [energy, pdos.copy()]
+    return _pdos
+
+
+@pytest.mark.parametrize('group_dos_by',
+                         ['atom', 'angular', 'angular_and_magnetic'])
+def test_group_projections(projections, group_dos_by):
+    expected = group_projections_loop(projections, group_dos_by)
+    grouped = _group_projections(projections, group_dos_by)
+    assert list(grouped) == list(expected)
+    for key, (energy, pdos) in grouped.items():
+        np.testing.assert_array_equal(energy, expected[key][0])
+        np.testing.assert_array_equal(pdos, expected[key][1])
+
+
+def test_group_projections_invalid(projections):
+    with pytest.raises(Exception, match='Unknow dos type'):
+        _group_projections(projections, 'kind')
+
+
+def test_export_pdos_arrays(dos_outputs):
+    payload = export_pdos_arrays(dos_outputs, 1.5, 'angular')
+    curves = export_pdos_data(dos_outputs, 1.5, 'angular')['dos']
+    assert len(payload['curves']) == len(curves)
+    for curve, expected in zip(payload['curves'], curves):
+        assert curve['label'] == expected['label']
+        assert curve['borderColor'] == expected['borderColor']
+        np.testing.assert_allclose(payload['energies'][curve['axis']],
+                                   expected['x'], rtol=1e-6)
+        np.testing.assert_allclose(
+            payload['values'][curve['axis']][curve['row']], expected['y'],
+            rtol=1e-6)
+
+
+def test_encode_npz(dos_outputs):
+    payload = export_pdos_arrays(dos_outputs, 1.5)
+    encoded = encode_arrays(payload, 'npz')
+    assert isinstance(encoded, bytes)
+    assert_payload_equal(decode_npz(encoded), payload)
+    assert encode_arrays(payload, 'arrays') is payload
+    assert encode_arrays(None, 'npz') is None
+
+
+def test_encode_base64(dos_outputs):
+    payload = export_pdos_arrays(dos_outputs, 1.5)
+    encoded = encode_arrays(payload, 'base64')
+    arrays = {
+        name: np.frombuffer(base64.b64decode(array['data']),
+                            dtype=array['dtype']).reshape(array['shape'])
+        for name, array in encoded['arrays'].items()
+    }
+    metadata = encoded['metadata']
+    assert metadata['curves'] == payload['curves']
+    for key in ('energies', 'values'):
+        assert_payload_equal(
+            [arrays[reference['__array__']] for reference in metadata[key]],
+            payload[key])
+
+
+def test_encode_unknown_format(dos_outputs):
+    with pytest.raises(ValueError):
+        encode_arrays(export_pdos_arrays(dos_outputs, 1.5), 'json')
+
+
+@pytest.mark.parametrize('n, max_points', [(1001, 100), (1000, 101),
+                                           (257, 8)])
+def test_downsample_curves(n, max_points):
+    rng = np.random.default_rng(0)
+    x = np.linspace(-5., 5., n)
+    values = rng.random((3, n))
+    # narrow peaks that a uniform subsampling would miss
+    values[0, 123] = 10.
+    values[1, 200] = -10.
+    reduced_x, reduced = downsample_curves(x, values, max_points)
+
+    assert len(reduced_x) <= max_points
+    assert reduced.shape == (3, len(reduced_x))
+    assert np.all(np.diff(reduced_x) >= 0)
+    assert reduced_x[0] == x[0] and reduced_x[-1] == x[-1]
+    np.testing.assert_array_equal(reduced.max(axis=1), values.max(axis=1))
+    np.testing.assert_array_equal(reduced.min(axis=1), values.min(axis=1))
+    # the peaks move by at most one bucket width
+    width = (x[-1] - x[0]) / (max_points // 2)
+    assert abs(reduced_x[reduced[0].argmax()] - x[123]) <= width
+    assert abs(reduced_x[reduced[1].argmin()] - x[200]) <= width
+
+
+def test_downsample_short_curves():
+    x = np.arange(10.)
+    values = np.arange(20.).reshape(2, 10)
+    reduced_x, reduced = downsample_curves(x, values, 10)
+    assert reduced_x is x and reduced is values
+
+
+def test_reduce_curves_window():
+    x = np.linspace(-10., 10., 201)
+    values = np.vstack([x, -x])
+    reduced_x, reduced = _reduce_curves(x, values, fermi_energy=2.,
+                                        energy_window=(-1., 1.))
+    np.testing.assert_allclose(reduced_x, np.linspace(1., 3., 21))
+    np.testing.assert_array_equal(reduced, [reduced_x, -reduced_x])
+
+
+def test_thin_indices():
+    indices = _thin_indices(100, [17, 42], 10)
+    assert {0, 17, 42, 99} <= set(indices.tolist())
+    assert len(indices) <= 12
+    assert np.all(np.diff(indices) > 0)
+    np.testing.assert_array_equal(_thin_indices(5, [2], 10), np.arange(5))
+
+
+def test_export_cache(tmp_path):
+    with ExportCache(tmp_path / 'exports.sqlite') as cache:
+        assert cache.get_or_compute(b'key', lambda: {'x': 1}) == {'x': 1}
+        assert cache.get_or_compute(b'key', lambda: None) == {'x': 1}
+        statistics = cache.get_statistics()
+    assert (statistics['hits'], statistics['misses']) == (1, 1)
+    assert not statistics['bypassed']
+    assert DEFAULT_CACHE_FILE.startswith(tempfile.gettempdir())
+
+
+def test_export_cache_locked(tmp_path):
+    filename = tmp_path / 'exports.sqlite'
+    ExportCache(filename).close()
+    lock = sqlite3.connect(filename)
+    lock.execute('BEGIN EXCLUSIVE')
+    try:
+        with ExportCache(filename, timeout=0.01) as cache:
+            assert cache.bypassed
+            assert cache.get_or_compute(b'key', lambda: 1) == 1
+            assert cache.get_or_compute(b'key', lambda: 2) == 2
+            assert cache.get_statistics()['misses'] == 2
+    finally:
+        lock.rollback()
+        lock.close()
+
+
+def test_export_bands_arrays(aiida_profile):
+    bands = np.arange(12.).reshape(6, 2)
+    payload = export_bands_arrays(get_bands_outputs(bands), fermi_energy=1.)
+    # |G-X| = 0.5, X|U is a discontinuity and |U-G| = 0.5 * sqrt(2)
+    x = [0., .25, .5, .5, .5 + .25 * np.sqrt(2), .5 + .5 * np.sqrt(2)]
+    np.testing.assert_allclose(payload['x'], x, rtol=1e-6)
+    np.testing.assert_array_equal(payload['bands'], bands)
+    np.testing.assert_array_equal(payload['band_type'], [0, 0])
+    np.testing.assert_allclose([x for x, _ in payload['labels']],
+                               [x[0], x[2], x[3], x[5]], rtol=1e-6)
+    assert [label for _, label in payload['labels']] == ['G', 'X', 'U', 'G']
+    assert payload['fermi_level'] == 1.
+
+    thinned = export_bands_arrays(get_bands_outputs(bands), max_kpoints=4)
+    assert len(thinned['x']) < len(x)
+    assert set(thinned['x'].tolist()) >= {np.float32(x[i])
+                                           for i in (0, 2, 3, 5)}
+
+
+def test_export_bands_arrays_spin(aiida_profile):
+    bands = np.arange(24.).reshape(2, 6, 2)
+    payload = export_bands_arrays(get_bands_outputs(bands))
+    np.testing.assert_array_equal(payload['bands'],
+                                  np.concatenate(bands, axis=1))
+    np.testing.assert_array_equal(payload['band_type'], [0, 0, 1, 1])
@@ -0,0 +1,68 @@
+import itertools
+
+import numpy as np
+import pytest
+
+pytest.importorskip('pymatgen.core')
+pytest.importorskip('ase')
+
+from pymatgen.analysis.structure_matcher import StructureMatcher
+
+from immad.abstract.materials import Materials
+
+
+def enumerate_orbits(materials, n_substitutions, n_candidates):
+    """Enumerate every configuration and group it by symmetry orbit."""
+    permutations = materials.get_symmetry_permutations()
+    n_sites = permutations.shape[1]
+    orbits = set()
+    for sites in itertools.combinations(range(n_sites), n_substitutions):
+        for species in itertools.product(range(1, n_candidates + 1),
+                                         repeat=n_substitutions):
+            configuration = np.zeros(n_sites, dtype=np.uint8)
+            configuration[list(sites)] = species
+            orbits.add(min(tuple(configuration[permutation])
+                           for permutation in permutations))
+    return orbits
+
+
+@pytest.mark.parametrize('n_substitutions', [1, 2, 3])
+def test_configurations_match_brute_force(rutile, n_substitutions):
+    materials = Materials(rutile, ['V', 'Nb'])
+    configurations = [tuple(configuration) for configuration
+                      in materials.iter_configurations(
+                          n_substitutions=n_substitutions)]
+    assert len(configurations) == len(set(configurations))
+    assert set(configurations) == enumerate_orbits(materials,
+                                                   n_substitutions, 2)
+
+
+def test_small_batches(rutile, monkeypatch):
+    materials = Materials(rutile * (1, 1, 2), ['V'])
+    expected = [tuple(configuration) for configuration
+                in materials.iter_configurations(n_substitutions=2)]
+    monkeypatch.setattr('immad.abstract.materials.MAX_BATCH_ELEMENTS', 1)
+    assert [tuple(configuration) for configuration
+            in materials.iter_configurations(n_substitutions=2)] == expected
+
+
+def test_substitutions_are_distinct(rutile):
+    materials = Materials(rutile, ['V'])
+    orbits = materials.get_site_orbits()
+    oxygen = [i for i, orbit in enumerate(orbits)
+              if materials.structure[int(orbit[0])].species_string == 'O']
+    structures = list(materials.iter_substitutions(orbits=oxygen,
+                                                   n_substitutions=2))
+
+    # every O pair of the cell, grouped by StructureMatcher
+    pairs = []
+    for sites in itertools.combinations(range(2, 6), 2):
+        structure = materials.structure.copy()
+        for site in sites:
+            structure.replace(site, 'V')
+        pairs.append(structure)
+    groups = StructureMatcher().group_structures(pairs)
+
+    assert len(structures) == len(groups)
+    assert all(len(group) == 1 for group
+               in StructureMatcher().group_structures(structures))
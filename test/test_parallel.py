@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from immad.abstract.parallel import ParallelPredictor
+from immad.abstract.predictor import Predictor, SiteWeightPredictor
+
+
+class CompositionPredictor(Predictor):
+    """Score a pymatgen Structure by its fraction of an element."""
+
+    def __init__(self, element):
+        super().__init__()
+        self.element = element
+
+    def evaluate(self, proposed_sample):
+        return proposed_sample.composition.get_atomic_fraction(self.element)
+
+
+@pytest.fixture
+def predictor():
+    rng = np.random.default_rng(0)
+    return SiteWeightPredictor(rng.normal(size=(12, 3)))
+
+
+@pytest.fixture
+def configurations():
+    rng = np.random.default_rng(1)
+    return rng.integers(0, 3, size=(50, 12), dtype=np.uint8)
+
+
+def test_evaluate_batch(predictor, configurations):
+    with ParallelPredictor(predictor, n_workers=2, chunk_size=7,
+                           prefetch=1) as parallel:
+        scores = parallel.evaluate_batch(configurations)
+        # a generator is consumed lazily, by chunks
+        streamed = parallel.evaluate_batch(
+            configuration for configuration in configurations)
+        empty = parallel.evaluate_batch(np.zeros((0, 12), dtype=np.uint8))
+    expected = predictor.evaluate_batch(configurations)
+    np.testing.assert_allclose(scores, expected)
+    np.testing.assert_allclose(streamed, expected)
+    assert len(empty) == 0
+    np.testing.assert_array_equal(parallel.verify_batch(scores),
+                                  predictor.verify_batch(expected))
+
+
+def test_evaluate_batch_structures(rutile, configurations):
+    structure = rutile * (1, 1, 2)
+    predictor = CompositionPredictor('V')
+    with ParallelPredictor(predictor, structure, ['V', 'Nb'], n_workers=2,
+                           chunk_size=8) as parallel:
+        scores = parallel.evaluate_batch(configurations)
+        assert parallel.evaluate(configurations[0]) == scores[0]
+    expected = np.count_nonzero(configurations == 1, axis=1) / len(structure)
+    np.testing.assert_allclose(scores, expected)
+
+
+def test_species_required(predictor, rutile):
+    with pytest.raises(ValueError):
+        ParallelPredictor(predictor, rutile)
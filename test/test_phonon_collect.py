@@ -0,0 +1,35 @@
+import os
+
+import pytest
+
+pytest.importorskip('aiida_quantumespresso')
+
+from aiida import engine, orm
+from aiida.plugins import CalculationFactory
+
+from immad.dft.phonon import (DYNAMICAL_MATRIX_FOLDER,
+                              get_dynamical_matrices_transfer)
+
+
+def test_collect_dynamical_matrices(aiida_localhost, tmp_path):
+    folders = []
+    for chunk, qpoints in enumerate([(1, 2), (3,), (4, 5)]):
+        directory = tmp_path / f'ph_{chunk}' / DYNAMICAL_MATRIX_FOLDER
+        directory.mkdir(parents=True)
+        (directory / 'dynamical-matrix-0').write_text('mesh')
+        for qpoint in qpoints:
+            (directory / f'dynamical-matrix-{qpoint}').write_text(str(qpoint))
+        folders.append(orm.RemoteData(remote_path=str(directory.parent),
+                                      computer=aiida_localhost).store())
+
+    inputs = get_dynamical_matrices_transfer(folders)
+    results, node = engine.run_get_node(
+        CalculationFactory('core.transfer'), **inputs)
+    assert node.is_finished_ok
+
+    collected = os.path.join(results['remote_folder'].get_remote_path(),
+                             DYNAMICAL_MATRIX_FOLDER)
+    assert sorted(os.listdir(collected)) == [
+        f'dynamical-matrix-{index}' for index in range(6)]
+    with open(os.path.join(collected, 'dynamical-matrix-4')) as handle:
+        assert handle.read() == '4'
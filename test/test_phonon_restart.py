@@ -0,0 +1,78 @@
+import pytest
+
+pytest.importorskip('aiida_quantumespresso')
+
+from aiida import orm
+from aiida.common import AttributeDict, LinkType
+
+from immad.dft.phonon import (PH_PROCESS_TYPE, get_ph_restart_calculation,
+                              get_ph_restart_inputs)
+
+
+def store_ph_calculation(caller, computer, qpoints, inputph=None):
+    """Store a ph.x calculation called by a PhBaseWorkChain of `caller`."""
+    base = orm.WorkChainNode()
+    base.base.links.add_incoming(caller, LinkType.CALL_WORK, 'ph')
+    base.store()
+
+    calculation = orm.CalcJobNode(computer=computer,
+                                  process_type=PH_PROCESS_TYPE)
+    calculation.base.links.add_incoming(base, LinkType.CALL_CALC,
+                                        'iteration_01')
+    parameters = orm.Dict({'INPUTPH': dict(inputph or {})}).store()
+    calculation.base.links.add_incoming(parameters, LinkType.INPUT_CALC,
+                                        'parameters')
+    calculation.base.links.add_incoming(qpoints, LinkType.INPUT_CALC,
+                                        'qpoints')
+    calculation.store()
+    remote_folder = orm.RemoteData(remote_path='/tmp/ph', computer=computer)
+    remote_folder.base.links.add_incoming(calculation, LinkType.CREATE,
+                                          'remote_folder')
+    remote_folder.store()
+    calculation.seal()
+    return calculation
+
+
+@pytest.fixture
+def qpoints():
+    qpoints = orm.KpointsData()
+    qpoints.set_kpoints_mesh([2, 2, 2])
+    return qpoints.store()
+
+
+def test_restart_inputs(aiida_localhost, qpoints):
+    phonon = orm.WorkChainNode().store()
+    calculation = store_ph_calculation(phonon, aiida_localhost, qpoints)
+    phonon.set_exit_status(402)
+    phonon.seal()
+
+    assert get_ph_restart_calculation(phonon).pk == calculation.pk
+    restart_folder = calculation.outputs.remote_folder
+    inputs = AttributeDict({
+        'ph': AttributeDict({'parameters': orm.Dict({'INPUTPH': {}})}),
+        'qpoints_distance': orm.Float(0.3),
+        'qpoints_force_parity': orm.Bool(False),
+    })
+    inputs = get_ph_restart_inputs(inputs, restart_folder)
+    assert inputs.ph.parent_folder.pk == restart_folder.pk
+    assert inputs.qpoints.pk == qpoints.pk
+    assert 'qpoints_distance' not in inputs
+    assert 'qpoints_force_parity' not in inputs
+
+
+def test_no_restart_from_chunks(aiida_localhost, qpoints):
+    phonon = orm.WorkChainNode().store()
+    store_ph_calculation(phonon, aiida_localhost, qpoints,
+                         {'only_init': True})
+    store_ph_calculation(phonon, aiida_localhost, qpoints,
+                         {'start_q': 1, 'last_q': 2})
+    phonon.set_exit_status(402)
+    phonon.seal()
+
+    assert get_ph_restart_calculation(phonon) is None
+
+
+def test_no_restart_without_calculation(aiida_profile):
+    phonon = orm.WorkChainNode().store()
+    phonon.seal()
+    assert get_ph_restart_calculation(phonon) is None
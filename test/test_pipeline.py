@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('pymatgen.core')
+
+from immad.abstract.materials import Materials
+from immad.abstract.pipeline import Pipeline
+from immad.abstract.predictor import SiteWeightPredictor
+from immad.abstract.synthetic import SyntheticValidator
+
+
+class RecordingValidator(SyntheticValidator):
+    """Record the largest number of running validations."""
+
+    def __init__(self, fail_after=None, **kwargs):
+        super().__init__(**kwargs)
+        self.fail_after = fail_after
+        self.submitted = 0
+        self.max_pending = 0
+
+    def submit(self, sample):
+        if self.submitted == self.fail_after:
+            raise RuntimeError('submission failed')
+        self.submitted += 1
+        handle = super().submit(sample)
+        self.max_pending = max(self.max_pending, len(self.pending))
+        return handle
+
+
+@pytest.fixture
+def materials(rutile):
+    return Materials(rutile * (1, 1, 2), ['V', 'Nb'])
+
+
+def get_pipeline(materials, validator, threshold=0., **kwargs):
+    predictor = SiteWeightPredictor(np.zeros((12, 3)), threshold=threshold)
+    return Pipeline(materials, predictor, validator, batch_size=5,
+                    poll_interval=0.001, n_substitutions=2, **kwargs)
+
+
+def test_backpressure(materials):
+    validator = RecordingValidator(latency=0.002, jitter=0.5,
+                                   failure_rate=0.2)
+    results = []
+    pipeline = get_pipeline(
+        materials, validator, max_in_flight=3,
+        on_result=lambda structure, score, result: results.append(result))
+    statistics = pipeline.run()
+
+    n_configurations = len(list(materials.iter_configurations(
+        n_substitutions=2)))
+    assert statistics['enumerated'] == n_configurations
+    assert statistics['accepted'] == statistics['submitted'] == \
+        statistics['finished'] == len(results) == n_configurations
+    assert statistics['max_in_flight'] == validator.max_pending == 3
+    assert not validator.pending
+    assert any(result['exit_status'] != 0 for result in results)
+
+
+def test_rejected(materials):
+    validator = RecordingValidator()
+    statistics = get_pipeline(materials, validator, threshold=1.).run()
+    assert statistics['enumerated'] > 0
+    assert statistics['accepted'] == statistics['submitted'] == 0
+
+
+def test_stop_on_submit_error(materials):
+    validator = RecordingValidator(fail_after=4, latency=60.)
+    with pytest.raises(RuntimeError, match='submission failed'):
+        get_pipeline(materials, validator, max_in_flight=10).run()
+    assert validator.submitted == 4
+
+
+def test_stop_on_result_error(materials):
+    def on_result(structure, score, result):
+        raise ValueError('bad result')
+
+    validator = RecordingValidator()
+    with pytest.raises(ValueError, match='bad result'):
+        get_pipeline(materials, validator, max_in_flight=2,
+                     on_result=on_result).run()
+    assert validator.submitted == 2
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from immad.abstract.predictor import Predictor, SiteWeightPredictor
+from immad.abstract.store import ConfigurationStore
+
+
+@pytest.fixture
+def predictor():
+    rng = np.random.default_rng(0)
+    return SiteWeightPredictor(rng.normal(size=(12, 3)), bias=-0.5)
+
+
+@pytest.fixture
+def configurations():
+    rng = np.random.default_rng(1)
+    return rng.integers(0, 3, size=(100, 12), dtype=np.uint8)
+
+
+def test_evaluate_batch(predictor, configurations):
+    expected = [predictor.evaluate(configuration)
+                for configuration in configurations]
+    np.testing.assert_allclose(predictor.evaluate_batch(configurations),
+                               expected)
+    np.testing.assert_allclose(Predictor.evaluate_batch(predictor,
+                                                        configurations),
+                               expected)
+
+
+def test_evaluate_batch_store(predictor, configurations, rutile):
+    store = ConfigurationStore(rutile * (1, 1, 2), ['V', 'Nb'],
+                               configurations)
+    np.testing.assert_allclose(predictor.evaluate_batch(store),
+                               predictor.evaluate_batch(configurations))
+
+
+def test_verify_batch(predictor, configurations):
+    scores = predictor.evaluate_batch(configurations)
+    expected = [predictor.verify(score) for score in scores]
+    np.testing.assert_array_equal(predictor.verify_batch(scores), expected)
+    np.testing.assert_array_equal(Predictor.verify_batch(predictor, scores),
+                                  expected)
@@ -0,0 +1,95 @@
+import pickle
+
+import numpy as np
+import pytest
+
+from immad.abstract.cache import CachedPredictor, DiskCache, LRUCache
+from immad.abstract.predictor import SiteWeightPredictor
+
+
+class CountingPredictor(SiteWeightPredictor):
+    """Count the samples scored by the wrapped predictor."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.n_evaluated = 0
+
+    def evaluate_batch(self, proposed_samples):
+        self.n_evaluated += len(proposed_samples)
+        return super().evaluate_batch(proposed_samples)
+
+
+def test_lru_cache():
+    cache = LRUCache(maxsize=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+    assert 'b' not in cache
+    assert len(cache) == 2
+    assert cache.get('b') is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_disk_cache_budget(tmp_path):
+    value = np.zeros(100)
+    size = len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    max_bytes = 10 * size
+    with DiskCache(tmp_path / 'cache.sqlite', max_bytes=max_bytes) as cache:
+        for key in range(5):
+            cache.put(key, value)
+        assert cache.total_bytes == 5 * size
+        # key 0 is used again and is not the least recently accessed
+        assert cache.get(0) is not None
+        cache.put_many({key: value for key in range(5, 12)})
+        assert cache.total_bytes <= max_bytes
+        assert cache.total_bytes == len(cache) * size
+        assert cache.get(0) is not None
+        assert cache.get(1) is None
+        cache.put(11, np.zeros(10))
+        assert cache.total_bytes == sum(
+            len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+            for value in cache.get_many(range(12)).values())
+
+
+def test_disk_cache_shared(tmp_path):
+    filename = tmp_path / 'cache.sqlite'
+    with DiskCache(filename) as first, DiskCache(filename) as second:
+        first.put('key', 'value')
+        assert second.get('key') == 'value'
+        assert second.total_bytes == first.total_bytes
+        second.clear()
+        assert first.total_bytes == 0
+
+
+def test_cached_predictor(tmp_path):
+    rng = np.random.default_rng(0)
+    weights = rng.normal(size=(12, 3))
+    configurations = rng.integers(0, 3, size=(40, 12), dtype=np.uint8)
+    expected = SiteWeightPredictor(weights).evaluate_batch(configurations)
+
+    filename = tmp_path / 'scores.sqlite'
+    predictor = CountingPredictor(weights)
+    cached = CachedPredictor(predictor, version='1', filename=filename)
+    np.testing.assert_allclose(cached.evaluate_batch(configurations[:20]),
+                               expected[:20])
+    np.testing.assert_allclose(cached.evaluate_batch(configurations),
+                               expected)
+    assert predictor.n_evaluated == len(np.unique(configurations, axis=0))
+    cached.disk.close()
+
+    # a new process reads the scores from the disk tier
+    predictor = CountingPredictor(weights)
+    cached = CachedPredictor(predictor, version='1', filename=filename)
+    np.testing.assert_allclose(cached.evaluate_batch(configurations),
+                               expected)
+    assert predictor.n_evaluated == 0
+    assert cached.get_statistics()['disk_hits'] > 0
+    cached.disk.close()
+
+    # another version of the predictor does not reuse the scores
+    predictor = CountingPredictor(weights)
+    cached = CachedPredictor(predictor, version='2', filename=filename)
+    cached.evaluate_batch(configurations[:5])
+    assert predictor.n_evaluated == 5
+    cached.disk.close()
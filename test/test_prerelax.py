@@ -0,0 +1,47 @@
+import pytest
+
+ase_build = pytest.importorskip('ase.build')
+
+from aiida import orm
+
+from immad.dft.prerelax import get_prerelax_rejection, prerelax_structure
+
+
+def prerelax(atoms, **parameters):
+    results = prerelax_structure(orm.StructureData(ase=atoms),
+                                 orm.Str('emt'), orm.Dict(parameters))
+    return results['output_parameters'].get_dict()
+
+
+def get_rattled_copper():
+    atoms = ase_build.bulk('Cu', 'fcc', a=3.8) * (2, 2, 2)
+    atoms.rattle(0.05, seed=1)
+    return atoms
+
+
+def test_accepted(aiida_profile):
+    output_parameters = prerelax(get_rattled_copper())
+    assert output_parameters['converged']
+    assert output_parameters['volume_change'] == 0
+    assert get_prerelax_rejection(output_parameters) is None
+
+
+def test_rejected_unconverged(aiida_profile):
+    output_parameters = prerelax(get_rattled_copper(), steps=1, fmax=1e-6)
+    assert not output_parameters['converged']
+    assert 'converge' in get_prerelax_rejection(output_parameters)
+
+
+def test_rejected_volume_change(aiida_profile):
+    parameters = {'relax_cell': True, 'max_volume_change': 0.05}
+    output_parameters = prerelax(get_rattled_copper(), **parameters)
+    assert output_parameters['volume_change'] < -0.05
+    assert 'volume' in get_prerelax_rejection(output_parameters, parameters)
+
+
+def test_rejected_displacement():
+    output_parameters = {'converged': True, 'steps': 10,
+                         'volume_change': 0., 'max_displacement': 1.5}
+    assert 'moved' in get_prerelax_rejection(output_parameters)
+    assert get_prerelax_rejection(output_parameters,
+                                  {'max_displacement': 2.}) is None
@@ -0,0 +1,43 @@
+import pytest
+
+ase_build = pytest.importorskip('ase.build')
+
+from aiida import orm
+
+from immad.dft.resources import ResourceEstimator
+
+
+@pytest.fixture
+def silicon(aiida_profile):
+    return orm.StructureData(
+        ase=ase_build.bulk('Si', 'diamond', a=5.43) * (3, 3, 3))
+
+
+def test_estimate_max_procs(silicon):
+    estimator = ResourceEstimator(target_wallclock_seconds=600,
+                                  min_wallclock_seconds=60)
+    estimate = estimator.estimate('dos', silicon)
+    limited = estimator.estimate('dos', silicon, max_procs=8)
+    assert estimate['tot_num_mpiprocs'] > 8
+    assert limited['num_machines'] == 1
+    assert limited['tot_num_mpiprocs'] == 8
+    # the same work is done by fewer processes
+    assert limited['max_wallclock_seconds'] == pytest.approx(
+        estimate['max_wallclock_seconds'] * estimate['tot_num_mpiprocs'] / 8,
+        abs=1)
+
+    options = estimator.get_options('dos', silicon, {'queue_name': 'debug'},
+                                    max_procs=8)
+    assert options['resources'] == {'num_machines': 1,
+                                    'tot_num_mpiprocs': 8}
+    assert options['max_wallclock_seconds'] == \
+        limited['max_wallclock_seconds']
+    assert options['queue_name'] == 'debug'
+
+
+def test_estimate_max_procs_machines(silicon):
+    estimator = ResourceEstimator(procs_per_machine=4,
+                                  target_wallclock_seconds=600)
+    estimate = estimator.estimate('dos', silicon, max_procs=6)
+    assert estimate['num_machines'] == 2
+    assert estimate['tot_num_mpiprocs'] == 6
@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+from immad.abstract.predictor import SiteWeightPredictor
+from immad.abstract.selection import TopKSelector
+
+
+@pytest.fixture
+def configurations():
+    rng = np.random.default_rng(0)
+    return rng.integers(0, 3, size=(500, 6), dtype=np.uint8)
+
+
+@pytest.fixture
+def scores(configurations):
+    return np.random.default_rng(1).permutation(len(configurations)) / 10
+
+
+def select(scores, samples, k, max_per_composition=None):
+    """Select the k best samples by sorting all of them."""
+    counts = {}
+    selected = []
+    for index in sorted(range(len(scores)), key=lambda i: -scores[i]):
+        composition = TopKSelector.get_composition(samples[index])
+        if max_per_composition is not None and \
+                counts.get(composition, 0) >= max_per_composition:
+            continue
+        counts[composition] = counts.get(composition, 0) + 1
+        selected.append(index)
+        if len(selected) == k:
+            break
+    return selected
+
+
+@pytest.mark.parametrize('k', [1, 10, 600])
+def test_push(scores, configurations, k):
+    selector = TopKSelector(k)
+    for score, configuration in zip(scores, configurations):
+        selector.push(score, configuration)
+    expected = select(scores, configurations, k)
+    assert [score for score, _ in selector.results()] == \
+        [scores[index] for index in expected]
+    np.testing.assert_array_equal(selector.shortlist(),
+                                  configurations[expected])
+    assert selector.seen == len(scores)
+
+
+@pytest.mark.parametrize('max_per_composition', [1, 3])
+def test_push_batch(scores, configurations, max_per_composition):
+    selector = TopKSelector(20, max_per_composition)
+    for start in range(0, len(scores), 64):
+        selector.push_batch(scores[start:start + 64],
+                            configurations[start:start + 64])
+    expected = select(scores, configurations, 20, max_per_composition)
+    assert [score for score, _ in selector.results()] == \
+        [scores[index] for index in expected]
+    assert len(selector) == len(expected)
+    assert selector.seen == len(scores)
+
+
+def test_select_top_k(configurations):
+    predictor = SiteWeightPredictor(
+        np.random.default_rng(2).normal(size=(6, 3)))
+    selector = predictor.select_top_k(iter(configurations), 5, batch_size=7)
+    scores = predictor.evaluate_batch(configurations)
+    np.testing.assert_allclose([score for score, _ in selector.results()],
+                               sorted(scores, reverse=True)[:5])
+
+
+def test_invalid_k():
+    with pytest.raises(ValueError):
+        TopKSelector(0)
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('pymatgen.core')
+pytest.importorskip('ase')
+
+from immad.abstract.materials import Materials
+from immad.abstract.store import ConfigurationStore
+
+
+@pytest.fixture
+def store(rutile):
+    return ConfigurationStore.from_materials(
+        Materials(rutile * (1, 1, 2), ['V', 'Nb']), n_substitutions=2,
+        chunk_size=7)
+
+
+@pytest.mark.parametrize('mmap', [True, False])
+def test_round_trip(store, tmp_path, mmap):
+    filename = tmp_path / 'configurations.bin'
+    store.save(filename)
+    loaded = ConfigurationStore.load(filename, mmap=mmap)
+
+    assert loaded.species == store.species
+    assert loaded.structure == store.structure
+    assert loaded.configurations.dtype == np.uint8
+    np.testing.assert_array_equal(loaded.configurations, store.configurations)
+    assert loaded.to_structure(3) == store.to_structure(3)
+
+
+def test_round_trip_empty(rutile, tmp_path):
+    filename = tmp_path / 'configurations.bin'
+    ConfigurationStore(rutile, ['V']).save(filename)
+    loaded = ConfigurationStore.load(filename)
+    assert len(loaded) == 0
+    assert loaded.n_sites == len(rutile)
+
+
+def test_not_a_store(tmp_path):
+    filename = tmp_path / 'configurations.bin'
+    filename.write_bytes(b'not a store')
+    with pytest.raises(ValueError):
+        ConfigurationStore.load(filename)
+
+
+def test_from_materials(store, rutile):
+    materials = Materials(rutile * (1, 1, 2), ['V', 'Nb'])
+    expected = list(materials.iter_configurations(n_substitutions=2))
+    np.testing.assert_array_equal(store.configurations, expected)
+    assert np.all(store.count_substitutions() == 2)
+
+
+def test_unique_and_hashes(store):
+    doubled = store[:]
+    doubled.append(store.configurations)
+    assert len(doubled) == 2 * len(store)
+    np.testing.assert_array_equal(doubled.unique().configurations,
+                                  store.configurations)
+    hashes = store.get_hashes()
+    assert len(set(hashes.tolist())) == len(store)
+    np.testing.assert_array_equal(doubled.get_hashes()[len(store):], hashes)
+
+
+def test_filter(store):
+    selected = store.filter(lambda configurations:
+                            np.any(configurations == 2, axis=1))
+    assert len(selected) > 0
+    assert all(2 in configuration for configuration in selected)
+    with pytest.raises(ValueError):
+        store.filter(np.ones(len(store) + 1, dtype=bool))
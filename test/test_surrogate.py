@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+from immad.abstract.surrogate import SurrogatePredictor
+
+
+@pytest.fixture
+def data():
+    rng = np.random.default_rng(0)
+    configurations = rng.integers(0, 3, size=(60, 8), dtype=np.uint8)
+    values = rng.normal(size=len(configurations))
+    return configurations, values
+
+
+def fit_ridge(surrogate, configurations, values):
+    """Fit the ridge regression in closed form."""
+    descriptors = surrogate.get_descriptors(configurations)
+    gram = descriptors.T @ descriptors + \
+        surrogate.alpha * np.eye(surrogate.n_features)
+    covariance = np.linalg.inv(gram)
+    return covariance @ descriptors.T @ values, covariance
+
+
+@pytest.mark.parametrize('alpha', [0.1, 1., 10.])
+def test_update_matches_closed_form(data, alpha):
+    configurations, values = data
+    surrogate = SurrogatePredictor(8, 3, alpha=alpha, noise=0.5)
+    surrogate.update_batch(configurations[:30], values[:30])
+    surrogate.update_batch(configurations[30:], values[30:])
+    weights, covariance = fit_ridge(surrogate, configurations, values)
+
+    assert surrogate.n_observations == len(values)
+    np.testing.assert_allclose(surrogate.weights, weights, atol=1e-10)
+    np.testing.assert_allclose(surrogate.covariance, covariance, atol=1e-10)
+
+    descriptors = surrogate.get_descriptors(configurations)
+    mean, std = surrogate.predict(configurations)
+    np.testing.assert_allclose(mean, descriptors @ weights, atol=1e-10)
+    np.testing.assert_allclose(
+        std, 0.5 * np.sqrt(1. + np.einsum('ij,jk,ik->i', descriptors,
+                                          covariance, descriptors)))
+    np.testing.assert_allclose(surrogate.evaluate_batch(configurations),
+                               -mean)
+
+
+def test_update_from_results(data):
+    configurations, values = data
+    results = [{'scf_parameters': {'energy': value}} for value in values]
+    results[3] = {'scf_parameters': None}
+    results[5] = None
+    surrogate = SurrogatePredictor(8, 3)
+    assert surrogate.update_from_results(configurations, results) == \
+        len(values) - 2
+
+    kept = np.ones(len(values), dtype=bool)
+    kept[[3, 5]] = False
+    weights, _ = fit_ridge(surrogate, configurations[kept], values[kept])
+    np.testing.assert_allclose(surrogate.weights, weights, atol=1e-10)
+
+    surrogate.reset()
+    assert surrogate.n_observations == 0
+    np.testing.assert_array_equal(surrogate.weights, 0.)
+
+
+def test_select_batch(data):
+    configurations, values = data
+    surrogate = SurrogatePredictor(8, 3, minimize=False)
+    surrogate.update_batch(configurations[:20], values[:20])
+    selected = surrogate.select_batch(configurations, 5, kappa=1.)
+    acquisition = surrogate.acquisition(configurations, kappa=1.)
+    expected = configurations[np.argsort(-acquisition, kind='stable')[:5]]
+    np.testing.assert_array_equal(selected, expected)
@@ -0,0 +1,27 @@
+from immad.abstract.synthetic import (EXIT_STATUS_FAILED, SyntheticValidator,
+                                      synthetic_energy)
+
+
+def test_unknown_handles(rutile):
+    validator = SyntheticValidator()
+    handle = validator.submit(rutile)
+    assert validator.poll([handle, 'unknown']) == [True, True]
+    result, unknown = validator.results([handle, 'unknown'])
+    assert unknown is None
+    assert result['exit_status'] == 0
+    assert result['scf_parameters']['energy'] == synthetic_energy(rutile)
+
+    # the handle is released once its result is obtained
+    assert validator.poll([handle]) == [True]
+    assert validator.results([handle]) == [None]
+
+
+def test_latency_and_failures(rutile):
+    validator = SyntheticValidator(latency=60., failure_rate=1.)
+    handle = validator.submit(rutile)
+    assert validator.poll([handle]) == [False]
+
+    validator = SyntheticValidator(latency=0.01, failure_rate=1.)
+    result = validator.run(rutile)
+    assert result['exit_status'] == EXIT_STATUS_FAILED
+    assert result['scf_parameters'] is None